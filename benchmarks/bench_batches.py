@@ -0,0 +1,124 @@
+"""
+Бенчмарк пакетной обработки (/v1/batches) против локальной замены GigaChat.
+
+Загружает JSONL-файл из --requests строк, создает пакет и опрашивает его
+статус до завершения. Печатает запросов в секунду и для сравнения время,
+за которое те же запросы прошли бы последовательно через
+/v1/chat/completions (оценка по первым --sequential запросам).
+
+    python -m benchmarks.bench_batches --requests 2000
+    GIGACHAT_BATCH_CONCURRENCY=32 python -m benchmarks.bench_batches
+"""
+
+import argparse
+import json
+import tempfile
+import time
+
+import httpx
+
+from .fake_gigachat import add_arguments, generate_certificate
+from .load_test import (
+    BEARER_TOKEN,
+    free_port,
+    port_open,
+    start_adapter,
+    start_fake_gigachat,
+    wait_ready,
+)
+
+
+def build_input(requests: int) -> bytes:
+    lines = (
+        {
+            "custom_id": f"request-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": "GigaChat",
+                "messages": [{"role": "user", "content": f"Запрос {i} #tokens=20"}],
+            },
+        }
+        for i in range(requests)
+    )
+    return b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+
+
+def run_batch(client: httpx.Client, requests: int) -> tuple[float, dict]:
+    upload = client.post(
+        "/v1/files",
+        files={"file": ("input.jsonl", build_input(requests), "application/jsonl")},
+        data={"purpose": "batch"},
+    )
+    upload.raise_for_status()
+    started = time.perf_counter()
+    batch = client.post(
+        "/v1/batches",
+        json={"input_file_id": upload.json()["id"], "endpoint": "/v1/chat/completions"},
+    ).json()
+    while batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(0.2)
+        batch = client.get(f"/v1/batches/{batch['id']}").json()
+    return time.perf_counter() - started, batch
+
+
+def run_sequential(client: httpx.Client, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        response = client.post(
+            "/v1/chat/completions",
+            json={
+                "model": "GigaChat",
+                "messages": [{"role": "user", "content": f"Запрос {i} #tokens=20"}],
+            },
+        )
+        response.raise_for_status()
+    return (time.perf_counter() - started) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sequential", type=int, default=50)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = generate_certificate(directory)
+        upstream_port, adapter_port = free_port(), free_port()
+        processes = [
+            start_fake_gigachat(args, upstream_port, certfile, keyfile),
+            start_adapter(adapter_port, upstream_port, directory, 1),
+        ]
+        try:
+            wait_ready(lambda: port_open(upstream_port), processes[0])
+            base_url = f"http://127.0.0.1:{adapter_port}"
+            wait_ready(
+                lambda: httpx.get(f"{base_url}/health/readiness").status_code == 200,
+                processes[1],
+            )
+            with httpx.Client(
+                base_url=base_url,
+                headers={"Authorization": f"Bearer {BEARER_TOKEN}"},
+                timeout=60,
+            ) as client:
+                elapsed, batch = run_batch(client, args.requests)
+                per_request = run_sequential(client, args.sequential)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+    counts = batch["request_counts"]
+    print(f"batch status      {batch['status']}")
+    print(f"completed/failed  {counts['completed']}/{counts['failed']}")
+    print(f"batch             {elapsed:8.1f} s {args.requests / elapsed:8.1f} req/s")
+    print(
+        f"sequential (est.) {per_request * args.requests:8.1f} s "
+        f"{1 / per_request:8.1f} req/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Микро-бенчмарк блокировки event loop при обработке больших data URI.
+
+Сравнивает прежнюю обработку в _upload_base64 (encode + sha256 + split +
+b64decode + BytesIO прямо в event loop) с adecode_data_uri, которая выносит
+декодирование и хеширование в пул потоков.
+
+    python -m benchmarks.bench_decode --size-mb 10 --images 8
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from src.core.data_uri import adecode_data_uri
+
+
+async def legacy_decode(uri: str) -> None:
+    hashlib.sha256(uri.encode()).hexdigest()
+    _, encoded = uri.split(",", 1)
+    BytesIO(base64.b64decode(encoded))
+
+
+async def measure(name: str, decode, uris: list[str]) -> None:
+    """Запускает декодирование и параллельно меряет задержки heartbeat-задачи."""
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def heartbeat() -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await asyncio.gather(*(decode(uri) for uri in uris))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await beat
+
+    lags.sort()
+    print(
+        f"{name:<10} total={elapsed * 1000:8.1f} ms  "
+        f"max_loop_lag={lags[-1] * 1000:7.1f} ms  "
+        f"p99_loop_lag={lags[int(len(lags) * 0.99)] * 1000:7.1f} ms  "
+        f"blocked={sum(lags) * 1000:8.1f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    uris = [
+        "data:image/png;base64,"
+        + base64.b64encode(os.urandom(int(args.size_mb * 1024 * 1024))).decode()
+        for _ in range(args.images)
+    ]
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+
+    async def offloaded(uri: str) -> None:
+        await adecode_data_uri(uri, executor, offload_threshold=256 * 1024)
+
+    await measure("legacy", legacy_decode, uris)
+    await measure("offloaded", offloaded, uris)
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
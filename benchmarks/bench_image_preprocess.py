@@ -0,0 +1,122 @@
+"""
+Бенчмарк обработки изображений перед загрузкой в GigaChat.
+
+Рисует скриншот --width x --height в PNG, обрабатывает его через
+ImagePreprocessor (пул процессов) и печатает размер до и после, время
+обработки, максимальную задержку event loop и оценку времени загрузки при
+пропускной способности канала --uplink-mbps: исходный файл против обработки
+плюс загрузки уменьшенного. Нужен Pillow (extra images).
+
+    python -m benchmarks.bench_image_preprocess --width 4000 --height 3000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+# Модуль обработки пишет в журнал адаптера, которому нужны настройки
+os.environ.setdefault("BEARER_TOKEN", "bench")
+
+from src.core.data_uri import DecodedDataUri
+from src.core.image_preprocess import ImagePreprocessor
+
+
+def screenshot_png(width: int, height: int) -> bytes:
+    # Окна с фотографиями и градиентами, строки "текста" на светлом фоне
+    rng = random.Random(0)
+    image = Image.new("RGB", (width, height), (246, 246, 246))
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 18):
+        x = rng.randrange(40)
+        while x < width:
+            word = rng.randrange(8, 60)
+            draw.rectangle((x, y + 4, x + word, y + 12), fill=(40, 40, 40))
+            x += word + rng.randrange(4, 12)
+    for _ in range(6):
+        size = (width // 3, height // 3)
+        photo = Image.merge(
+            "RGB",
+            (
+                Image.linear_gradient("L").resize(size),
+                Image.effect_noise(size, rng.randrange(20, 60)),
+                Image.radial_gradient("L").resize(size),
+            ),
+        )
+        image.paste(
+            photo, (rng.randrange(width - size[0]), rng.randrange(height - size[1]))
+        )
+    output = BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+
+async def process_with_lag(
+    preprocessor: ImagePreprocessor, image: DecodedDataUri
+) -> tuple[DecodedDataUri, float, float]:
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def heartbeat() -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    beat = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    result = await preprocessor.process(image)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await beat
+    return result, elapsed, max(lags, default=0.0)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--max-dimension", type=int, default=2048)
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--uplink-mbps", type=float, default=50)
+    args = parser.parse_args()
+
+    data = screenshot_png(args.width, args.height)
+    image = DecodedDataUri(
+        data=data, mime_type="image/png", sha256=hashlib.sha256(data).hexdigest()
+    )
+    preprocessor = ImagePreprocessor(
+        max_dimension=args.max_dimension, quality=args.quality, min_bytes=0, workers=1
+    )
+    try:
+        # Первый вызов запускает процесс пула, его не учитываем
+        await preprocessor.process(image)
+        result, elapsed, lag = await process_with_lag(preprocessor, image)
+    finally:
+        preprocessor.close()
+
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    original_upload = len(data) / bytes_per_second
+    processed_upload = elapsed + len(result.data) / bytes_per_second
+    print(f"original          {len(data) / 1024:10.1f} KiB  {image.mime_type}")
+    print(f"processed         {len(result.data) / 1024:10.1f} KiB  {result.mime_type}")
+    print(f"bytes saved       {(len(data) - len(result.data)) / 1024:10.1f} KiB")
+    print(
+        f"preprocess        {elapsed * 1000:10.1f} ms  max loop lag {lag * 1000:.1f} ms"
+    )
+    print(
+        f"upload @{args.uplink_mbps:g} Mbit/s  {original_upload * 1000:10.1f} ms original"
+    )
+    print(
+        f"                  {processed_upload * 1000:10.1f} ms preprocess + upload "
+        f"({(1 - processed_upload / original_upload) * 100:.0f}% less)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
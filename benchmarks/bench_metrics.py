@@ -0,0 +1,58 @@
+"""
+Бенчмарк записи метрик на горячем пути.
+
+Измеряет стоимость операций, которые выполняются на каждый запрос и каждый
+чанк потока: observe гистограммы с метками и inc счетчика. Результат -
+наносекунд на операцию на одном ядре.
+
+    python -m benchmarks.bench_metrics --ops 1000000
+"""
+
+import argparse
+import time
+
+from src.core.metrics import Counter, Histogram, MetricsRegistry
+
+
+def run(name: str, op, ops: int) -> None:
+    started = time.perf_counter()
+    for _ in range(ops):
+        op()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<20} {elapsed / ops * 1e9:8.0f} ns/op")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    histogram = registry.register(
+        Histogram("latency_seconds", "Latency.", ("endpoint", "model"))
+    )
+    counter = registry.register(
+        Counter("tokens_total", "Tokens.", ("endpoint", "model", "type"))
+    )
+
+    run("baseline (no-op)", lambda: None, args.ops)
+    run(
+        "histogram.observe",
+        lambda: histogram.labels("/v1/chat/completions", "GigaChat").observe(0.042),
+        args.ops,
+    )
+    run(
+        "counter.inc",
+        lambda: counter.labels("/v1/chat/completions", "GigaChat", "prompt").inc(12),
+        args.ops,
+    )
+
+    started = time.perf_counter()
+    body = registry.render()
+    print(
+        f"render: {len(body)} bytes in {(time.perf_counter() - started) * 1e6:.0f} us"
+    )
+
+
+if __name__ == "__main__":
+    main()
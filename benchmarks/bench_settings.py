@@ -0,0 +1,76 @@
+"""
+Бенчмарк получения настроек приложения.
+
+Раньше get_app_settings() создавал AppSettings на каждый вызов: перечитывал
+окружение и .env, а get_version() открывал pyproject.toml. Теперь настройки
+разбираются один раз в неизменяемый снимок. Бенчмарк измеряет:
+
+- вызов get_app_settings() по-старому (это и есть разбор настроек - цена
+  старта и каждой перезагрузки) и со снимком;
+- запрос к /health/liveness и к /stats (с проверкой токена) через ASGI, где
+  старое поведение воспроизводится подменой зависимости.
+
+    python -m benchmarks.bench_settings --ops 2000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections.abc import Callable
+
+os.environ.setdefault("BEARER_TOKEN", "bench")
+
+import httpx
+
+from src.core.settings import AppSettings, get_app_settings
+from src.gigachat_service import GigaChatService
+from src.main import get_application
+
+
+def measure(op: Callable[[], object], ops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(ops):
+        op()
+    return (time.perf_counter() - started) / ops
+
+
+async def measure_requests(path: str, ops: int, legacy: bool) -> float:
+    app = get_application()
+    if legacy:
+        app.dependency_overrides[get_app_settings] = lambda: AppSettings()  # type: ignore
+    headers = {"Authorization": f"Bearer {get_app_settings().bearer_token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers=headers
+    ) as client:
+        # ASGITransport не запускает lifespan, а /stats нужен сервис
+        app.state.gigachat_service = GigaChatService()
+        await client.get(path)
+        started = time.perf_counter()
+        for _ in range(ops):
+            response = await client.get(path)
+            assert response.status_code == 200, response.text
+        return (time.perf_counter() - started) / ops
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    parse = measure(lambda: AppSettings(), max(args.ops // 10, 1))  # type: ignore
+    # Старый get_app_settings() и был разбором AppSettings()
+    print(f"{'get_app_settings() legacy':<28} {parse * 1e6:10.1f} us")
+    snapshot = measure(get_app_settings, args.ops * 100)
+    print(f"{'get_app_settings() snapshot':<28} {snapshot * 1e6:10.3f} us")
+
+    for path in ("/health/liveness", "/stats"):
+        legacy = asyncio.run(measure_requests(path, args.ops, legacy=True))
+        cached = asyncio.run(measure_requests(path, args.ops, legacy=False))
+        print(f"{'GET ' + path + ' legacy':<28} {legacy * 1e6:10.1f} us")
+        print(f"{'GET ' + path + ' snapshot':<28} {cached * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
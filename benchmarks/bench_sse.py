@@ -0,0 +1,102 @@
+"""
+Бенчмарк кодирования SSE-чанков chat.completion.chunk.
+
+Сравнивает прежний путь stream_chat -> stream_chat_sse (модели Pydantic с
+валидацией, новый uuid4 на каждый чанк и model_dump_json) с
+ChatCompletionChunkEncoder. Результат - чанков в секунду на одном ядре.
+
+    python -m benchmarks.bench_sse --chunks 200000
+"""
+
+import argparse
+import time
+import uuid
+
+from gigachat.models.chat_completion_chunk import ChatCompletionChunk
+
+from src.core.sse import ChatCompletionChunkEncoder
+from src.models.completion import (
+    ChatCompletionStreamResponse,
+    ChatCompletionStreamResponseChoice,
+    ChatCompletionStreamResponseDelta,
+    MessagesRole,
+)
+
+
+def make_chunk(index: int) -> ChatCompletionChunk:
+    return ChatCompletionChunk.parse_obj(
+        {
+            "choices": [
+                {
+                    "delta": {"content": f"токен {index} ", "role": "assistant"},
+                    "index": 0,
+                }
+            ],
+            "created": 1736023521,
+            "model": "GigaChat:1.0.26.20",
+            "object": "chat.completion",
+        }
+    )
+
+
+def legacy_encode(chunk: ChatCompletionChunk) -> bytes:
+    response = ChatCompletionStreamResponse(
+        id=str(uuid.uuid4()),
+        object="chat.completion.chunk",
+        created=chunk.created,
+        model=chunk.model,
+        choices=[
+            ChatCompletionStreamResponseChoice(
+                index=c.index,
+                delta=ChatCompletionStreamResponseDelta(
+                    role=MessagesRole(c.delta.role) if c.delta.role else None,
+                    content=c.delta.content,
+                    refusal=None,
+                ),
+                finish_reason=c.finish_reason or "stop",
+            )
+            for c in chunk.choices
+        ],
+    )
+    return f"data: {response.model_dump_json()}\n\n".encode()
+
+
+def run(name: str, encode, chunks: list[ChatCompletionChunk]) -> float:
+    started = time.perf_counter()
+    for chunk in chunks:
+        encode(chunk)
+    rate = len(chunks) / (time.perf_counter() - started)
+    print(f"{name:<8} {rate:12,.0f} chunks/s/core")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=200_000)
+    args = parser.parse_args()
+
+    chunks = [make_chunk(i) for i in range(args.chunks)]
+    encoder = ChatCompletionChunkEncoder()
+
+    def fast_encode(chunk: ChatCompletionChunk) -> bytes:
+        return encoder.encode(
+            chunk.created,
+            chunk.model,
+            (
+                (
+                    c.index,
+                    c.delta.role.value if c.delta.role else None,
+                    c.delta.content,
+                    c.finish_reason or "stop",
+                )
+                for c in chunk.choices
+            ),
+        )
+
+    legacy = run("legacy", legacy_encode, chunks)
+    fast = run("encoder", fast_encode, chunks)
+    print(f"speedup  {fast / legacy:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
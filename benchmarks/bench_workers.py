@@ -0,0 +1,60 @@
+"""
+Бенчмарк масштабирования адаптера по числу воркеров.
+
+Прогоняет сценарий long_stream из benchmarks.load_test при разном WORKERS.
+Заглушка GigaChat отвечает без задержек и по одному токену в чанке, поэтому
+пропускная способность упирается в разбор и кодирование чанков адаптером, то
+есть в CPU. Результат - чанков в секунду и эффективность относительно одного
+воркера (1.0 - линейное масштабирование). Имеет смысл только на машине, где
+ядер хватает и адаптеру, и заглушке, и генератору нагрузки.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --duration 10
+"""
+
+import argparse
+import json
+
+from .load_test import LONG_STREAM_TOKENS, build_parser, run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    reports = []
+    baseline = None
+    print(f"{'workers':>7} {'streams/s':>10} {'chunks/s':>10} {'efficiency':>10}")
+    for workers in args.workers:
+        load_args = build_parser().parse_args(
+            [
+                "--scenario", "long_stream",
+                "--workers", str(workers),
+                "--clients", str(args.clients),
+                "--concurrency", str(args.concurrency),
+                "--duration", str(args.duration),
+                "--latency", "0",
+                "--tokens-per-second", "0",
+                "--chunk-tokens", "1",
+            ]
+        )  # fmt: skip
+        report = run(load_args)
+        rps = report["scenarios"]["long_stream"]["rps"]
+        chunks = rps * LONG_STREAM_TOKENS
+        if baseline is None:
+            baseline = chunks / workers
+        efficiency = chunks / (baseline * workers) if baseline else 0.0
+        print(f"{workers:>7} {rps:>10.1f} {chunks:>10.0f} {efficiency:>10.2f}")
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
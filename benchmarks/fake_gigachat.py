@@ -0,0 +1,418 @@
+"""
+Локальная замена GigaChat API для нагрузочных тестов.
+
+HTTP/2-сервер поверх TLS (ALPN h2), как у настоящего GigaChat, поэтому
+адаптер работает с ним через тот же пул соединений. Реализованы методы,
+которые вызывает адаптер: /chat/completions (обычный и потоковый ответ),
+/embeddings, /models и /files. Авторизация не проверяется - адаптер запускается с
+GIGACHAT_ACCESS_TOKEN.
+
+Поведение задается параметрами командной строки: задержка до ответа,
+скорость генерации токенов, число токенов в чанке потока и доля ошибок.
+Длину ответа можно задать в последнем сообщении меткой "#tokens=N".
+
+    python -m benchmarks.fake_gigachat --port 9443 --latency 0.05 --error-rate 0.01
+
+Если сертификат не передан, самоподписанный сертификат создается утилитой
+openssl во временном каталоге.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import ssl
+import subprocess
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+import h2.settings
+
+TOKENS_MARKER = re.compile(r"#tokens=(\d+)")
+API_PREFIX = "/api/v1"
+
+
+@dataclass
+class FakeGigaChatConfig:
+    # Задержка до заголовков ответа, секунд, и ее случайный разброс
+    latency: float = 0.05
+    latency_jitter: float = 0.0
+    # Скорость генерации; 0 - ответ без задержки на генерацию
+    tokens_per_second: float = 200.0
+    # Токенов в одном чанке потока
+    chunk_tokens: int = 4
+    # Длина ответа по умолчанию, токенов
+    completion_tokens: int = 50
+    # Доля запросов к API, завершающихся ошибкой error_status
+    error_rate: float = 0.0
+    error_status: int = 503
+    max_concurrent_streams: int = 100
+    models: tuple[str, ...] = ("GigaChat", "GigaChat-Pro", "GigaChat-Max")
+    # Размер векторов /embeddings
+    embedding_dimensions: int = 1024
+
+
+def generate_certificate(directory: str) -> tuple[str, str]:
+    """Создает самоподписанный сертификат для localhost."""
+    certfile = str(Path(directory) / "cert.pem")
+    keyfile = str(Path(directory) / "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "ec",
+            "-pkeyopt", "ec_paramgen_curve:prime256v1", "-nodes",
+            "-keyout", keyfile, "-out", certfile, "-days", "1",
+            "-subj", "/CN=localhost",
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+    return certfile, keyfile
+
+
+class _Stream:
+    __slots__ = ("body", "headers", "task")
+
+    def __init__(self, headers: dict[str, str]):
+        self.headers = headers
+        self.body = bytearray()
+        self.task: asyncio.Task | None = None
+
+
+class _H2Protocol(asyncio.Protocol):
+    """Одно HTTP/2-соединение; каждый запрос обрабатывается своей задачей."""
+
+    def __init__(self, server: "FakeGigaChat"):
+        self.server = server
+        self.conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        self.transport: asyncio.Transport | None = None
+        self.streams: dict[int, _Stream] = {}
+        self.window_updated = asyncio.Event()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+        self.conn.initiate_connection()
+        self.conn.update_settings(
+            {
+                h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: (
+                    self.server.config.max_concurrent_streams
+                )
+            }
+        )
+        self.flush()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        for stream in self.streams.values():
+            if stream.task is not None:
+                stream.task.cancel()
+        self.window_updated.set()
+
+    def flush(self) -> None:
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data: bytes) -> None:
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.flush()
+            if self.transport is not None:
+                self.transport.close()
+            return
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                headers = event.headers or []
+                self.streams[event.stream_id] = _Stream(
+                    {str(name): str(value) for name, value in headers}
+                )
+            elif isinstance(event, h2.events.DataReceived):
+                self.streams[event.stream_id].body += event.data
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+            elif isinstance(event, h2.events.StreamEnded):
+                stream = self.streams[event.stream_id]
+                stream.task = asyncio.create_task(
+                    self.server.handle(self, event.stream_id, stream)
+                )
+            elif isinstance(event, h2.events.StreamReset):
+                reset = self.streams.pop(event.stream_id, None)
+                if reset is not None and reset.task is not None:
+                    reset.task.cancel()
+            elif isinstance(event, h2.events.WindowUpdated):
+                self.window_updated.set()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                if self.transport is not None:
+                    self.transport.close()
+        self.flush()
+
+    def send_headers(
+        self, stream_id: int, status: int, content_type: str, end: bool = False
+    ) -> None:
+        self.conn.send_headers(
+            stream_id,
+            [(":status", str(status)), ("content-type", content_type)],
+            end_stream=end,
+        )
+        self.flush()
+
+    async def send_data(self, stream_id: int, data: bytes, end: bool = False) -> None:
+        while data:
+            window = min(
+                self.conn.local_flow_control_window(stream_id),
+                self.conn.max_outbound_frame_size,
+            )
+            if window <= 0:
+                self.window_updated.clear()
+                await self.window_updated.wait()
+                if self.transport is None or self.transport.is_closing():
+                    raise ConnectionError("Connection closed")
+                continue
+            self.conn.send_data(stream_id, data[:window])
+            data = data[window:]
+        if end:
+            self.conn.end_stream(stream_id)
+        self.flush()
+
+    async def send_json(self, stream_id: int, status: int, payload: object) -> None:
+        self.send_headers(stream_id, status, "application/json")
+        await self.send_data(stream_id, json.dumps(payload).encode(), end=True)
+
+
+class FakeGigaChat:
+    def __init__(self, config: FakeGigaChatConfig):
+        self.config = config
+        self.requests_total = 0
+        self.errors_total = 0
+
+    async def serve(
+        self, host: str, port: int, certfile: str, keyfile: str
+    ) -> asyncio.Server:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        context.set_alpn_protocols(["h2"])
+        loop = asyncio.get_running_loop()
+        return await loop.create_server(
+            lambda: _H2Protocol(self), host, port, ssl=context
+        )
+
+    async def handle(self, protocol: _H2Protocol, stream_id: int, stream: _Stream):
+        try:
+            await self._handle(protocol, stream_id, stream)
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            protocol.streams.pop(stream_id, None)
+
+    async def _handle(self, protocol: _H2Protocol, stream_id: int, stream: _Stream):
+        config = self.config
+        self.requests_total += 1
+        method = stream.headers.get(":method", "GET")
+        path = stream.headers.get(":path", "/").split("?")[0]
+        path = path.removeprefix(API_PREFIX)
+
+        await asyncio.sleep(config.latency + random.random() * config.latency_jitter)
+        if config.error_rate and random.random() < config.error_rate:
+            self.errors_total += 1
+            await protocol.send_json(
+                stream_id,
+                config.error_status,
+                {"status": config.error_status, "message": "Injected error"},
+            )
+            return
+
+        if method == "GET" and path == "/models":
+            await protocol.send_json(
+                stream_id,
+                200,
+                {
+                    "object": "list",
+                    "data": [
+                        {"id": name, "object": "model", "owned_by": "salutedevices"}
+                        for name in config.models
+                    ],
+                },
+            )
+        elif method == "POST" and path == "/files":
+            await protocol.send_json(
+                stream_id,
+                200,
+                {
+                    "id": str(uuid.uuid4()),
+                    "object": "file",
+                    "bytes": len(stream.body),
+                    "created_at": int(time.time()),
+                    "filename": "upload",
+                    "purpose": "general",
+                },
+            )
+        elif method == "POST" and path == "/embeddings":
+            request = json.loads(stream.body or b"{}")
+            await protocol.send_json(
+                stream_id,
+                200,
+                {
+                    "object": "list",
+                    "model": request.get("model", "Embeddings"),
+                    "data": [
+                        {
+                            "object": "embedding",
+                            "index": index,
+                            "embedding": [
+                                random.random()
+                                for _ in range(config.embedding_dimensions)
+                            ],
+                            "usage": {"prompt_tokens": len(text.split())},
+                        }
+                        for index, text in enumerate(request.get("input", []))
+                    ],
+                },
+            )
+        elif method == "POST" and path == "/chat/completions":
+            request = json.loads(stream.body or b"{}")
+            tokens = self._completion_tokens(request)
+            if request.get("stream"):
+                await self._stream_chat(protocol, stream_id, request, tokens)
+            else:
+                await self._chat(protocol, stream_id, request, tokens)
+        else:
+            await protocol.send_json(stream_id, 404, {"message": "Not found"})
+
+    def _completion_tokens(self, request: dict) -> int:
+        messages = request.get("messages") or [{}]
+        match = TOKENS_MARKER.search(str(messages[-1].get("content") or ""))
+        return int(match.group(1)) if match else self.config.completion_tokens
+
+    async def _generate(self, tokens: int) -> None:
+        if self.config.tokens_per_second > 0:
+            await asyncio.sleep(tokens / self.config.tokens_per_second)
+
+    async def _chat(
+        self, protocol: _H2Protocol, stream_id: int, request: dict, tokens: int
+    ) -> None:
+        await self._generate(tokens)
+        prompt_tokens = sum(
+            len(str(m.get("content") or "").split()) for m in request["messages"]
+        )
+        await protocol.send_json(
+            stream_id,
+            200,
+            {
+                "choices": [
+                    {
+                        "message": {"role": "assistant", "content": "ток " * tokens},
+                        "index": 0,
+                        "finish_reason": "stop",
+                    }
+                ],
+                "created": int(time.time()),
+                "model": request.get("model", "GigaChat"),
+                "object": "chat.completion",
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": tokens,
+                    "total_tokens": prompt_tokens + tokens,
+                },
+            },
+        )
+
+    async def _stream_chat(
+        self, protocol: _H2Protocol, stream_id: int, request: dict, tokens: int
+    ) -> None:
+        protocol.send_headers(stream_id, 200, "text/event-stream")
+        created = int(time.time())
+        model = request.get("model", "GigaChat")
+        step = max(self.config.chunk_tokens, 1)
+        for sent in range(0, tokens, step):
+            count = min(step, tokens - sent)
+            await self._generate(count)
+            last = sent + count >= tokens
+            chunk = {
+                "choices": [
+                    {
+                        "delta": {"role": "assistant", "content": "ток " * count},
+                        "index": 0,
+                        **({"finish_reason": "stop"} if last else {}),
+                    }
+                ],
+                "created": created,
+                "model": model,
+                "object": "chat.completion",
+            }
+            await protocol.send_data(
+                stream_id, b"data: " + json.dumps(chunk).encode() + b"\n\n"
+            )
+        await protocol.send_data(stream_id, b"data: [DONE]\n\n", end=True)
+
+
+def parse_config(args: argparse.Namespace) -> FakeGigaChatConfig:
+    return FakeGigaChatConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        tokens_per_second=args.tokens_per_second,
+        chunk_tokens=args.chunk_tokens,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        max_concurrent_streams=args.max_concurrent_streams,
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FakeGigaChatConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency)
+    parser.add_argument("--latency-jitter", type=float, default=defaults.latency_jitter)
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=defaults.tokens_per_second
+    )
+    parser.add_argument("--chunk-tokens", type=int, default=defaults.chunk_tokens)
+    parser.add_argument(
+        "--completion-tokens", type=int, default=defaults.completion_tokens
+    )
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument(
+        "--max-concurrent-streams",
+        type=int,
+        default=defaults.max_concurrent_streams,
+    )
+
+
+async def amain(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = args.certfile, args.keyfile
+        if certfile is None:
+            certfile, keyfile = generate_certificate(directory)
+        server = await FakeGigaChat(parse_config(args)).serve(
+            args.host, args.port, certfile, keyfile
+        )
+        print(f"Fake GigaChat listening on https://{args.host}:{args.port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9443)
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    add_arguments(parser)
+    try:
+        asyncio.run(amain(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Нагрузочный тест адаптера против локальной замены GigaChat.
+
+Запускает benchmarks.fake_gigachat и адаптер (python -m src) отдельными
+процессами, затем прогоняет сценарии с заданной конкурентностью:
+
+- short_chat - короткий обычный запрос;
+- long_stream - потоковый ответ на много чанков;
+- image_history - история с изображениями: часть повторяется и находится
+  в индексе вложений, одно новое в каждом запросе загружается;
+- embeddings - эмбеддинг короткого текста; одновременные запросы адаптер
+  объединяет в пачки;
+- models - список моделей.
+
+Результат - JSON со значениями RPS, p50/p99 длительности и TTFT для каждого
+сценария и коммитом, на котором выполнен прогон. Результаты двух коммитов
+можно сравнивать напрямую:
+
+    python -m benchmarks.load_test --duration 20 --concurrency 64 --output a.json
+    python -m benchmarks.load_test --scenario long_stream --error-rate 0.05
+
+Параметры сервера (задержка, скорость токенов, ошибки) совпадают с
+benchmarks.fake_gigachat. Дополнительные настройки адаптера передаются через
+окружение, например GIGACHAT_HTTP2_CONNECTIONS=4.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import httpx
+
+from .fake_gigachat import add_arguments, generate_certificate
+
+BEARER_TOKEN = "load-test"
+# Длина ответа в сценарии long_stream, токенов
+LONG_STREAM_TOKENS = 400
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    # Тело запроса по его номеру; None - запрос без тела
+    body: Callable[[int], dict] | None = None
+    stream: bool = False
+
+
+def _chat(content: object, tokens: int, stream: bool = False) -> dict:
+    if isinstance(content, str):
+        content = f"{content} #tokens={tokens}"
+    return {
+        "model": "GigaChat",
+        "messages": [{"role": "user", "content": content}],
+        "stream": stream,
+    }
+
+
+def _image(data: bytes) -> dict:
+    url = "data:image/png;base64," + base64.b64encode(data).decode()
+    return {"type": "image_url", "image_url": {"url": url}}
+
+
+# Изображения, которые повторяются во всех запросах сценария image_history
+SHARED_IMAGES = [random.Random(i).randbytes(64 * 1024) for i in range(3)]
+
+
+def _image_history(index: int) -> dict:
+    content = [
+        {"type": "text", "text": "Что общего на этих изображениях? #tokens=20"},
+        *(_image(data) for data in SHARED_IMAGES),
+        _image(os.urandom(64 * 1024)),
+    ]
+    return _chat(content, 20)
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario(
+            "short_chat",
+            "POST",
+            "/v1/chat/completions",
+            lambda i: _chat(f"Привет, это запрос {i}", 10),
+        ),
+        Scenario(
+            "long_stream",
+            "POST",
+            "/v1/chat/completions",
+            lambda i: _chat(
+                f"Расскажи длинную историю {i}", LONG_STREAM_TOKENS, stream=True
+            ),
+            stream=True,
+        ),
+        Scenario("image_history", "POST", "/v1/chat/completions", _image_history),
+        Scenario(
+            "embeddings",
+            "POST",
+            "/v1/embeddings",
+            lambda i: {"model": "Embeddings", "input": f"Фрагмент документа {i}"},
+        ),
+        Scenario("models", "GET", "/v1/models"),
+    )
+}
+
+
+@dataclass
+class Result:
+    latencies: list[float] = field(default_factory=list)
+    ttfts: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def error(self, reason: str) -> None:
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(result: Result) -> dict:
+    def ms(value: float | None) -> float | None:
+        return None if value is None else round(value * 1000, 2)
+
+    completed = len(result.latencies)
+    return {
+        "requests": completed + sum(result.errors.values()),
+        "errors": result.errors,
+        "rps": round(completed / result.elapsed, 2) if result.elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(result.latencies, 0.5)),
+            "p99": ms(percentile(result.latencies, 0.99)),
+        },
+        "ttft_ms": {
+            "p50": ms(percentile(result.ttfts, 0.5)),
+            "p99": ms(percentile(result.ttfts, 0.99)),
+        },
+    }
+
+
+async def _request(
+    client: httpx.AsyncClient, scenario: Scenario, index: int, result: Result
+) -> None:
+    body = scenario.body(index) if scenario.body is not None else None
+    started = time.perf_counter()
+    try:
+        async with client.stream(scenario.method, scenario.path, json=body) as response:
+            first: float | None = None
+            async for _ in response.aiter_raw():
+                if first is None:
+                    first = time.perf_counter()
+    except httpx.HTTPError as e:
+        result.error(type(e).__name__)
+        return
+    if response.status_code != 200:
+        result.error(str(response.status_code))
+        return
+    result.latencies.append(time.perf_counter() - started)
+    if scenario.stream and first is not None:
+        result.ttfts.append(first - started)
+
+
+async def run_scenario(
+    base_url: str, scenario: Scenario, concurrency: int, duration: float
+) -> Result:
+    result = Result()
+    limits = httpx.Limits(max_connections=concurrency)
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    counter = iter(range(sys.maxsize))
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=headers, limits=limits, timeout=120
+    ) as client:
+        # Прогрев: соединения, кеш моделей, индекс общих изображений
+        await _request(client, scenario, next(counter), Result())
+        deadline = time.perf_counter() + duration
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                await _request(client, scenario, next(counter), result)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _run_client(base_url: str, name: str, concurrency: int, duration: float) -> Result:
+    return asyncio.run(run_scenario(base_url, SCENARIOS[name], concurrency, duration))
+
+
+def run_clients(
+    base_url: str, name: str, concurrency: int, duration: float, clients: int
+) -> Result:
+    """Нагрузка из нескольких процессов, чтобы генератор не стал узким местом."""
+    if clients <= 1:
+        return _run_client(base_url, name, concurrency, duration)
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+        futures = [
+            pool.submit(
+                _run_client,
+                base_url,
+                name,
+                concurrency // clients + (i < concurrency % clients),
+                duration,
+            )
+            for i in range(clients)
+        ]
+        results = [future.result() for future in futures]
+    merged = Result(elapsed=max(r.elapsed for r in results))
+    for result in results:
+        merged.latencies += result.latencies
+        merged.ttfts += result.ttfts
+        for reason, count in result.errors.items():
+            merged.errors[reason] = merged.errors.get(reason, 0) + count
+    return merged
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(
+    check: Callable[[], bool], process: subprocess.Popen, timeout: float = 30
+) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode}")
+        try:
+            if check():
+                return
+        except (OSError, httpx.HTTPError):
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("Process is not ready")
+
+
+def port_open(port: int) -> bool:
+    with socket.create_connection(("127.0.0.1", port), timeout=1):
+        return True
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_fake_gigachat(
+    args: argparse.Namespace, port: int, certfile: str, keyfile: str
+) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.fake_gigachat",
+        "--port", str(port), "--certfile", certfile, "--keyfile", keyfile,
+        "--latency", str(args.latency),
+        "--latency-jitter", str(args.latency_jitter),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--chunk-tokens", str(args.chunk_tokens),
+        "--completion-tokens", str(args.completion_tokens),
+        "--error-rate", str(args.error_rate),
+        "--error-status", str(args.error_status),
+        "--max-concurrent-streams", str(args.max_concurrent_streams),
+    ]  # fmt: skip
+    return subprocess.Popen(command)
+
+
+def start_adapter(
+    port: int, upstream_port: int, directory: str, workers: int
+) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "WORKERS": str(workers),
+        "BEARER_TOKEN": BEARER_TOKEN,
+        "GIGACHAT_BASE_URL": f"https://127.0.0.1:{upstream_port}/api/v1",
+        "GIGACHAT_ACCESS_TOKEN": "load-test",
+        "GIGACHAT_VERIFY_SSL_CERTS": "false",
+        "GIGACHAT_ATTACHMENT_INDEX_PATH": os.path.join(directory, "attachments.db"),
+        "GIGACHAT_BATCH_DIR": os.path.join(directory, "batches"),
+        "USAGE_DB_PATH": os.path.join(directory, "usage.db"),
+    }
+    # Без явных лимитов очередь адаптера не должна ограничивать прогон
+    env.setdefault("GIGACHAT_MAX_CONCURRENT_REQUESTS", "10000")
+    env.setdefault("GIGACHAT_MAX_QUEUED_REQUESTS", "10000")
+    # Журнал каждого запроса исказил бы результат
+    env.setdefault("ACCESS_LOG", "false")
+    return subprocess.Popen([sys.executable, "-m", "src"], env=env)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Scenario to run; may be repeated. Default: all",
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--clients", type=int, default=1, help="Load generator processes"
+    )
+    parser.add_argument("--output", help="Write JSON results to this file")
+    add_arguments(parser)
+    return parser
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Поднимает заглушку и адаптер, прогоняет сценарии и возвращает отчет."""
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = generate_certificate(directory)
+        upstream_port, adapter_port = free_port(), free_port()
+        processes = [
+            start_fake_gigachat(args, upstream_port, certfile, keyfile),
+            start_adapter(adapter_port, upstream_port, directory, args.workers),
+        ]
+        try:
+            wait_ready(lambda: port_open(upstream_port), processes[0])
+            base_url = f"http://127.0.0.1:{adapter_port}"
+            wait_ready(
+                lambda: httpx.get(f"{base_url}/health/readiness").status_code == 200,
+                processes[1],
+            )
+            scenarios = {}
+            for name in args.scenario or SCENARIOS:
+                result = run_clients(
+                    base_url, name, args.concurrency, args.duration, args.clients
+                )
+                scenarios[name] = summarize(result)
+                print(f"{name}: {json.dumps(scenarios[name])}", file=sys.stderr)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "workers": args.workers,
+        "clients": args.clients,
+        "upstream": {
+            name: getattr(args, name)
+            for name in (
+                "latency",
+                "latency_jitter",
+                "tokens_per_second",
+                "chunk_tokens",
+                "completion_tokens",
+                "error_rate",
+                "error_status",
+                "max_concurrent_streams",
+            )
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Запуск адаптера: python -m src
+
+Число процессов задает настройка WORKERS. Каждый воркер сам импортирует
+приложение и создает свой GigaChatService в lifespan, общим между воркерами
+остается только индекс вложений в SQLite.
+"""
+
+import os
+
+import uvicorn
+
+from .core.settings import get_app_settings
+
+
+def main() -> None:
+    settings = get_app_settings()
+    uvicorn.run(
+        "src.main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=settings.workers or os.cpu_count() or 1,
+        proxy_headers=True,
+        access_log=settings.access_log,
+    )
+
+
+if __name__ == "__main__":
+    main()
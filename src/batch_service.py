@@ -0,0 +1,617 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import time
+import uuid
+from collections.abc import AsyncIterator
+from typing import IO, Any, BinaryIO
+
+from gigachat.exceptions import ResponseError
+from pydantic import ValidationError
+from pydantic_settings import BaseSettings
+
+from .core.account_pool import get_response_error_status, get_retry_after
+from .core.admission import AdmissionRejected
+from .core.api_keys import api_keys
+from .core.batch_store import BatchStore
+from .core.circuit_breaker import CircuitOpen
+from .core.image_fetcher import ImageFetchError
+from .core.logging import local_logger
+from .core.request_context import RequestContext, _request_context
+from .core.tracing import tracer
+from .gigachat_service import GigaChatService
+from .models.batches import Batch, BatchCreateRequest, BatchStatus
+from .models.completion import ChatCompletionRequest
+from .models.files import FilePurpose, FileUploadResponse
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOWS = {"24h": 24 * 3600}
+# Сколько ошибок проверки входного файла сохраняется в пакете
+MAX_VALIDATION_ERRORS = 100
+
+
+class BatchSettings(BaseSettings):
+    # Каталог входных файлов, результатов и базы состояния пакетов
+    dir: str = "batches"
+    # Сколько запросов одного пакета выполняется одновременно
+    concurrency: int = 8
+    # Как часто сохраняется контрольная точка, секунд
+    checkpoint_interval: float = 1.0
+    # Срок аренды пакета воркером; по истечении пакет забирает другой воркер
+    lease_seconds: float = 60
+    max_input_bytes: int = 200 * 1024 * 1024
+
+    class Config:
+        env_file = ".env"
+        env_prefix = "GIGACHAT_BATCH_"
+        extra = "allow"
+
+
+class BatchInputError(Exception):
+    """Пакет нельзя создать из переданного файла или параметров."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _ResultFile:
+    """Файл результатов, дописываемый с длины последней контрольной точки."""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._file: BinaryIO | None = None
+
+    def open(self) -> None:
+        # Строки после контрольной точки будут выполнены заново, поэтому
+        # файл обрезается до сохраненной длины. Файл открыт на все время
+        # обработки пакета и закрывается в close()
+        self._file = open(self.path, "ab")  # noqa: SIM115
+        self._file.truncate(self.size)
+
+    def write(self, data: bytes) -> None:
+        assert self._file is not None
+        self._file.write(data)
+        self.size += len(data)
+
+    def sync(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BatchService:
+    """
+    Пакетная обработка запросов чата в формате OpenAI Batch API.
+
+    Входной JSONL-файл загружается через /files с purpose=batch и хранится
+    локально. Пакет проверяется целиком, затем его строки выполняются через
+    GigaChatService.chat ограниченным пулом: запросы проходят те же допуск,
+    повторы и пул учетных записей, что и обычные. Когда GigaChat или адаптер
+    отвечают 429 или 503, пул приостанавливается на Retry-After, а не
+    записывает ошибку. Токены списываются с ключа доступа, создавшего пакет,
+    и пул ждет, пока у ключа восстановится бюджет токенов.
+
+    Файлы и пакеты принадлежат ключу доступа, которым они созданы: другие
+    ключи их не видят. api_key=None в методах чтения - доступ самого
+    адаптера без проверки владельца.
+
+    Результаты дописываются в JSONL-файлы по мере выполнения. Раз в
+    checkpoint_interval секунд файлы синхронизируются на диск, а номера
+    выполненных строк и длина файлов сохраняются в BatchStore, так что после
+    перезапуска пакет продолжается с контрольной точки.
+    """
+
+    def __init__(self, gigachat_service: GigaChatService, **kwargs):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._settings = BatchSettings(**kwargs)
+        self._service = gigachat_service
+        self.store = BatchStore(os.path.join(self._settings.dir, "batches.db"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._claimer: asyncio.Task | None = None
+        # До этого момента (time.monotonic) новые запросы пакетов не отправляются
+        self._resume_at = 0.0
+
+    async def start(self) -> None:
+        os.makedirs(self._settings.dir, exist_ok=True)
+        if self._claimer is None:
+            self._claimer = asyncio.create_task(self._claim_loop())
+
+    async def stop(self) -> None:
+        tasks = [self._claimer, *self._tasks.values()]
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(t for t in tasks if t is not None), return_exceptions=True
+        )
+        self._claimer = None
+        # Незавершенные пакеты сразу продолжит следующий запущенный воркер
+        await self.store.release(self.owner)
+        await self.store.close()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._settings.dir, name)
+
+    # Файлы
+
+    async def save_file(
+        self, filename: str, file: IO[bytes], api_key: str
+    ) -> FileUploadResponse:
+        """Сохраняет входной файл пакета локально, не загружая его в GigaChat."""
+        file_id = f"file-{uuid.uuid4().hex}"
+        path = self._path(f"{file_id}.jsonl")
+        size = await asyncio.to_thread(self._copy_file, file, path)
+        if size > self._settings.max_input_bytes:
+            await asyncio.to_thread(os.remove, path)
+            raise BatchInputError(
+                f"Batch input file exceeds {self._settings.max_input_bytes} bytes",
+                status_code=413,
+            )
+        record = {
+            "id": file_id,
+            "filename": filename,
+            "purpose": FilePurpose.BATCH.value,
+            "bytes": size,
+            "created_at": int(time.time()),
+        }
+        await self.store.add_file(**record, path=path, api_key=api_key)
+        return FileUploadResponse.model_validate({**record, "object": "file"})
+
+    def _copy_file(self, file: IO[bytes], path: str) -> int:
+        os.makedirs(self._settings.dir, exist_ok=True)
+        file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(file, f, 1024 * 1024)
+            return f.tell()
+
+    async def get_file(
+        self, file_id: str, api_key: str | None
+    ) -> tuple[FileUploadResponse, str] | None:
+        """Описание локального файла и путь к нему."""
+        row = await self.store.get_file(file_id)
+        if row is None or not _owned(row, api_key):
+            return None
+        path = row.pop("path")
+        del row["api_key"]
+        return FileUploadResponse.model_validate({**row, "object": "file"}), path
+
+    # Пакеты
+
+    async def create(self, request: BatchCreateRequest, api_key: str) -> Batch:
+        if request.endpoint != BATCH_ENDPOINT:
+            raise BatchInputError(f"Only {BATCH_ENDPOINT} is supported")
+        window = COMPLETION_WINDOWS.get(request.completion_window)
+        if window is None:
+            raise BatchInputError(
+                f"Unsupported completion_window {request.completion_window}"
+            )
+        input_file = await self.store.get_file(request.input_file_id)
+        if (
+            input_file is None
+            or input_file["purpose"] != FilePurpose.BATCH.value
+            or not _owned(input_file, api_key)
+        ):
+            raise BatchInputError(f"Batch input file {request.input_file_id} not found")
+
+        now = int(time.time())
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        await self.store.add_batch(
+            id=batch_id,
+            status=BatchStatus.VALIDATING.value,
+            endpoint=request.endpoint,
+            input_file_id=request.input_file_id,
+            completion_window=request.completion_window,
+            metadata=json.dumps(request.metadata) if request.metadata else None,
+            created_at=now,
+            expires_at=now + window,
+            api_key=api_key,
+            owner=self.owner,
+            lease_until=time.time() + self._settings.lease_seconds,
+        )
+        self._start(batch_id)
+        return await self._get(batch_id)
+
+    async def get(self, batch_id: str, api_key: str | None) -> Batch | None:
+        row = await self.store.get_batch(batch_id)
+        if row is None or not _owned(row, api_key):
+            return None
+        return self._to_batch(row)
+
+    async def _get(self, batch_id: str) -> Batch:
+        batch = await self.get(batch_id, None)
+        assert batch is not None
+        return batch
+
+    async def list_batches(
+        self, api_key: str, after: str | None, limit: int
+    ) -> tuple[list[Batch], bool]:
+        rows = await self.store.list_batches(api_key, after, limit + 1)
+        return [self._to_batch(row) for row in rows[:limit]], len(rows) > limit
+
+    async def cancel(self, batch_id: str, api_key: str) -> Batch | None:
+        if await self.get(batch_id, api_key) is None:
+            return None
+        # Выполняющий пакет воркер увидит отмену на следующей контрольной точке
+        await self.store.update_batch(
+            batch_id,
+            {"status": BatchStatus.CANCELLING.value, "cancelling_at": int(time.time())},
+            statuses=(BatchStatus.VALIDATING.value, BatchStatus.IN_PROGRESS.value),
+        )
+        return await self._get(batch_id)
+
+    @staticmethod
+    def _to_batch(row: dict[str, Any]) -> Batch:
+        errors = json.loads(row["errors"]) if row["errors"] else None
+        return Batch.model_validate(
+            {
+                **row,
+                "object": "batch",
+                "errors": {"object": "list", "data": errors} if errors else None,
+                "metadata": json.loads(row["metadata"]) if row["metadata"] else None,
+                "request_counts": {
+                    "total": row["total"],
+                    "completed": row["completed"],
+                    "failed": row["failed"],
+                },
+            }
+        )
+
+    # Выполнение
+
+    async def _claim_loop(self) -> None:
+        # Забираем незавершенные пакеты при старте, а затем пакеты воркеров,
+        # которые перестали продлевать аренду
+        while True:
+            try:
+                now = time.time()
+                claimed = await self.store.claim(
+                    self.owner, now, now + self._settings.lease_seconds
+                )
+                for batch_id in claimed:
+                    local_logger.info(f"Продолжаем пакет {batch_id}")
+                    self._start(batch_id)
+            except sqlite3.Error:
+                local_logger.exception("Ошибка при получении незавершенных пакетов")
+            await asyncio.sleep(self._settings.lease_seconds / 3)
+
+    def _start(self, batch_id: str) -> None:
+        if batch_id in self._tasks:
+            return
+        task = asyncio.create_task(self._drive(batch_id))
+        self._tasks[batch_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch_id, None))
+
+    async def _drive(self, batch_id: str) -> None:
+        # Каждый шаг переводит пакет в следующий статус, только пока пакет
+        # принадлежит этому воркеру и не сменил статус (например, на отмену)
+        try:
+            while True:
+                row = await self.store.get_batch(batch_id)
+                if row is None or row["owner"] != self.owner:
+                    return
+                match row["status"]:
+                    case BatchStatus.VALIDATING.value:
+                        await self._validate(row)
+                    case BatchStatus.IN_PROGRESS.value:
+                        await self._process(row)
+                    case BatchStatus.FINALIZING.value:
+                        await self._finalize(row, BatchStatus.COMPLETED)
+                    case BatchStatus.CANCELLING.value:
+                        await self._finalize(row, BatchStatus.CANCELLED)
+                    case _:
+                        return
+        except asyncio.CancelledError:
+            raise
+        # Задача пакета не должна падать молча: аренда не продлевается, и
+        # после ее истечения пакет продолжит этот или другой воркер
+        except Exception:  # noqa: BLE001
+            local_logger.exception(f"Ошибка выполнения пакета {batch_id}")
+
+    async def _input_path(self, row: dict[str, Any]) -> str:
+        input_file = await self.store.get_file(row["input_file_id"])
+        if input_file is None:
+            raise RuntimeError(f"Batch input file {row['input_file_id']} is missing")
+        return input_file["path"]
+
+    async def _read_lines(self, path: str) -> AsyncIterator[tuple[int, bytes]]:
+        """Непустые строки файла с номерами (с 1), чтение - в пуле потоков."""
+        number = 0
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            while lines := await asyncio.to_thread(f.readlines, 1024 * 1024):
+                for line in lines:
+                    number += 1
+                    if line.strip():
+                        yield number, line
+        finally:
+            f.close()
+
+    async def _validate(self, row: dict[str, Any]) -> None:
+        errors: list[dict[str, Any]] = []
+        custom_ids: set[str] = set()
+        total = 0
+        async for number, line in self._read_lines(await self._input_path(row)):
+            total += 1
+            error = self._validate_line(line, custom_ids)
+            if error is not None and len(errors) < MAX_VALIDATION_ERRORS:
+                errors.append({"line": number, **error})
+        if not total:
+            errors.append({"code": "empty_file", "message": "Input file is empty"})
+
+        now = int(time.time())
+        if errors:
+            fields = {
+                "status": BatchStatus.FAILED.value,
+                "failed_at": now,
+                "errors": json.dumps(errors),
+            }
+        else:
+            fields = {
+                "status": BatchStatus.IN_PROGRESS.value,
+                "in_progress_at": now,
+                "total": total,
+            }
+        await self.store.update_batch(
+            row["id"], fields, self.owner, (BatchStatus.VALIDATING.value,)
+        )
+
+    @staticmethod
+    def _validate_line(line: bytes, custom_ids: set[str]) -> dict[str, Any] | None:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"code": "invalid_json_line", "message": "Line is not valid JSON"}
+        if not isinstance(request, dict):
+            return {"code": "invalid_request", "message": "Line is not a JSON object"}
+        custom_id = request.get("custom_id")
+        if not isinstance(custom_id, str) or not custom_id:
+            return {
+                "code": "missing_required_parameter",
+                "message": "custom_id is required",
+                "param": "custom_id",
+            }
+        if custom_id in custom_ids:
+            return {
+                "code": "duplicate_custom_id",
+                "message": f"Duplicate custom_id {custom_id}",
+                "param": "custom_id",
+            }
+        custom_ids.add(custom_id)
+        if request.get("method") != "POST" or request.get("url") != BATCH_ENDPOINT:
+            return {
+                "code": "invalid_url",
+                "message": f"Only POST {BATCH_ENDPOINT} is supported",
+                "param": "url",
+            }
+        try:
+            ChatCompletionRequest.model_validate(request.get("body"))
+        except ValidationError as e:
+            return {"code": "invalid_request", "message": str(e), "param": "body"}
+        return None
+
+    async def _process(self, row: dict[str, Any]) -> None:
+        batch_id = row["id"]
+        concurrency = self._settings.concurrency
+        done = await self.store.done_lines(batch_id)
+        output = _ResultFile(
+            self._path(f"{batch_id}.output.jsonl"), row["output_bytes"]
+        )
+        errors = _ResultFile(self._path(f"{batch_id}.errors.jsonl"), row["error_bytes"])
+        await asyncio.to_thread(output.open)
+        await asyncio.to_thread(errors.open)
+
+        requests: asyncio.Queue[tuple[int, bytes] | None] = asyncio.Queue(
+            maxsize=concurrency * 2
+        )
+        results: asyncio.Queue[tuple[int, bool, bytes] | None] = asyncio.Queue()
+        # Причина остановки до окончания строк: статус пакета или "lease"
+        stopped: list[str] = []
+        input_path = await self._input_path(row)
+
+        async def produce() -> None:
+            async for number, line in self._read_lines(input_path):
+                if stopped:
+                    break
+                if number not in done:
+                    await requests.put((number, line))
+            for _ in range(concurrency):
+                await requests.put(None)
+
+        async def work() -> None:
+            while (item := await requests.get()) is not None:
+                # После остановки оставшиеся строки пропускаются
+                if not stopped:
+                    number, line = item
+                    ok, data = await self._execute(line, row["api_key"])
+                    await results.put((number, ok, data))
+
+        async def feed() -> None:
+            await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+            await results.put(None)
+
+        async def write() -> None:
+            lines: list[int] = []
+            completed, failed = row["completed"], row["failed"]
+            checkpoint_at = time.monotonic() + self._settings.checkpoint_interval
+            finished = False
+            while not finished:
+                try:
+                    item = await asyncio.wait_for(
+                        results.get(), max(checkpoint_at - time.monotonic(), 0)
+                    )
+                except TimeoutError:
+                    pass
+                else:
+                    if item is None:
+                        finished = True
+                    else:
+                        number, ok, data = item
+                        (output if ok else errors).write(data)
+                        completed += ok
+                        failed += not ok
+                        lines.append(number)
+                if finished or time.monotonic() >= checkpoint_at:
+                    await asyncio.to_thread(output.sync)
+                    await asyncio.to_thread(errors.sync)
+                    status = await self.store.checkpoint(
+                        batch_id,
+                        self.owner,
+                        lines,
+                        {
+                            "completed": completed,
+                            "failed": failed,
+                            "output_bytes": output.size,
+                            "error_bytes": errors.size,
+                            "lease_until": time.time() + self._settings.lease_seconds,
+                        },
+                    )
+                    lines = []
+                    checkpoint_at = (
+                        time.monotonic() + self._settings.checkpoint_interval
+                    )
+                    if status is None:
+                        stopped.append("lease")
+                    elif status != BatchStatus.IN_PROGRESS.value:
+                        stopped.append(status)
+                    elif row["expires_at"] and time.time() >= row["expires_at"]:
+                        stopped.append(BatchStatus.EXPIRED.value)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(feed())
+                group.create_task(write())
+        finally:
+            await asyncio.to_thread(output.close)
+            await asyncio.to_thread(errors.close)
+
+        if not stopped:
+            await self.store.update_batch(
+                batch_id,
+                {
+                    "status": BatchStatus.FINALIZING.value,
+                    "finalizing_at": int(time.time()),
+                },
+                self.owner,
+                (BatchStatus.IN_PROGRESS.value,),
+            )
+        elif stopped[0] == BatchStatus.EXPIRED.value:
+            fresh = await self.store.get_batch(batch_id)
+            if fresh is not None:
+                await self._finalize(fresh, BatchStatus.EXPIRED)
+
+    async def _finalize(self, row: dict[str, Any], status: BatchStatus) -> None:
+        # Файлы результатов регистрируются под постоянными id, поэтому
+        # повтор после перезапуска ничего не дублирует
+        batch_id = row["id"]
+        fields: dict[str, Any] = {
+            "status": status.value,
+            f"{status.value}_at": int(time.time()),
+        }
+        for kind, size, column in (
+            ("output", row["output_bytes"], "output_file_id"),
+            ("errors", row["error_bytes"], "error_file_id"),
+        ):
+            if not size:
+                continue
+            file_id = f"file-{batch_id.removeprefix('batch_')}-{kind}"
+            await self.store.add_file(
+                id=file_id,
+                filename=f"{batch_id}_{kind}.jsonl",
+                purpose=FilePurpose.BATCH_OUTPUT.value,
+                bytes=size,
+                created_at=int(time.time()),
+                path=self._path(f"{batch_id}.{kind}.jsonl"),
+                api_key=row["api_key"],
+            )
+            fields[column] = file_id
+        await self.store.update_batch(batch_id, fields, self.owner, (row["status"],))
+
+    async def _wait_for_capacity(self, api_key: str | None) -> None:
+        while (delay := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        key = api_keys.keys_by_name.get(api_key) if api_key else None
+        if key is not None and key.tokens is not None:
+            while wait := key.tokens.available():
+                await asyncio.sleep(wait)
+
+    def _pause(self, seconds: float) -> None:
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def _execute(self, line: bytes, api_key: str | None) -> tuple[bool, bytes]:
+        """Выполняет строку пакета; возвращает успех и строку файла результатов."""
+        payload = json.loads(line)
+        request = ChatCompletionRequest.model_validate(
+            {**payload["body"], "stream": False}
+        )
+        request_id = f"req_{uuid.uuid4().hex}"
+        # Каждая строка трассируется как отдельный запрос; повторы после
+        # ожидания лимитов попадают в ту же трассу
+        tracer.start_request()
+        tracer.event("api.request", lambda: request.model_dump(mode="json"))
+        status_code, body = 200, None
+        while True:
+            await self._wait_for_capacity(api_key)
+            context = RequestContext(
+                endpoint="/v1/batches",
+                model=self._service.model_label(request.model),
+                api_key=api_key or "",
+            )
+            token = _request_context.set(context)
+            try:
+                response = await self._service.chat(request)
+                body = response.model_dump(mode="json")
+                break
+            except (AdmissionRejected, CircuitOpen) as e:
+                self._pause(e.retry_after)
+            except ResponseError as e:
+                status = get_response_error_status(e)
+                if status == 429:
+                    self._pause(get_retry_after(e) or 1)
+                    continue
+                status_code, body = status or 500, _error_body(str(e), "upstream_error")
+                break
+            except ImageFetchError as e:
+                status_code = e.status_code
+                body = _error_body(str(e), "invalid_image_url")
+                break
+            # Непредвиденная ошибка одной строки записывается в файл ошибок,
+            # а не останавливает весь пакет
+            except Exception as e:  # noqa: BLE001
+                local_logger.exception("Ошибка выполнения строки пакета")
+                status_code, body = 500, _error_body(str(e), "server_error")
+                break
+            finally:
+                _request_context.reset(token)
+
+        result = {
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": payload["custom_id"],
+            "response": {
+                "status_code": status_code,
+                "request_id": request_id,
+                "body": body,
+            },
+            "error": None,
+        }
+        data = json.dumps(result, ensure_ascii=False).encode() + b"\n"
+        return status_code == 200, data
+
+
+def _owned(row: dict[str, Any], api_key: str | None) -> bool:
+    return api_key is None or row["api_key"] == api_key
+
+
+def _error_body(message: str, code: str) -> dict[str, Any]:
+    return {"error": {"message": message, "type": "api_error", "code": code}}
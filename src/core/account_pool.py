@@ -0,0 +1,118 @@
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from gigachat.exceptions import ResponseError
+
+from .circuit_breaker import CircuitBreaker, CircuitOpen
+from .gigachat_client import PooledGigaChat
+from .logging import local_logger
+
+
+def get_response_error_status(error: ResponseError) -> int | None:
+    # ResponseError(url, status_code, content, headers)
+    if len(error.args) > 1 and isinstance(error.args[1], int):
+        return error.args[1]
+    return None
+
+
+def get_retry_after(error: ResponseError) -> float | None:
+    headers = error.args[3] if len(error.args) > 3 else None
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class GigaChatAccount:
+    """Учетная запись GigaChat со своим клиентом, токеном и пулом соединений."""
+
+    def __init__(
+        self,
+        name: str,
+        client: PooledGigaChat,
+        key_prefix: str = "",
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.name = name
+        self.client = client
+        self.breaker = breaker or CircuitBreaker(name)
+        # Загруженные файлы видны только в той учетной записи, куда загружены,
+        # поэтому ключи индекса вложений у каждой записи свои
+        self.key_prefix = key_prefix
+        self.inflight = 0
+        self.requests_total = 0
+        self.throttled_total = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def cool_down(self, seconds: float) -> None:
+        self.throttled_total += 1
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+        local_logger.warning(
+            f"Учетная запись GigaChat {self.name} получила 429, пауза {seconds:.0f} с"
+        )
+
+
+class AccountPool:
+    """
+    Пул учетных записей GigaChat.
+
+    Запрос направляется в доступную учетную запись с наименьшим числом
+    выполняющихся запросов. Запись, получившая 429, выводится из ротации на
+    Retry-After (или cooldown) секунд. Если на паузе все записи, выбирается
+    та, чья пауза закончится раньше. Записи с разомкнутым автоматом не
+    выбираются; если разомкнуты все, запрос сразу отклоняется с CircuitOpen.
+    """
+
+    def __init__(self, accounts: list[GigaChatAccount], cooldown: float):
+        if not accounts:
+            raise ValueError("At least one GigaChat account is required")
+        self.accounts = accounts
+        self.cooldown = cooldown
+
+    @property
+    def reachable(self) -> bool:
+        return any(account.breaker.can_attempt() for account in self.accounts)
+
+    def cooldown_remaining(self) -> float:
+        """Через сколько секунд освободится учетная запись (0 - есть свободная)."""
+        candidates = [
+            account for account in self.accounts if account.breaker.can_attempt()
+        ] or self.accounts
+        cooldown_until = min(account.cooldown_until for account in candidates)
+        return max(cooldown_until - time.monotonic(), 0.0)
+
+    def select(self) -> GigaChatAccount:
+        candidates = [
+            account for account in self.accounts if account.breaker.can_attempt()
+        ]
+        if not candidates:
+            raise CircuitOpen(
+                "GigaChat API is unavailable",
+                min(account.breaker.retry_after() for account in self.accounts),
+            )
+        available = [account for account in candidates if account.available]
+        if not available:
+            return min(candidates, key=lambda account: account.cooldown_until)
+        return min(
+            available, key=lambda account: (account.inflight, account.requests_total)
+        )
+
+    @asynccontextmanager
+    async def use(self) -> AsyncIterator[GigaChatAccount]:
+        account = self.select()
+        account.inflight += 1
+        account.requests_total += 1
+        try:
+            yield account
+        except ResponseError as e:
+            if get_response_error_status(e) == 429:
+                account.cool_down(get_retry_after(e) or self.cooldown)
+            raise
+        finally:
+            account.inflight -= 1
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+
+from .request_context import timed
+
+
+class AdmissionRejected(Exception):
+    """Запрос отклонен: все слоты заняты, а очередь полна или ожидание истекло."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Ограничитель одновременных запросов с ограниченной очередью ожидания.
+
+    Слоты выдаются в порядке очереди: освобожденный слот передается первому
+    ожидающему напрямую, поэтому новые запросы не обгоняют очередь.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.queued_total = 0
+        self.peak_queued = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> bool:
+        """Занимает слот; возвращает False, если очередь полна или время вышло."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue or timeout <= 0:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        self.peak_queued = max(self.peak_queued, len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Слот был передан нам одновременно с таймаутом или отменой
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                self.rejected += 1
+                return False
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """
+    Контроль допуска запросов к GigaChat.
+
+    Число одновременных запросов ограничено глобально и для каждой модели.
+    Отдельные лимиты заводятся только для известных моделей (is_known_model):
+    имя модели приходит от клиента, и произвольные строки не должны плодить
+    ограничители. Запросы к остальным моделям проходят только глобальный лимит.
+    Сверх лимита запросы ждут в ограниченной очереди не дольше queue_timeout,
+    после чего (или сразу, если очередь полна) отклоняются с AdmissionRejected,
+    чтобы клиент повторил запрос позже, а не перегружал GigaChat.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_concurrency_per_model: int | None,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: float,
+        is_known_model: Callable[[str], bool],
+    ):
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.max_concurrency_per_model = max_concurrency_per_model
+        self.max_queue = max_queue
+        self.limiter = ConcurrencyLimiter(max_concurrency, max_queue)
+        self.model_limiters: dict[str, ConcurrencyLimiter] = {}
+        self._is_known_model = is_known_model
+
+    def _model_limiter(self, model: str) -> ConcurrencyLimiter | None:
+        if self.max_concurrency_per_model is None:
+            return None
+        limiter = self.model_limiters.get(model)
+        if limiter is None:
+            if not self._is_known_model(model):
+                return None
+            limiter = ConcurrencyLimiter(self.max_concurrency_per_model, self.max_queue)
+            self.model_limiters[model] = limiter
+        return limiter
+
+    @asynccontextmanager
+    async def admit(self, model: str) -> AsyncIterator[None]:
+        # Сначала слот модели, затем глобальный: ожидание модели не должно
+        # занимать глобальный слот, нужный запросам к другим моделям
+        deadline = time.monotonic() + self.queue_timeout
+        model_limiter = self._model_limiter(model)
+        with timed("queue"):
+            admitted = model_limiter is None or await model_limiter.acquire(
+                self.queue_timeout
+            )
+        if not admitted:
+            raise AdmissionRejected(
+                f"Too many concurrent requests to model {model}", self.retry_after
+            )
+        try:
+            with timed("queue"):
+                admitted = await self.limiter.acquire(deadline - time.monotonic())
+            if not admitted:
+                raise AdmissionRejected(
+                    "Too many concurrent requests", self.retry_after
+                )
+            try:
+                yield
+            finally:
+                self.limiter.release()
+        finally:
+            if model_limiter is not None:
+                model_limiter.release()
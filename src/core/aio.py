@@ -0,0 +1,20 @@
+import asyncio
+from collections.abc import Awaitable, Iterable
+
+
+async def gather_or_cancel[T](aws: Iterable[Awaitable[T]]) -> list[T]:
+    """
+    Запускает корутины конкурентно и возвращает результаты в исходном порядке.
+
+    Если одна из них падает, остальные отменяются и дожидаются завершения,
+    после чего исходное исключение пробрасывается как есть (без ExceptionGroup),
+    чтобы его могли обработать обработчики ошибок приложения.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
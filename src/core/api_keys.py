@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .logging import local_logger
+from .request_context import get_request_context
+from .settings import (
+    ApiKeySettings,
+    AppSettings,
+    get_app_settings,
+    on_settings_reload,
+)
+
+
+class RateLimited(Exception):
+    """Ключ исчерпал лимит запросов или токенов."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate единиц в секунду, не больше capacity про запас.
+
+    Баланс может уйти в минус через debit(): так списываются токены GigaChat,
+    которые становятся известны только после ответа. Пока баланс не
+    положителен, новые запросы не допускаются.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """Списывает amount; если не хватает - возвращает, сколько секунд ждать."""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def available(self) -> float:
+        """0, если баланс положителен, иначе - секунд до его восстановления."""
+        self._refill()
+        return 0.0 if self.tokens > 0 else (1 - self.tokens) / self.rate
+
+    def balance(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def debit(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+
+class ApiKey:
+    """Ключ доступа с лимитами и счетчиками использования в памяти."""
+
+    def __init__(self, settings: ApiKeySettings):
+        self.name = settings.name
+        self.digest = (
+            hashlib.sha256(settings.key.encode()).digest()
+            if settings.key is not None
+            else bytes.fromhex(settings.key_sha256 or "")
+        )
+        self.requests: TokenBucket | None = None
+        self.tokens: TokenBucket | None = None
+        self.requests_total = 0
+        self.rate_limited_total = 0
+        self.prompt_tokens_total = 0
+        self.completion_tokens_total = 0
+        self.configure(settings)
+
+    def configure(self, settings: ApiKeySettings) -> None:
+        """Применяет лимиты из настроек, сохраняя накопленное состояние ведер."""
+        self.requests = _resize(
+            self.requests,
+            settings.requests_per_second,
+            settings.burst or max(settings.requests_per_second or 0, 1),
+        )
+        self.tokens = _resize(
+            self.tokens,
+            (settings.tokens_per_minute or 0) / 60,
+            settings.tokens_per_minute or 0,
+        )
+
+    def admit(self) -> None:
+        """Учитывает запрос или бросает RateLimited."""
+        wait = 0.0
+        if self.tokens is not None:
+            wait = self.tokens.available()
+        if not wait and self.requests is not None:
+            wait = self.requests.try_acquire()
+        if wait:
+            self.rate_limited_total += 1
+            raise RateLimited(f"Rate limit exceeded for API key {self.name}", wait)
+        self.requests_total += 1
+
+
+def _resize(
+    bucket: TokenBucket | None, rate: float | None, capacity: float
+) -> TokenBucket | None:
+    if not rate:
+        return None
+    if bucket is None:
+        return TokenBucket(rate, capacity)
+    bucket.rate = rate
+    bucket.capacity = capacity
+    bucket.tokens = min(bucket.tokens, capacity)
+    return bucket
+
+
+class UsageStore:
+    """
+    Журнал использования ключей в SQLite: запросы и токены по минутам.
+
+    Записи только прибавляют значения к строке (ключ, минута), поэтому базу
+    могут разделять несколько воркеров. Как и индекс вложений, все обращения
+    идут через один выделенный поток.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="usage-store"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "key TEXT NOT NULL, minute INTEGER NOT NULL, "
+                "requests INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL, "
+                "completion_tokens INTEGER NOT NULL, PRIMARY KEY (key, minute))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _write_sync(self, rows: list[tuple[str, int, int, int, int]]) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO usage VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key, minute) DO UPDATE SET "
+                "requests = requests + excluded.requests, "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens",
+                rows,
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def write(self, rows: list[tuple[str, int, int, int, int]]) -> None:
+        await self._run(self._write_sync, rows)
+
+    async def close(self) -> None:
+        await self._run(self._close_sync)
+
+
+class ApiKeyRegistry:
+    """
+    Реестр ключей доступа: поиск по SHA-256, лимиты и учет использования.
+
+    Ключ ищется по хешу в словаре, а совпадение подтверждается
+    hmac.compare_digest, так что время проверки не зависит от того, сколько
+    символов ключа угадано. Лимиты проверяются в памяти. Использование
+    копится в памяти и пачками сбрасывается в UsageStore фоновой задачей
+    раз в flush_interval секунд, запросы базу не ждут.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self.store = UsageStore(path)
+        self.keys: dict[bytes, ApiKey] = {}
+        self.keys_by_name: dict[str, ApiKey] = {}
+        # (ключ, минута) -> [запросы, токены запроса, токены ответа]
+        self._pending: dict[tuple[str, int], list[int]] = {}
+        self._flusher: asyncio.Task | None = None
+        self.flushed_batches = 0
+
+    @classmethod
+    def from_settings(cls, settings: AppSettings) -> "ApiKeyRegistry":
+        registry = cls(settings.usage_db_path, settings.usage_flush_interval)
+        registry.configure(settings)
+        return registry
+
+    def configure(self, settings: AppSettings) -> None:
+        """Пересобирает реестр; у оставшихся ключей сохраняются ведра и счетчики."""
+        configured = list(settings.api_keys)
+        if settings.bearer_token:
+            configured.append(ApiKeySettings(name="default", key=settings.bearer_token))
+        keys: dict[bytes, ApiKey] = {}
+        for key_settings in configured:
+            key = ApiKey(key_settings)
+            existing = self.keys.get(key.digest)
+            if existing is not None and existing.name == key.name:
+                existing.configure(key_settings)
+                key = existing
+            keys[key.digest] = key
+        self.keys = keys
+        self.keys_by_name = {key.name: key for key in keys.values()}
+
+    def authenticate(self, token: str) -> ApiKey | None:
+        digest = hashlib.sha256(token.encode()).digest()
+        key = self.keys.get(digest)
+        if key is None or not hmac.compare_digest(key.digest, digest):
+            return None
+        return key
+
+    def admit(self, token: str) -> ApiKey | None:
+        """Проверяет ключ и лимиты; None - ключ неизвестен."""
+        key = self.authenticate(token)
+        if key is None:
+            return None
+        key.admit()
+        self._add(key.name, 1, 0, 0)
+        context = get_request_context()
+        if context is not None:
+            context.api_key = key.name
+        return key
+
+    def record_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Списывает токены из usage ответа GigaChat с ключа текущего запроса."""
+        context = get_request_context()
+        if context is None or not context.api_key:
+            return
+        key = self.keys_by_name.get(context.api_key)
+        if key is not None:
+            key.prompt_tokens_total += prompt_tokens
+            key.completion_tokens_total += completion_tokens
+            if key.tokens is not None:
+                key.tokens.debit(prompt_tokens + completion_tokens)
+        self._add(context.api_key, 0, prompt_tokens, completion_tokens)
+
+    def _add(self, name: str, requests: int, prompt: int, completion: int) -> None:
+        counts = self._pending.setdefault((name, int(time.time() // 60)), [0, 0, 0])
+        counts[0] += requests
+        counts[1] += prompt
+        counts[2] += completion
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        rows = [
+            (name, minute, requests, prompt, completion)
+            for (name, minute), (requests, prompt, completion) in pending.items()
+        ]
+        try:
+            await self.store.write(rows)
+        except sqlite3.Error:
+            local_logger.exception("Ошибка записи учета использования ключей")
+            # Вернем пачку, чтобы записать ее со следующей
+            for (name, minute), counts in pending.items():
+                merged = self._pending.setdefault((name, minute), [0, 0, 0])
+                for i, value in enumerate(counts):
+                    merged[i] += value
+            return
+        self.flushed_batches += 1
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        await self.store.close()
+
+
+api_keys = ApiKeyRegistry.from_settings(get_app_settings())
+
+
+@on_settings_reload
+def _apply_api_keys(settings: AppSettings) -> None:
+    api_keys.flush_interval = settings.usage_flush_interval
+    api_keys.configure(settings)
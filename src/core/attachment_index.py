@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from .logging import local_logger
+
+# Старое хранилище лежало в корне проекта рядом с pyproject.toml
+LEGACY_KV_STORE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "kv_store.json"
+)
+
+
+class AttachmentIndex:
+    """
+    Индекс загруженных в GigaChat вложений: ключ содержимого -> id файла.
+
+    Данные хранятся в SQLite (WAL), поэтому вставка - это одна короткая
+    транзакция, а не перезапись всего файла. Все обращения к базе идут через
+    один выделенный поток, так что event loop не блокируется, а конкурентные
+    записи внутри процесса сериализуются. Найденные значения кешируются в памяти.
+
+    Базу можно разделять между воркерами: каждый процесс открывает свое
+    соединение при первом обращении, а блокировки SQLite сериализуют записи
+    разных процессов (ожидание блокировки - до 30 секунд).
+
+    Записи старого kv_store.json переносятся в отдельную таблицу: их ключи
+    считались от base64-строки, а не от декодированного содержимого.
+    """
+
+    def __init__(self, path: str, legacy_path: str | None = LEGACY_KV_STORE_PATH):
+        self.path = path
+        self.legacy_path = legacy_path
+        # Есть ли в базе еще не перенесенные записи старого хранилища
+        self.has_legacy = False
+        self._cache: dict[str, str] = {}
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="attachment-index"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает базу при первом обращении (вызывается в потоке индекса)."""
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS attachments ("
+                "key TEXT PRIMARY KEY, file_id TEXT NOT NULL, "
+                "created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS legacy_attachments ("
+                "key TEXT PRIMARY KEY, file_id TEXT NOT NULL)"
+            )
+            self._conn = conn
+            self._migrate_legacy_store(conn)
+            self.has_legacy = (
+                conn.execute("SELECT 1 FROM legacy_attachments LIMIT 1").fetchone()
+                is not None
+            )
+        return self._conn
+
+    def _migrate_legacy_store(self, conn: sqlite3.Connection) -> None:
+        """Однократно переносит записи из старого kv_store.json."""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, encoding="utf-8") as f:
+                legacy: dict[str, str] = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            local_logger.exception("Ошибка чтения старого хранилища вложений")
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO legacy_attachments (key, file_id) VALUES (?, ?)",
+                legacy.items(),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        try:
+            os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+        except FileNotFoundError:
+            # Файл уже перенес другой воркер
+            return
+        local_logger.info(
+            f"Перенесено {len(legacy)} записей из {self.legacy_path} в {self.path}"
+        )
+
+    def _get_sync(self, key: str) -> str | None:
+        row = (
+            self._connect()
+            .execute("SELECT file_id FROM attachments WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def _set_sync(self, key: str, value: str) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO attachments (key, file_id) VALUES (?, ?)",
+            (key, value),
+        )
+
+    def _adopt_legacy_sync(self, legacy_key: str, key: str) -> str | None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT file_id FROM legacy_attachments WHERE key = ?", (legacy_key,)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO attachments (key, file_id) VALUES (?, ?)",
+                (key, row[0]),
+            )
+            conn.execute("DELETE FROM legacy_attachments WHERE key = ?", (legacy_key,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return row[0]
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def get(self, key: str) -> str | None:
+        """Возвращает id файла по ключу или None."""
+        value = self._cache.get(key)
+        if value is None:
+            value = await self._run(self._get_sync, key)
+            if value is not None:
+                self._cache[key] = value
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        """Сохраняет id файла по ключу."""
+        await self._run(self._set_sync, key, value)
+        self._cache[key] = value
+
+    async def adopt_legacy(self, legacy_key: str, key: str) -> str | None:
+        """
+        Переносит запись старого хранилища под новый ключ.
+
+        Возвращает id файла или None, если записи со старым ключом нет.
+        """
+        value = await self._run(self._adopt_legacy_sync, legacy_key, key)
+        if value is not None:
+            self._cache[key] = value
+        return value
+
+    async def close(self) -> None:
+        """Закрывает соединение с базой."""
+        await self._run(self._close_sync)
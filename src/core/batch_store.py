@@ -0,0 +1,277 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+# Пакеты в этих статусах еще не завершены и продолжаются после перезапуска
+ACTIVE_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+
+BATCH_COLUMNS = (
+    "id",
+    "status",
+    "endpoint",
+    "input_file_id",
+    "completion_window",
+    "metadata",
+    "errors",
+    "output_file_id",
+    "error_file_id",
+    "created_at",
+    "in_progress_at",
+    "expires_at",
+    "finalizing_at",
+    "completed_at",
+    "failed_at",
+    "expired_at",
+    "cancelling_at",
+    "cancelled_at",
+    "total",
+    "completed",
+    "failed",
+    "api_key",
+    "owner",
+    "lease_until",
+    "output_bytes",
+    "error_bytes",
+)
+FILE_COLUMNS = ("id", "filename", "purpose", "bytes", "created_at", "path", "api_key")
+
+
+class BatchStore:
+    """
+    Состояние пакетной обработки в SQLite: файлы, пакеты и выполненные строки.
+
+    Каждый пакет выполняет один воркер - владелец аренды (owner, lease_until).
+    Владелец продлевает аренду на каждой контрольной точке; пакет с истекшей
+    арендой забирает любой воркер, так что пакеты остановленного процесса
+    продолжаются с последней контрольной точки. Контрольная точка - одна
+    транзакция: номера выполненных строк, счетчики и длина файлов результатов.
+    Как и индекс вложений, все обращения идут через один выделенный поток.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="batch-store"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "id TEXT PRIMARY KEY, filename TEXT NOT NULL, purpose TEXT NOT NULL, "
+                "bytes INTEGER NOT NULL, created_at INTEGER NOT NULL, "
+                "path TEXT NOT NULL, api_key TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, endpoint TEXT NOT NULL, "
+                "input_file_id TEXT NOT NULL, completion_window TEXT NOT NULL, "
+                "metadata TEXT, errors TEXT, output_file_id TEXT, error_file_id TEXT, "
+                "created_at INTEGER NOT NULL, in_progress_at INTEGER, "
+                "expires_at INTEGER, finalizing_at INTEGER, completed_at INTEGER, "
+                "failed_at INTEGER, expired_at INTEGER, cancelling_at INTEGER, "
+                "cancelled_at INTEGER, total INTEGER NOT NULL DEFAULT 0, "
+                "completed INTEGER NOT NULL DEFAULT 0, "
+                "failed INTEGER NOT NULL DEFAULT 0, api_key TEXT, owner TEXT, "
+                "lease_until REAL NOT NULL DEFAULT 0, "
+                "output_bytes INTEGER NOT NULL DEFAULT 0, "
+                "error_bytes INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS batches_api_key "
+                "ON batches (api_key, created_at, id)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batch_lines ("
+                "batch_id TEXT NOT NULL, line INTEGER NOT NULL, "
+                "PRIMARY KEY (batch_id, line)) WITHOUT ROWID"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _insert_sync(self, table: str, row: dict[str, Any]) -> None:
+        columns = FILE_COLUMNS if table == "files" else BATCH_COLUMNS
+        unknown = set(row) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {sorted(unknown)}")
+        self._connect().execute(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(row)}) "
+            f"VALUES ({', '.join('?' * len(row))})",
+            tuple(row.values()),
+        )
+
+    def _get_sync(self, table: str, row_id: str) -> dict[str, Any] | None:
+        row = (
+            self._connect()
+            .execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,))
+            .fetchone()
+        )
+        return dict(row) if row else None
+
+    def _list_batches_sync(
+        self, api_key: str, after: str | None, limit: int
+    ) -> list[dict]:
+        # Новые пакеты ключа первыми; after - id последнего пакета предыдущей
+        # страницы
+        query = "SELECT * FROM batches WHERE api_key = ?"
+        params: tuple = (api_key,)
+        if after is not None:
+            query += (
+                " AND (created_at, id) < "
+                "(SELECT created_at, id FROM batches WHERE id = ?)"
+            )
+            params = (*params, after)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        rows = self._connect().execute(query, (*params, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _update_sync(
+        self,
+        batch_id: str,
+        fields: dict[str, Any],
+        owner: str | None,
+        statuses: tuple[str, ...] | None,
+    ) -> bool:
+        unknown = set(fields) - set(BATCH_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown batches columns: {sorted(unknown)}")
+        query = f"UPDATE batches SET {', '.join(f'{name} = ?' for name in fields)}"
+        query += " WHERE id = ?"
+        params: list[Any] = [*fields.values(), batch_id]
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        if statuses is not None:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params += statuses
+        return self._connect().execute(query, params).rowcount > 0
+
+    def _checkpoint_sync(
+        self, batch_id: str, owner: str, lines: list[int], fields: dict[str, Any]
+    ) -> str | None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT status FROM batches WHERE id = ? AND owner = ?",
+                (batch_id, owner),
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.executemany(
+                "INSERT OR IGNORE INTO batch_lines VALUES (?, ?)",
+                ((batch_id, line) for line in lines),
+            )
+            if fields:
+                self._update_sync(batch_id, fields, owner, None)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return row["status"]
+
+    def _done_lines_sync(self, batch_id: str) -> set[int]:
+        rows = self._connect().execute(
+            "SELECT line FROM batch_lines WHERE batch_id = ?", (batch_id,)
+        )
+        return {line for (line,) in rows}
+
+    def _claim_sync(self, owner: str, now: float, lease_until: float) -> list[str]:
+        conn = self._connect()
+        # Воркеры забирают пакеты одновременно; BEGIN IMMEDIATE сериализует их
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [
+                batch_id
+                for (batch_id,) in conn.execute(
+                    "SELECT id FROM batches WHERE lease_until < ? "
+                    f"AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+                    (now, *ACTIVE_STATUSES),
+                )
+            ]
+            conn.executemany(
+                "UPDATE batches SET owner = ?, lease_until = ? WHERE id = ?",
+                ((owner, lease_until, batch_id) for batch_id in ids),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return ids
+
+    def _release_sync(self, owner: str) -> None:
+        self._connect().execute(
+            "UPDATE batches SET lease_until = 0 WHERE owner = ?", (owner,)
+        )
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def add_file(self, **fields: Any) -> None:
+        await self._run(self._insert_sync, "files", fields)
+
+    async def get_file(self, file_id: str) -> dict[str, Any] | None:
+        return await self._run(self._get_sync, "files", file_id)
+
+    async def add_batch(self, **fields: Any) -> None:
+        await self._run(self._insert_sync, "batches", fields)
+
+    async def get_batch(self, batch_id: str) -> dict[str, Any] | None:
+        return await self._run(self._get_sync, "batches", batch_id)
+
+    async def list_batches(
+        self, api_key: str, after: str | None, limit: int
+    ) -> list[dict]:
+        return await self._run(self._list_batches_sync, api_key, after, limit)
+
+    async def update_batch(
+        self,
+        batch_id: str,
+        fields: dict[str, Any],
+        owner: str | None = None,
+        statuses: tuple[str, ...] | None = None,
+    ) -> bool:
+        """Обновляет пакет, если он принадлежит owner и находится в statuses."""
+        return await self._run(self._update_sync, batch_id, fields, owner, statuses)
+
+    async def checkpoint(
+        self, batch_id: str, owner: str, lines: list[int], fields: dict[str, Any]
+    ) -> str | None:
+        """
+        Сохраняет выполненные строки и поля пакета одной транзакцией.
+
+        Возвращает текущий статус пакета или None, если аренда потеряна.
+        """
+        return await self._run(self._checkpoint_sync, batch_id, owner, lines, fields)
+
+    async def done_lines(self, batch_id: str) -> set[int]:
+        return await self._run(self._done_lines_sync, batch_id)
+
+    async def claim(self, owner: str, now: float, lease_until: float) -> list[str]:
+        """Забирает незавершенные пакеты с истекшей арендой."""
+        return await self._run(self._claim_sync, owner, now, lease_until)
+
+    async def release(self, owner: str) -> None:
+        """Отпускает пакеты владельца, чтобы их сразу мог забрать другой воркер."""
+        await self._run(self._release_sync, owner)
+
+    async def close(self) -> None:
+        await self._run(self._close_sync)
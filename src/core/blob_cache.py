@@ -0,0 +1,190 @@
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class CachedBlob:
+    """Загруженное по URL содержимое и данные для его перепроверки."""
+
+    url: str
+    sha256: str
+    mime_type: str
+    etag: str | None
+    last_modified: str | None
+    fresh_until: float
+
+
+class BlobCache:
+    """
+    Кеш скачанных файлов на диске: URL -> содержимое с заголовками валидации.
+
+    Содержимое хранится по SHA-256 (одинаковые файлы с разных URL занимают
+    место один раз), описание URL и время последнего использования - в SQLite
+    в том же каталоге. Когда суммарный размер превышает max_bytes, удаляются
+    давно не использованные файлы вместе с их URL. Файл сначала пишется во
+    временный и затем переименовывается, поэтому каталог можно разделять между
+    воркерами. Как и в других хранилищах, обращения к базе и к файлам идут
+    через один выделенный поток.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="blob-cache"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+            conn = sqlite3.connect(
+                os.path.join(self.directory, "index.db"),
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, "
+                "mime_type TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+                "fresh_until REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS urls_sha256 ON urls (sha256)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.directory, "blobs", sha256[:2], sha256)
+
+    def _lookup_sync(self, url: str) -> CachedBlob | None:
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        if not os.path.exists(self._path(row["sha256"])):
+            # Файл удалили вручную или вытеснил другой воркер
+            conn.execute("DELETE FROM urls WHERE url = ?", (url,))
+            return None
+        conn.execute(
+            "UPDATE blobs SET last_used = ? WHERE sha256 = ?",
+            (time.time(), row["sha256"]),
+        )
+        return CachedBlob(**dict(row))
+
+    def _store_sync(self, blob: CachedBlob, data: bytes) -> None:
+        conn = self._connect()
+        path = self._path(blob.sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)",
+                (blob.sha256, len(data), time.time()),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    blob.url,
+                    blob.sha256,
+                    blob.mime_type,
+                    blob.etag,
+                    blob.last_modified,
+                    blob.fresh_until,
+                ),
+            )
+            evicted = self._evict(conn, keep=blob.sha256)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        for sha256 in evicted:
+            try:
+                os.remove(self._path(sha256))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, conn: sqlite3.Connection, keep: str) -> list[str]:
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        evicted: list[str] = []
+        if total <= self.max_bytes:
+            return evicted
+        rows = conn.execute(
+            "SELECT sha256, size FROM blobs WHERE sha256 != ? ORDER BY last_used",
+            (keep,),
+        )
+        for sha256, size in rows.fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append(sha256)
+            total -= size
+        conn.executemany(
+            "DELETE FROM blobs WHERE sha256 = ?", ((sha256,) for sha256 in evicted)
+        )
+        conn.executemany(
+            "DELETE FROM urls WHERE sha256 = ?", ((sha256,) for sha256 in evicted)
+        )
+        self.evictions += len(evicted)
+        return evicted
+
+    def _refresh_sync(self, blob: CachedBlob) -> None:
+        self._connect().execute(
+            "UPDATE urls SET etag = ?, last_modified = ?, fresh_until = ? "
+            "WHERE url = ?",
+            (blob.etag, blob.last_modified, blob.fresh_until, blob.url),
+        )
+
+    def _read_sync(self, sha256: str) -> bytes | None:
+        try:
+            with open(self._path(sha256), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def lookup(self, url: str) -> CachedBlob | None:
+        """Описание URL, если его содержимое есть в кеше."""
+        return await self._run(self._lookup_sync, url)
+
+    async def store(self, blob: CachedBlob, data: bytes) -> None:
+        await self._run(self._store_sync, blob, data)
+
+    async def refresh(self, blob: CachedBlob) -> None:
+        """Обновляет заголовки и срок свежести после ответа 304."""
+        await self._run(self._refresh_sync, blob)
+
+    async def read(self, sha256: str) -> bytes | None:
+        return await self._run(self._read_sync, sha256)
+
+    async def close(self) -> None:
+        await self._run(self._close_sync)
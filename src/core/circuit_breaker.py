@@ -0,0 +1,172 @@
+import time
+from collections import deque
+from enum import Enum
+
+import httpx
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """GigaChat недоступен: автомат разомкнут, запрос отклонен без обращения."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель обращений к GigaChat.
+
+    В замкнутом состоянии учитывает результаты вызовов за последние window
+    секунд. Если вызовов не меньше min_requests, а доля ошибок (5xx, обрывы,
+    таймауты) или медленных вызовов превысила порог, автомат размыкается:
+    следующие open_duration секунд запросы сразу отклоняются с CircuitOpen,
+    не дожидаясь таймаута. Затем автомат пропускает до half_open_probes
+    пробных вызовов; если все успешны, он замыкается, при первой ошибке
+    снова размыкается.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 30,
+        min_requests: int = 20,
+        failure_rate: float = 0.5,
+        slow_call_duration: float = 10,
+        slow_call_rate: float = 0.8,
+        open_duration: float = 15,
+        half_open_probes: int = 3,
+    ):
+        self.name = name
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+        self.opened_total = 0
+        self.rejected_total = 0
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        # (время, ошибка, медленный вызов)
+        self._calls: deque[tuple[float, bool, bool]] = deque()
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.open_duration
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(self.open_duration - (time.monotonic() - self._opened_at), 1.0)
+
+    def can_attempt(self) -> bool:
+        state = self.state
+        return state == CircuitState.CLOSED or (
+            state == CircuitState.HALF_OPEN and self._probes < self.half_open_probes
+        )
+
+    def before_call(self) -> bool:
+        """Разрешает вызов; возвращает True, если вызов пробный."""
+        if not self.can_attempt():
+            self.rejected_total += 1
+            raise CircuitOpen(
+                f"GigaChat API is unavailable ({self.name})", self.retry_after()
+            )
+        if self._state == CircuitState.HALF_OPEN:
+            self._probes += 1
+            return True
+        return False
+
+    def record(self, probe: bool, failed: bool, duration: float) -> None:
+        slow = duration >= self.slow_call_duration
+        if probe:
+            self._probes = max(self._probes - 1, 0)
+            if self._state != CircuitState.HALF_OPEN:
+                return
+            if failed or slow:
+                self._open()
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._close()
+            return
+        if self._state != CircuitState.CLOSED:
+            # Результат вызова, начатого до размыкания
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, failed, slow))
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+        total = len(self._calls)
+        if total < self.min_requests:
+            return
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow_calls = sum(1 for _, _, slow in self._calls if slow)
+        if (
+            failures / total >= self.failure_rate
+            or slow_calls / total >= self.slow_call_rate
+        ):
+            self._open()
+
+    def abandon(self, probe: bool) -> None:
+        """Вызов отменен до получения результата."""
+        if probe:
+            self._probes = max(self._probes - 1, 0)
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.opened_total += 1
+
+    def _close(self) -> None:
+        self._state = CircuitState.CLOSED
+        self._calls.clear()
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт, пропускающий запросы через CircuitBreaker.
+
+    Длительность считается до получения заголовков ответа, поэтому для
+    потоковых ответов это время до первого байта, а не длина всего потока.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self._transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        probe = self.breaker.before_call()
+        started = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TransportError:
+            self.breaker.record(probe, True, time.monotonic() - started)
+            raise
+        except BaseException:
+            self.breaker.abandon(probe)
+            raise
+        self.breaker.record(
+            probe, response.status_code >= 500, time.monotonic() - started
+        )
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
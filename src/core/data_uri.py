@@ -0,0 +1,63 @@
+import asyncio
+import binascii
+import hashlib
+from concurrent.futures import Executor
+from dataclasses import dataclass
+
+# Размер куска base64 (кратен 4): между кусками поток отпускает GIL,
+# и event loop не простаивает, пока декодируется большое изображение
+DECODE_CHUNK_SIZE = 256 * 1024
+
+
+@dataclass(frozen=True, slots=True)
+class DecodedDataUri:
+    data: bytes
+    mime_type: str
+    sha256: str
+
+
+def decode_data_uri(uri: str) -> DecodedDataUri:
+    """
+    Декодирует base64 data URI и считает SHA-256 от декодированных байт.
+
+    Полезная нагрузка декодируется кусками, не копируя всю строку в срез, хеш
+    считается по тем же кускам; итоговые байты собираются из кусков одной
+    склейкой. Если в base64 есть переносы строк или
+    пробелы, декодируем целиком в нестрогом режиме - они просто пропускаются,
+    поэтому одинаковые изображения с разным форматированием дают одинаковый хеш.
+    """
+    comma = uri.find(",")
+    if not uri.startswith("data:") or comma < 0:
+        raise ValueError("Expected a base64 data URI")
+    mime_type, _, params = uri[5:comma].partition(";")
+    if "base64" not in params.split(";"):
+        raise ValueError("Only base64 encoded data URIs are supported")
+
+    digest = hashlib.sha256()
+    try:
+        parts = []
+        for start in range(comma + 1, len(uri), DECODE_CHUNK_SIZE):
+            part = binascii.a2b_base64(
+                uri[start : start + DECODE_CHUNK_SIZE], strict_mode=True
+            )
+            digest.update(part)
+            parts.append(part)
+        data = b"".join(parts)
+    except binascii.Error:
+        data = binascii.a2b_base64(uri[comma + 1 :])
+        digest = hashlib.sha256(data)
+    return DecodedDataUri(
+        data=data,
+        mime_type=mime_type or "application/octet-stream",
+        sha256=digest.hexdigest(),
+    )
+
+
+async def adecode_data_uri(
+    uri: str, executor: Executor | None, offload_threshold: int
+) -> DecodedDataUri:
+    """Декодирует data URI, вынося большие изображения в пул потоков."""
+    if len(uri) < offload_threshold:
+        return decode_data_uri(uri)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, decode_data_uri, uri)
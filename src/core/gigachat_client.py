@@ -0,0 +1,170 @@
+import asyncio
+import math
+import time
+from typing import Any
+
+import httpx
+from gigachat import GigaChat
+from gigachat.client import _get_auth_kwargs
+from gigachat.exceptions import GigaChatException
+
+from .circuit_breaker import CircuitBreaker, CircuitBreakerTransport, CircuitOpen
+from .http_pool import InstrumentedTransport, ShardedTransport
+from .logging import local_logger
+from .request_context import timed
+from .single_flight import SingleFlight
+
+# Ошибки получения токена: ответ GigaChat, сбой сети или разомкнутый автомат
+# (токен по логину и паролю запрашивается через API)
+TOKEN_ERRORS = (GigaChatException, httpx.HTTPError, CircuitOpen)
+
+
+class PooledGigaChat(GigaChat):
+    """
+    Клиент GigaChat, HTTP-соединениями которого управляет адаптер.
+
+    Асинхронный HTTP-клиент строится на ShardedTransport с заданными лимитами
+    пула и числом HTTP/2-соединений. Клиенты создаются при первом обращении и
+    пересоздаются после aclose(), поэтому их можно явно открывать и закрывать
+    в lifespan приложения.
+
+    Если передан breaker, запросы к API (кроме авторизации) проходят через
+    автоматический выключатель.
+
+    Токен доступа обновляется фоновой задачей за token_refresh_margin секунд
+    до истечения, а одновременные попытки обновления объединяются в одну,
+    так что в штатном режиме запросы не ждут авторизации.
+    """
+
+    def __init__(
+        self,
+        *,
+        limits: httpx.Limits,
+        http2_connections: int = 1,
+        token_refresh_margin: float = 60,
+        token_retry_interval: float = 5,
+        breaker: CircuitBreaker | None = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self._limits = limits
+        self._http2_connections = max(http2_connections, 1)
+        self._http: httpx.AsyncClient | None = None
+        self._auth_http: httpx.AsyncClient | None = None
+        self.transport: ShardedTransport | None = None
+        self.breaker = breaker
+        self._token_refresh_margin = token_refresh_margin
+        self._token_retry_interval = token_retry_interval
+        self._token_updates: SingleFlight[str, None] = SingleFlight()
+        self._token_refresher: asyncio.Task | None = None
+
+    def token_expires_in(self) -> float | None:
+        """Секунд до истечения токена; None - у токена нет срока действия."""
+        if self._access_token is None:
+            return 0.0
+        expires_at: float = self._access_token.expires_at
+        if not expires_at:
+            return None
+        # OAuth отдает время в миллисекундах, но встречаются и секунды
+        if expires_at > 10**11:
+            expires_at /= 1000
+        return expires_at - time.time()
+
+    def _check_validity_token(self) -> bool:
+        if self._access_token is None:
+            return False
+        expires_in = self.token_expires_in()
+        return expires_in is None or expires_in > 0
+
+    async def _aupdate_token(self) -> None:
+        with timed("token"):
+            await self._token_updates.do("token", super()._aupdate_token)
+
+    def start_token_refresh(self) -> None:
+        """Запускает фоновое обновление токена."""
+        if self._use_auth and self._token_refresher is None:
+            self._token_refresher = asyncio.create_task(self._refresh_token_loop())
+
+    async def stop_token_refresh(self) -> None:
+        if self._token_refresher is not None:
+            self._token_refresher.cancel()
+            try:
+                await self._token_refresher
+            except asyncio.CancelledError:
+                pass
+            self._token_refresher = None
+
+    async def _refresh_token_loop(self) -> None:
+        while True:
+            expires_in = self.token_expires_in()
+            if expires_in is None:
+                return
+            delay = expires_in - self._token_refresh_margin
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self._aupdate_token()
+            except TOKEN_ERRORS as e:
+                local_logger.warning(f"Не удалось обновить токен GigaChat: {e}")
+                await asyncio.sleep(self._token_retry_interval)
+                continue
+            # Токен короче запаса обновления не должен зациклить задачу
+            expires_in = self.token_expires_in()
+            if expires_in is not None and expires_in <= self._token_refresh_margin:
+                await asyncio.sleep(self._token_retry_interval)
+
+    async def aclose(self) -> None:
+        await self.stop_token_refresh()
+        await super().aclose()
+
+    def _shard_limits(self) -> httpx.Limits:
+        # Лимиты пула делятся между шардами
+        shards = self._http2_connections
+
+        def split(value: int | None) -> int | None:
+            return None if value is None else max(math.ceil(value / shards), 1)
+
+        return httpx.Limits(
+            max_connections=split(self._limits.max_connections),
+            max_keepalive_connections=split(self._limits.max_keepalive_connections),
+            keepalive_expiry=self._limits.keepalive_expiry,
+        )
+
+    def connect(self) -> httpx.AsyncClient:
+        """Создает HTTP-клиент к GigaChat, если он еще не создан или был закрыт."""
+        if self._http is None or self._http.is_closed:
+            settings = self._settings
+            verify: str | bool = settings.ca_bundle_file or settings.verify_ssl_certs
+            cert = None
+            if settings.cert_file:
+                cert = (
+                    settings.cert_file,
+                    settings.key_file,
+                    settings.key_file_password,
+                )
+            self.transport = ShardedTransport(
+                self._http2_connections,
+                http2=True,
+                verify=verify,
+                cert=cert,
+                limits=self._shard_limits(),
+            )
+            transport: httpx.AsyncBaseTransport = InstrumentedTransport(self.transport)
+            if self.breaker is not None:
+                transport = CircuitBreakerTransport(transport, self.breaker)
+            self._http = httpx.AsyncClient(
+                base_url=settings.base_url,
+                timeout=httpx.Timeout(settings.timeout),
+                transport=transport,
+            )
+        return self._http
+
+    @property  # type: ignore[override]
+    def _aclient(self) -> httpx.AsyncClient:
+        return self.connect()
+
+    @property  # type: ignore[override]
+    def _auth_aclient(self) -> httpx.AsyncClient:
+        if self._auth_http is None or self._auth_http.is_closed:
+            self._auth_http = httpx.AsyncClient(**_get_auth_kwargs(self._settings))
+        return self._auth_http
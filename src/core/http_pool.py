@@ -0,0 +1,94 @@
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+import httpx
+
+from .metrics import UPSTREAM_DURATION, UPSTREAM_ERRORS
+from .request_context import request_labels
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Тело ответа, по закрытию которого освобождается слот шарда."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release: Callable[[], None] | None = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class ShardedTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт, распределяющий запросы по нескольким независимым пулам.
+
+    При HTTP/2 каждый пул держит к GigaChat одно соединение, на котором
+    мультиплексируются все потоки. Несколько шардов дают несколько соединений,
+    поэтому упираемся в max_concurrent_streams сервера позже и меньше страдаем
+    от head-of-line блокировок. Запрос уходит в шард с наименьшим числом
+    активных запросов; запрос считается активным, пока не закрыто тело ответа.
+    """
+
+    def __init__(self, shards: int = 1, **transport_kwargs: Any):
+        self._shards = [
+            httpx.AsyncHTTPTransport(**transport_kwargs) for _ in range(max(shards, 1))
+        ]
+        self.active = [0] * len(self._shards)
+        self.peak_active = 0
+        self.requests_total = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        index = min(range(len(self._shards)), key=self.active.__getitem__)
+        self.active[index] += 1
+        self.requests_total += 1
+        self.peak_active = max(self.peak_active, sum(self.active))
+
+        def release() -> None:
+            self.active[index] -= 1
+
+        try:
+            response = await self._shards[index].handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        response.stream = _TrackedStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        for shard in self._shards:
+            await shard.aclose()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Транспорт, измеряющий обращения к GigaChat до получения заголовков."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _, model = request_labels()
+        endpoint = request.url.path
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TransportError as e:
+            UPSTREAM_ERRORS.labels(endpoint, model, type(e).__name__).inc()
+            raise
+        UPSTREAM_DURATION.labels(endpoint, model).observe(time.perf_counter() - started)
+        if response.status_code >= 400:
+            UPSTREAM_ERRORS.labels(endpoint, model, str(response.status_code)).inc()
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
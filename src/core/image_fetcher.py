@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import ipaddress
+import re
+import socket
+import time
+from dataclasses import replace
+
+import httpx
+
+from .blob_cache import BlobCache, CachedBlob
+from .single_flight import SingleFlight
+
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)")
+
+
+class ImageFetchError(Exception):
+    """Изображение по URL нельзя получить или оно не подходит."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def fresh_until(headers: httpx.Headers, now: float, default_ttl: float) -> float:
+    """
+    До какого момента ответ можно использовать без перепроверки.
+
+    Срок берется из Cache-Control: max-age, а если его нет - default_ttl.
+    При no-cache и no-store каждое обращение перепроверяет URL условным
+    запросом: содержимое все равно нужно сохранить, чтобы загрузить в GigaChat.
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return now
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return now + int(match.group(1))
+    return now + default_ttl
+
+
+class ImageFetcher:
+    """
+    Скачивает изображения по http(s) URL через общий пул соединений.
+
+    Скачанное содержимое кладется в BlobCache. Пока ответ свежий, повторные
+    обращения к URL не выходят в сеть; после этого URL перепроверяется
+    условным запросом (If-None-Match / If-Modified-Since), и ответ 304 не
+    передает тело заново. Одновременные обращения к одному URL объединяются.
+    Размер ответа ограничен max_bytes, а вся загрузка с переадресациями -
+    timeout секундами. Пока не разрешен allow_private, URL с адресами
+    локальной и частных сетей отклоняются на каждом шаге переадресации.
+    """
+
+    def __init__(
+        self,
+        cache: BlobCache,
+        max_bytes: int,
+        timeout: float,
+        default_ttl: float,
+        max_connections: int,
+        allow_private: bool = False,
+    ):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.default_ttl = default_ttl
+        self.allow_private = allow_private
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            headers={"Accept": "image/*"},
+        )
+        self._fetches: SingleFlight[str, CachedBlob] = SingleFlight()
+        self.requests = 0
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.downloads = 0
+        self.downloaded_bytes = 0
+
+    @property
+    def deduplicated(self) -> int:
+        return self._fetches.deduplicated
+
+    async def fetch(self, url: str) -> CachedBlob:
+        """Описание изображения по URL; содержимое читается через read()."""
+        self.requests += 1
+        return await self._fetches.do(url, lambda: self._fetch(url))
+
+    async def read(self, blob: CachedBlob) -> bytes:
+        """
+        Содержимое изображения из кеша.
+
+        Если его успели вытеснить, изображение скачивается заново.
+        """
+        data = await self.cache.read(blob.sha256)
+        if data is None:
+            data, downloaded = await self._download(blob.url, None)
+            if downloaded.sha256 != blob.sha256:
+                raise ImageFetchError(f"Image at {blob.url} changed while in use")
+        return data
+
+    async def _fetch(self, url: str) -> CachedBlob:
+        cached = await self.cache.lookup(url)
+        if cached is not None and cached.fresh_until > time.time():
+            self.fresh_hits += 1
+            return cached
+        _, blob = await self._download(url, cached)
+        return blob
+
+    async def _download(
+        self, url: str, cached: CachedBlob | None
+    ) -> tuple[bytes, CachedBlob]:
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        try:
+            async with asyncio.timeout(self.timeout):
+                response, data = await self._get(url, headers)
+        except TimeoutError:
+            raise ImageFetchError(f"Timed out fetching image from {url}") from None
+        except httpx.HTTPError as e:
+            raise ImageFetchError(f"Could not fetch image from {url}: {e}") from e
+
+        now = time.time()
+        if response.status_code == 304 and cached is not None:
+            self.revalidated += 1
+            blob = replace(
+                cached,
+                etag=response.headers.get("etag", cached.etag),
+                last_modified=response.headers.get(
+                    "last-modified", cached.last_modified
+                ),
+                fresh_until=fresh_until(response.headers, now, self.default_ttl),
+            )
+            await self.cache.refresh(blob)
+            return b"", blob
+
+        mime_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if not mime_type.startswith("image/"):
+            raise ImageFetchError(f"URL {url} is not an image ({mime_type or 'none'})")
+        self.downloads += 1
+        self.downloaded_bytes += len(data)
+        blob = CachedBlob(
+            url=url,
+            sha256=hashlib.sha256(data).hexdigest(),
+            mime_type=mime_type,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            fresh_until=fresh_until(response.headers, now, self.default_ttl),
+        )
+        await self.cache.store(blob, data)
+        return data, blob
+
+    async def _get(
+        self, url: str, headers: dict[str, str]
+    ) -> tuple[httpx.Response, bytes]:
+        # Переадресации проходим сами, чтобы проверить адрес каждого шага
+        for _ in range(MAX_REDIRECTS + 1):
+            await self._check_url(url)
+            async with self._client.stream("GET", url, headers=headers) as response:
+                if response.status_code in REDIRECT_STATUSES:
+                    url = str(response.url.join(response.headers.get("location", "")))
+                    continue
+                if response.status_code == 304:
+                    return response, b""
+                if response.status_code != 200:
+                    raise ImageFetchError(
+                        f"Image URL {url} returned HTTP {response.status_code}"
+                    )
+                length = response.headers.get("content-length")
+                if length is not None and length.isdigit():
+                    self._check_size(url, int(length))
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    self._check_size(url, size)
+                    chunks.append(chunk)
+                return response, b"".join(chunks)
+        raise ImageFetchError(f"Too many redirects fetching image from {url}")
+
+    def _check_size(self, url: str, size: int) -> None:
+        if size > self.max_bytes:
+            raise ImageFetchError(
+                f"Image at {url} exceeds {self.max_bytes} bytes", status_code=413
+            )
+
+    async def _check_url(self, url: str) -> None:
+        parsed = httpx.URL(url)
+        if parsed.scheme not in ("http", "https") or not parsed.host:
+            raise ImageFetchError(f"Unsupported image URL {url}")
+        if self.allow_private:
+            return
+        try:
+            addresses = [ipaddress.ip_address(parsed.host)]
+        except ValueError:
+            loop = asyncio.get_running_loop()
+            try:
+                infos = await loop.getaddrinfo(
+                    parsed.host, parsed.port, type=socket.SOCK_STREAM
+                )
+            except OSError as e:
+                raise ImageFetchError(f"Could not resolve {parsed.host}: {e}") from e
+            addresses = [ipaddress.ip_address(info[4][0]) for info in infos]
+        if any(not address.is_global for address in addresses):
+            raise ImageFetchError(f"Image URL {url} points to a private address")
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+        await self.cache.close()
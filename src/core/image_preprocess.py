@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from .data_uri import DecodedDataUri
+from .logging import local_logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow - необязательная зависимость (extra images)
+    Image = None  # type: ignore[assignment]
+    ImageOps = None  # type: ignore[assignment]
+
+# Форматы, которые имеет смысл пересжимать; GIF может быть анимированным
+SUPPORTED_MIME_TYPES = frozenset(
+    ("image/png", "image/jpeg", "image/bmp", "image/tiff", "image/webp")
+)
+
+
+def preprocess_image(
+    data: bytes, max_dimension: int, quality: int
+) -> tuple[bytes, str] | None:
+    """
+    Уменьшает изображение до max_dimension по большей стороне и пересжимает.
+
+    Выполняется в процессе пула. Результат кодируется в JPEG; если уменьшенный
+    JPEG не меньше исходного файла (плоские скриншоты хорошо жмутся в PNG),
+    пробуется PNG. Прозрачность заливается белым, ориентация из EXIF
+    применяется к пикселям, метаданные отбрасываются. Возвращает None, если
+    результат не меньше исходного файла.
+    """
+    with Image.open(BytesIO(data)) as source:
+        if getattr(source, "is_animated", False):
+            return None
+        # JPEG декодируется сразу в уменьшенном масштабе
+        source.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(source)
+    resized = max(image.size) > max_dimension
+    if resized:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    output = BytesIO()
+    image.save(output, "JPEG", quality=quality, optimize=True)
+    result, mime_type = output.getvalue(), "image/jpeg"
+    if len(result) >= len(data) and resized:
+        output = BytesIO()
+        image.save(output, "PNG", optimize=True)
+        result, mime_type = output.getvalue(), "image/png"
+    if len(result) >= len(data):
+        return None
+    return result, mime_type
+
+
+class ImagePreprocessor:
+    """
+    Уменьшение и пересжатие изображений перед загрузкой в GigaChat.
+
+    Работа идет в пуле процессов (spawn, чтобы не наследовать потоки и
+    соединения воркера), поэтому event loop не блокируется и не делит GIL
+    с декодированием. Пул создается при первом изображении. Изображения
+    меньше min_bytes и неподдерживаемые форматы передаются как есть, как и
+    изображения, которые не удалось обработать. Хеш исходного содержимого
+    сохраняется, так что индекс вложений находит обработанный файл по
+    оригиналу и обработка выполняется один раз на изображение.
+    """
+
+    def __init__(self, max_dimension: int, quality: int, min_bytes: int, workers: int):
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.min_bytes = min_bytes
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.seconds_total = 0.0
+
+    @staticmethod
+    def available() -> bool:
+        return Image is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def process(self, image: DecodedDataUri) -> DecodedDataUri:
+        if len(image.data) < self.min_bytes or (
+            image.mime_type not in SUPPORTED_MIME_TYPES
+        ):
+            self.skipped += 1
+            return image
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(),
+                preprocess_image,
+                image.data,
+                self.max_dimension,
+                self.quality,
+            )
+        # Pillow бросает разные исключения на поврежденных и слишком больших
+        # изображениях; при любой ошибке отправляется исходное изображение
+        except Exception as e:  # noqa: BLE001
+            if isinstance(e, BrokenProcessPool):
+                # Процесс пула упал (например, по памяти) - пересоздадим пул
+                self.close()
+            self.failed += 1
+            local_logger.warning("Не удалось обработать изображение: %s", e)
+            return image
+        finally:
+            self.seconds_total += time.perf_counter() - started
+        if result is None:
+            self.skipped += 1
+            return image
+        data, mime_type = result
+        self.processed += 1
+        self.bytes_before += len(image.data)
+        self.bytes_after += len(data)
+        return DecodedDataUri(data=data, mime_type=mime_type, sha256=image.sha256)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
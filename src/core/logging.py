@@ -1,7 +1,12 @@
 import logging
 
-from .settings import get_app_settings
+from .settings import AppSettings, get_app_settings, on_settings_reload
 
 app_settings = get_app_settings()
 local_logger = logging.getLogger("uvicorn")
 local_logger.setLevel(logging.DEBUG if app_settings.debug else logging.INFO)
+
+
+@on_settings_reload
+def _apply_log_level(settings: AppSettings) -> None:
+    local_logger.setLevel(logging.DEBUG if settings.debug else logging.INFO)
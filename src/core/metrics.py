@@ -0,0 +1,273 @@
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import Any, TypeVar
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)  # fmt: skip
+CHUNK_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+M = TypeVar("M", bound="_Metric")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Any] = {}
+
+    def _header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def labels(self, *values: str) -> _CounterChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _CounterChild()
+        return child
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for values, child in self._children.items():
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}{labels} {_format_value(child.value)}")
+        return lines
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def labels(self, *values: str) -> _GaugeChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _GaugeChild()
+        return child
+
+
+class CallbackGauge(_Metric):
+    """Gauge, значения которого вычисляются при каждом сборе метрик."""
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str],
+        collect: Callable[[], Iterable[tuple[tuple[str, ...], float]]],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._collect = collect
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for values, value in self._collect():
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        names = (*self.labelnames, "le")
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                labels = _format_labels(names, (*values, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Минимальный реестр метрик в формате Prometheus.
+
+    Запись метрики - поиск дочернего объекта по кортежу меток в словаре и
+    арифметика без блокировок: все обновления идут из цикла событий. Текст
+    для /metrics формируется только при сборе.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.register(
+    Histogram(
+        "gigachat_adapter_request_duration_seconds",
+        "End-to-end request duration, including the whole stream.",
+        ("endpoint", "model"),
+    )
+)
+RESPONSES = registry.register(
+    Counter(
+        "gigachat_adapter_responses_total",
+        "Responses sent to clients by HTTP status.",
+        ("endpoint", "model", "status"),
+    )
+)
+REQUESTS_IN_FLIGHT = registry.register(
+    Gauge(
+        "gigachat_adapter_requests_in_flight",
+        "Requests currently being served.",
+        ("endpoint", "model"),
+    )
+)
+UPSTREAM_DURATION = registry.register(
+    Histogram(
+        "gigachat_adapter_upstream_duration_seconds",
+        "Time until GigaChat returned response headers.",
+        ("endpoint", "model"),
+    )
+)
+UPSTREAM_ERRORS = registry.register(
+    Counter(
+        "gigachat_adapter_upstream_errors_total",
+        "Failed GigaChat calls by HTTP status or transport error.",
+        ("endpoint", "model", "status"),
+    )
+)
+TIME_TO_FIRST_TOKEN = registry.register(
+    Histogram(
+        "gigachat_adapter_time_to_first_token_seconds",
+        "Time from receiving a streaming request to its first chunk.",
+        ("endpoint", "model"),
+    )
+)
+INTER_CHUNK_LATENCY = registry.register(
+    Histogram(
+        "gigachat_adapter_inter_chunk_latency_seconds",
+        "Time between consecutive chunks of a stream.",
+        ("endpoint", "model"),
+        buckets=CHUNK_BUCKETS,
+    )
+)
+TOKENS = registry.register(
+    Counter(
+        "gigachat_adapter_tokens_total",
+        "Tokens reported by GigaChat usage.",
+        ("endpoint", "model", "type"),
+    )
+)
+ATTACHMENT_LOOKUPS = registry.register(
+    Counter(
+        "gigachat_adapter_attachment_lookups_total",
+        "Attachment index lookups by result (hit or miss).",
+        ("endpoint", "model", "result"),
+    )
+)
+
+
+def _attachment_hit_ratio() -> Iterable[tuple[tuple[str, ...], float]]:
+    totals: dict[tuple[str, ...], list[float]] = {}
+    for (endpoint, model, result), child in ATTACHMENT_LOOKUPS._children.items():
+        counts = totals.setdefault((endpoint, model), [0.0, 0.0])
+        counts[result == "hit"] += child.value
+    for labels, (misses, hits) in totals.items():
+        yield labels, hits / (hits + misses) if hits + misses else 0.0
+
+
+registry.register(
+    CallbackGauge(
+        "gigachat_adapter_attachment_cache_hit_ratio",
+        "Share of attachments found in the index instead of being uploaded.",
+        ("endpoint", "model"),
+        _attachment_hit_ratio,
+    )
+)
@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+from collections.abc import Awaitable, Callable, Hashable
+
+
+class _Batch[K: Hashable, T]:
+    def __init__(self) -> None:
+        self.items: dict[K, asyncio.Future[T]] = {}
+        self.cost = 0
+        self.timer: asyncio.Handle | None = None
+
+
+class MicroBatcher[G: Hashable, K: Hashable, T]:
+    """
+    Объединяет одновременные вызовы в пачки по группам (например, по модели).
+
+    Элементы копятся в пачке группы, пока в ней не наберется max_size
+    элементов или max_cost единиц стоимости, либо не пройдет max_wait секунд.
+    Окно адаптивное: если у группы нет пачки в работе, пачка отправляется на
+    следующей итерации цикла событий и задержки не добавляет - в нее попадают
+    только вызовы, пришедшие одновременно. Пока пачка группы в работе, новые
+    элементы ждут ее завершения, но не дольше max_wait, так что под нагрузкой
+    пачки растут сами.
+
+    Одинаковые элементы в одной пачке отправляются один раз, результат
+    получают все вызвавшие. Пачка собирает элементы разных вызывающих, поэтому
+    при ошибке, которую мог вызвать один элемент (split_on), пачка делится
+    пополам и половины отправляются заново, пока ошибка не останется только
+    у элемента, который ее вызвал. Прочие ошибки передаются всем элементам
+    пачки. Отмена вызова не отменяет пачку.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[G, list[K]], Awaitable[list[T]]],
+        max_size: int,
+        max_cost: int,
+        max_wait: float,
+        cost: Callable[[K], int] = lambda item: 1,
+        split_on: Callable[[Exception], bool] = lambda error: True,
+    ):
+        self._func = func
+        self._cost = cost
+        self._split_on = split_on
+        self.max_size = max_size
+        self.max_cost = max_cost
+        self.max_wait = max_wait
+        self._pending: dict[G, _Batch[K, T]] = {}
+        self._inflight: dict[G, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.splits = 0
+
+    @property
+    def inflight(self) -> int:
+        return sum(self._inflight.values())
+
+    async def submit(self, group: G, item: K) -> T:
+        self.submitted += 1
+        batch = self._pending.get(group)
+        future = batch.items.get(item) if batch is not None else None
+        if future is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(future)
+
+        cost = self._cost(item)
+        if batch is not None and batch.cost + cost > self.max_cost:
+            self._flush(group)
+            batch = None
+        if batch is None:
+            batch = self._open(group)
+        future = asyncio.get_running_loop().create_future()
+        # Исключение считается полученным, даже если все ожидающие отменены
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        batch.items[item] = future
+        batch.cost += cost
+        if len(batch.items) >= self.max_size or batch.cost >= self.max_cost:
+            self._flush(group)
+        return await asyncio.shield(future)
+
+    def _open(self, group: G) -> _Batch[K, T]:
+        batch: _Batch[K, T] = _Batch()
+        self._pending[group] = batch
+        loop = asyncio.get_running_loop()
+        if self._inflight.get(group):
+            batch.timer = loop.call_later(self.max_wait, self._flush, group)
+        else:
+            batch.timer = loop.call_soon(self._flush, group)
+        return batch
+
+    def _flush(self, group: G) -> None:
+        batch = self._pending.pop(group, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        self._inflight[group] = self._inflight.get(group, 0) + 1
+        # Пачка выполняется вне контекста запроса, который ее открыл
+        task = asyncio.get_running_loop().create_task(
+            self._run(group, batch), context=contextvars.Context()
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group: G, batch: _Batch[K, T]) -> None:
+        try:
+            await self._call(group, batch.items)
+        except asyncio.CancelledError:
+            for future in batch.items.values():
+                future.cancel()
+            raise
+        finally:
+            self._inflight[group] -= 1
+            if not self._inflight[group]:
+                del self._inflight[group]
+                # Группа освободилась - ожидающую пачку отправляем сразу
+                self._flush(group)
+
+    async def _call(self, group: G, futures: dict[K, asyncio.Future[T]]) -> None:
+        items = list(futures)
+        self.batches += 1
+        self.batched_items += len(items)
+        try:
+            results = await self._func(group, items)
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"Batch returned {len(results)} results for {len(items)} items"
+                )
+        # Ошибка не теряется: она передается всем ожидающим элементам пачки
+        except Exception as e:  # noqa: BLE001
+            if len(items) > 1 and self._split_on(e):
+                self.splits += 1
+                middle = len(items) // 2
+                await asyncio.gather(
+                    self._call(group, {item: futures[item] for item in items[:middle]}),
+                    self._call(group, {item: futures[item] for item in items[middle:]}),
+                )
+                return
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for item, result in zip(items, results):
+                future = futures[item]
+                if not future.done():
+                    future.set_result(result)
+
+    async def aclose(self) -> None:
+        for group in list(self._pending):
+            self._flush(group)
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from ..models.models import ListModelsResponse
+from .logging import local_logger
+from .single_flight import SingleFlight
+
+
+@dataclass(frozen=True, slots=True)
+class ModelCatalogSnapshot:
+    models: ListModelsResponse
+    ids: frozenset[str]
+    etag: str
+    fetched_at: float
+
+
+class ModelCatalog:
+    """
+    Список моделей GigaChat в памяти.
+
+    Пока данные моложе ttl, они отдаются без обращения к API. Устаревшие (но не
+    старше max_stale) данные тоже отдаются сразу, а обновление запускается в
+    фоне (stale-while-revalidate). Одновременные обновления объединяются в одно.
+    Результат последнего обращения к API служит состоянием здоровья GigaChat
+    для readiness-проверки.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[ListModelsResponse]],
+        ttl: float,
+        max_stale: float,
+        health_check_interval: float,
+    ):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.health_check_interval = health_check_interval
+        self._snapshot: ModelCatalogSnapshot | None = None
+        self._refreshes: SingleFlight[str, ModelCatalogSnapshot] = SingleFlight()
+        self._background: set[asyncio.Task] = set()
+        self.healthy: bool | None = None
+        self.checked_at = 0.0
+
+    async def get(self) -> ModelCatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.fetched_at > self.max_stale:
+            return await self.refresh()
+        if time.monotonic() - snapshot.fetched_at > self.ttl:
+            self._refresh_in_background()
+        return snapshot
+
+    def known(self, model: str) -> bool:
+        """Есть ли модель в последнем загруженном списке (без обращения к API)."""
+        snapshot = self._snapshot
+        return snapshot is not None and model in snapshot.ids
+
+    async def refresh(self) -> ModelCatalogSnapshot:
+        return await self._refreshes.do("models", self._load)
+
+    async def check_health(self) -> bool:
+        """Возвращает последнее известное состояние GigaChat API."""
+        if self.healthy is None:
+            try:
+                await self.refresh()
+            except Exception:
+                local_logger.exception("GigaChat API недоступен")
+        elif time.monotonic() - self.checked_at > self.health_check_interval:
+            self._refresh_in_background()
+        return bool(self.healthy)
+
+    async def aclose(self) -> None:
+        """Останавливает фоновые обновления и забывает загруженные данные."""
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        self._snapshot = None
+        self.healthy = None
+
+    def _refresh_in_background(self) -> None:
+        if self._refreshes.inflight:
+            return
+        task = asyncio.create_task(self.refresh())
+        self._background.add(task)
+        task.add_done_callback(self._on_background_done)
+
+    def _on_background_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            local_logger.warning(
+                f"Не удалось обновить список моделей: {task.exception()}"
+            )
+
+    async def _load(self) -> ModelCatalogSnapshot:
+        try:
+            models = await self._fetch()
+        except Exception:
+            self.healthy = False
+            raise
+        finally:
+            self.checked_at = time.monotonic()
+        body = models.model_dump_json().encode()
+        self.healthy = True
+        self._snapshot = ModelCatalogSnapshot(
+            models=models,
+            ids=frozenset(m.id for m in models.data),
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            fetched_at=time.monotonic(),
+        )
+        return self._snapshot
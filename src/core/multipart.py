@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+from collections.abc import AsyncIterable
+from dataclasses import dataclass, field
+from tempfile import SpooledTemporaryFile
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Предел размера текстового поля формы; файлы ограничены параметром max_size
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class MultipartError(ValueError):
+    """Тело запроса не является корректной multipart/form-data формой."""
+
+
+class MultipartTooLarge(MultipartError):
+    """Файлы формы больше допустимого размера."""
+
+
+@dataclass(slots=True)
+class SpooledUpload:
+    """
+    Файл из формы: до max_memory байт в памяти, дальше - во временном файле.
+
+    SHA-256 и размер считаются по мере чтения тела, поэтому после разбора их
+    не нужно получать повторным проходом по файлу.
+    """
+
+    filename: str
+    content_type: str
+    file: SpooledTemporaryFile[bytes]
+    size: int = 0
+    sha256: str = ""
+    _digest: "hashlib._Hash" = field(default_factory=hashlib.sha256, repr=False)
+
+
+@dataclass(slots=True)
+class MultipartForm:
+    fields: dict[str, str] = field(default_factory=dict)
+    files: dict[str, SpooledUpload] = field(default_factory=dict)
+
+    def close(self) -> None:
+        for upload in self.files.values():
+            upload.file.close()
+
+
+class _Part:
+    __slots__ = ("content_type", "data", "filename", "name", "upload")
+
+    def __init__(self) -> None:
+        self.name = ""
+        self.filename: str | None = None
+        self.content_type = "application/octet-stream"
+        self.data = bytearray()
+        self.upload: SpooledUpload | None = None
+
+
+def _write(upload: SpooledUpload, data: bytes) -> None:
+    upload._digest.update(data)
+    upload.file.write(data)
+
+
+async def parse_multipart(
+    content_type: str, body: AsyncIterable[bytes], max_memory: int, max_size: int
+) -> MultipartForm:
+    """
+    Разбирает multipart/form-data по мере получения тела запроса.
+
+    Содержимое файлов сразу хешируется и пишется в SpooledTemporaryFile, так
+    что в памяти одновременно держится не больше max_memory байт файла и
+    одного куска тела. Пока файл помещается в память, куски пишутся прямо в
+    event loop; после перехода на диск запись и хеширование уходят в поток.
+    Если файлы формы в сумме больше max_size байт, разбор прерывается с
+    MultipartTooLarge, не дочитывая тело.
+    """
+    media_type, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if media_type != b"multipart/form-data" or not boundary:
+        raise MultipartError("Expected multipart/form-data with a boundary")
+
+    form = MultipartForm()
+    part = _Part()
+    header_field = bytearray()
+    header_value = bytearray()
+    headers: dict[bytes, bytes] = {}
+    # Куски файлов, разобранные из последнего куска тела
+    pending: list[tuple[SpooledUpload, bytes]] = []
+    total_size = 0
+    complete = False
+
+    def on_part_begin() -> None:
+        nonlocal part
+        part = _Part()
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        disposition, params = parse_options_header(headers.get(b"content-disposition"))
+        if disposition != b"form-data" or b"name" not in params:
+            raise MultipartError("Part without a form-data name")
+        part.name = params[b"name"].decode("latin-1")
+        if b"filename" in params:
+            part.filename = params[b"filename"].decode("utf-8", "replace")
+            if b"content-type" in headers:
+                part.content_type = headers[b"content-type"].decode("latin-1")
+            # Файл живет дольше разбора: его закрывает MultipartForm.close(),
+            # в том числе при ошибке разбора
+            part.upload = SpooledUpload(
+                filename=part.filename,
+                content_type=part.content_type,
+                file=SpooledTemporaryFile(max_size=max_memory),  # noqa: SIM115
+            )
+            form.files[part.name] = part.upload
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if part.upload is not None:
+            pending.append((part.upload, data[start:end]))
+            return
+        part.data.extend(data[start:end])
+        if len(part.data) > MAX_FIELD_SIZE:
+            raise MultipartError(f"Form field exceeds {MAX_FIELD_SIZE} bytes")
+
+    def on_part_end() -> None:
+        if part.upload is None:
+            form.fields[part.name] = part.data.decode("utf-8", "replace")
+
+    def on_end() -> None:
+        nonlocal complete
+        complete = True
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_end": on_end,
+        },
+    )
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            for upload, data in pending:
+                total_size += len(data)
+                if total_size > max_size:
+                    raise MultipartTooLarge(f"Uploaded files exceed {max_size} bytes")
+                if upload.size + len(data) <= max_memory:
+                    _write(upload, data)
+                else:
+                    await asyncio.to_thread(_write, upload, data)
+                upload.size += len(data)
+            pending.clear()
+        parser.finalize()
+        if not complete:
+            raise MultipartError("Multipart body ended before the closing boundary")
+    except MultipartParseError as e:
+        form.close()
+        raise MultipartError(str(e)) from e
+    except BaseException:
+        form.close()
+        raise
+
+    for upload in form.files.values():
+        upload.sha256 = upload._digest.hexdigest()
+        upload.file.seek(0)
+    return form
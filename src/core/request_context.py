@@ -0,0 +1,161 @@
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import REQUEST_DURATION, RESPONSES
+from .tracing import tracer
+
+
+@dataclass(slots=True)
+class RequestContext:
+    """Сведения о выполнении запроса для заголовков ответа и метрик."""
+
+    # Метка endpoint для запросов вне HTTP (строки пакетов); у HTTP-запросов
+    # берется шаблон пути маршрута из scope
+    endpoint: str = ""
+    scope: Scope | None = field(default=None, repr=False)
+    # Метка модели: известная модель или "other"; заполняет обработчик, когда
+    # разберет тело
+    model: str = ""
+    started: float = field(default_factory=time.perf_counter)
+    # Наибольшее число попыток, которое потребовалось обращению к GigaChat
+    upstream_attempts: int = 0
+    # Имя ключа доступа, которым авторизован запрос
+    api_key: str = ""
+    # Время по фазам обработки, секунд. Фазы, выполнявшиеся конкурентно
+    # (например, загрузка нескольких вложений), суммируются
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def add_timing(self, phase: str, seconds: float) -> None:
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def server_timing(self, total: bool = False) -> str:
+        """Значение заголовка Server-Timing (длительности в миллисекундах)."""
+        metrics = [f"{name};dur={s * 1000:.1f}" for name, s in self.timings.items()]
+        if total:
+            elapsed = time.perf_counter() - self.started
+            metrics.append(f"total;dur={elapsed * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_request_context: ContextVar[RequestContext | None] = ContextVar(
+    "request_context", default=None
+)
+
+
+def get_request_context() -> RequestContext | None:
+    return _request_context.get()
+
+
+def record_timing(phase: str, seconds: float) -> None:
+    context = _request_context.get()
+    if context is not None:
+        context.add_timing(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Добавляет время выполнения блока к фазе текущего запроса."""
+    context = _request_context.get()
+    if context is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        context.add_timing(phase, time.perf_counter() - started)
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Шаблон пути маршрута, например /v1/files/{file_id}.
+
+    Путь берем из маршрута, чтобы случайные URL не плодили метки. Маршрут
+    появляется в scope после роутинга, до вызова обработчика.
+    """
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def request_labels() -> tuple[str, str]:
+    """Метки endpoint и model текущего запроса для метрик."""
+    context = _request_context.get()
+    if context is None:
+        return "", ""
+    if context.scope is not None:
+        return route_template(context.scope), context.model
+    return context.endpoint, context.model
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware, создающий RequestContext на время HTTP-запроса.
+
+    Обработчик выполняется в том же контексте, что и middleware, поэтому
+    изменения контекста видны при отправке заголовков. Для потоковых ответов
+    заголовки уходят вместе с первым чанком, когда попытки уже известны.
+    По завершении ответа (для потоков - после последнего чанка) записываются
+    метрики длительности и статуса, а время по фазам передается в трассировку.
+    Для обычных ответов фазы возвращаются в заголовке Server-Timing, потоковые
+    ответы передают их комментарием перед последним событием.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        context = RequestContext(scope=scope)
+        token = _request_context.set(context)
+        status = 500
+
+        async def send_with_context(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                if context.upstream_attempts:
+                    headers.append(
+                        (
+                            b"x-upstream-attempts",
+                            str(context.upstream_attempts).encode(),
+                        )
+                    )
+                # Для потоков заголовки уходят до конца обработки, поэтому
+                # разбивку передает сам поток в последнем комментарии SSE
+                streaming = any(
+                    name.lower() == b"content-type"
+                    and value.startswith(b"text/event-stream")
+                    for name, value in headers
+                )
+                if context.timings and not streaming:
+                    headers.append(
+                        (b"server-timing", context.server_timing(total=True).encode())
+                    )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_context)
+        finally:
+            _request_context.reset(token)
+            endpoint = route_template(scope)
+            REQUEST_DURATION.labels(endpoint, context.model).observe(
+                time.perf_counter() - context.started
+            )
+            RESPONSES.labels(endpoint, context.model, str(status)).inc()
+            if context.timings:
+                tracer.event(
+                    "api.timing",
+                    lambda: {
+                        phase: round(seconds * 1000, 3)
+                        for phase, seconds in context.timings.items()
+                    },
+                )
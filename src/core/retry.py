@@ -0,0 +1,186 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Annotated, TypeVar
+
+import httpx
+from gigachat.exceptions import ResponseError
+from pydantic import BaseModel, Field
+
+from .account_pool import get_response_error_status
+from .logging import local_logger
+from .request_context import get_request_context
+
+T = TypeVar("T")
+
+
+class RetryPolicy(BaseModel):
+    # Число попыток вместе с первой
+    max_attempts: Annotated[int, Field(ge=1)] = 3
+    # Задержка перед второй попыткой, дальше удваивается до max_delay
+    base_delay: Annotated[float, Field(ge=0)] = 0.2
+    max_delay: Annotated[float, Field(ge=0)] = 5.0
+    # Статусы ответа GigaChat, после которых имеет смысл повторить запрос
+    retry_statuses: list[int] = [500, 502, 503, 504]
+
+    def backoff(self, attempt: int) -> float:
+        # Экспоненциальная задержка с полным джиттером
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, ResponseError):
+            return get_response_error_status(error) in self.retry_statuses
+        # Обрыв соединения, сброс потока HTTP/2, таймауты
+        return isinstance(error, httpx.TransportError)
+
+
+# Чат и эмбеддинги можно повторить и после 429: пул направит попытку в другую
+# учетную запись, а если свободной нет, повтор ждет конца паузы (не дольше
+# max_delay) или не выполняется вовсе. Загрузка файла через /files не идемпотентна и не повторяется
+DEFAULT_RETRY_POLICIES: dict[str, RetryPolicy] = {
+    "chat": RetryPolicy(retry_statuses=[429, 500, 502, 503, 504]),
+    "stream": RetryPolicy(retry_statuses=[429, 500, 502, 503, 504]),
+    "embeddings": RetryPolicy(retry_statuses=[429, 500, 502, 503, 504]),
+    "models": RetryPolicy(),
+    "upload": RetryPolicy(),
+    "files": RetryPolicy(max_attempts=1),
+}
+
+
+class RetryBudget:
+    """
+    Бюджет повторов в виде корзины токенов.
+
+    Каждое обращение добавляет ratio токена, каждый повтор забирает один.
+    Дополнительно корзина пополняется на min_per_second токенов в секунду,
+    чтобы при малой нагрузке повторы оставались возможны. Если GigaChat
+    отказывает массово, бюджет быстро заканчивается и повторы прекращаются,
+    не умножая нагрузку.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, capacity: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, amount: float) -> None:
+        now = time.monotonic()
+        amount += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def deposit(self) -> None:
+        self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill(0)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Retrier:
+    """
+    Повторяет обращения к GigaChat по политике операции в рамках бюджета.
+
+    throttle_wait возвращает, через сколько секунд освободится учетная запись,
+    не получившая 429. Повтор после 429 ждет не меньше этого времени, а если
+    ждать дольше max_delay, ошибка сразу передается вызывающему.
+    """
+
+    def __init__(
+        self,
+        policies: dict[str, RetryPolicy],
+        budget: RetryBudget,
+        throttle_wait: Callable[[], float] | None = None,
+    ):
+        self.policies = {**DEFAULT_RETRY_POLICIES, **policies}
+        self.budget = budget
+        self.throttle_wait = throttle_wait
+        self.retries: Counter[str] = Counter()
+        self.budget_exhausted = 0
+
+    def policy(self, operation: str) -> RetryPolicy:
+        return self.policies.get(operation) or RetryPolicy()
+
+    def _record_attempt(self, attempt: int) -> None:
+        context = get_request_context()
+        if context is not None:
+            context.upstream_attempts = max(context.upstream_attempts, attempt)
+
+    async def _should_retry(
+        self, operation: str, attempt: int, error: BaseException
+    ) -> bool:
+        policy = self.policy(operation)
+        if attempt >= policy.max_attempts or not policy.is_retryable(error):
+            return False
+        delay = policy.backoff(attempt)
+        if (
+            self.throttle_wait is not None
+            and isinstance(error, ResponseError)
+            and get_response_error_status(error) == 429
+        ):
+            wait = self.throttle_wait()
+            if wait > policy.max_delay:
+                return False
+            delay = max(delay, wait)
+        if not self.budget.withdraw():
+            self.budget_exhausted += 1
+            return False
+        self.retries[operation] += 1
+        local_logger.warning(
+            f"Повтор {operation} после ошибки GigaChat (попытка {attempt}): {error!r}"
+        )
+        await asyncio.sleep(delay)
+        return True
+
+    async def call(self, operation: str, func: Callable[[], Awaitable[T]]) -> T:
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._record_attempt(attempt)
+            try:
+                return await func()
+            except Exception as e:
+                if not await self._should_retry(operation, attempt, e):
+                    raise
+
+    async def stream(
+        self, operation: str, open_stream: Callable[[], AsyncGenerator[T, None]]
+    ) -> AsyncGenerator[T, None]:
+        """
+        Повторяет поток, пока он не отдал первый элемент.
+
+        После первого элемента ошибка передается вызывающему: клиент уже
+        получил часть ответа, и повтор привел бы к дублированию.
+        """
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._record_attempt(attempt)
+            stream = open_stream()
+            try:
+                first = await anext(stream)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await stream.aclose()
+                if not await self._should_retry(operation, attempt, e):
+                    raise
+                continue
+            try:
+                yield first
+                async for item in stream:
+                    yield item
+            finally:
+                await stream.aclose()
+            return
@@ -1,8 +1,12 @@
 import tomllib
+from collections.abc import Callable
+from typing import Annotated
 
-from pydantic import Field
+from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings
 
+ENV_FILE = ".env"
+
 
 def get_version() -> str:
     """Получает версию из pyproject.toml"""
@@ -13,20 +17,116 @@ def get_version() -> str:
         return "unknown"
 
 
+class ApiKeySettings(BaseModel):
+    name: str = Field(..., description="Key name used in limits and usage reports.")
+    key: Annotated[str | None, Field(description="The API key itself.")] = None
+    key_sha256: Annotated[
+        str | None,
+        Field(description="Hex SHA-256 of the key, to keep the key out of config."),
+    ] = None
+    requests_per_second: Annotated[
+        float | None,
+        Field(gt=0, description="Sustained request rate; unlimited if not set."),
+    ] = None
+    burst: Annotated[
+        int | None,
+        Field(ge=1, description="Requests allowed at once; the rate by default."),
+    ] = None
+    tokens_per_minute: Annotated[
+        int | None,
+        Field(gt=0, description="GigaChat tokens per minute; unlimited if not set."),
+    ] = None
+
+    @model_validator(mode="after")
+    def check_key(self) -> "ApiKeySettings":
+        if (self.key is None) == (self.key_sha256 is None):
+            raise ValueError("Exactly one of key and key_sha256 must be set")
+        return self
+
+
 class AppSettings(BaseSettings):
     debug: bool = False
     environment: str = "production"
-    bearer_token: str = Field(
-        ...,
-        description="Bearer token is required to authorize requests.",
+    bearer_token: str | None = Field(
+        None,
+        description="Bearer token without limits; required unless api_keys is set.",
+    )
+    api_keys: list[ApiKeySettings] = []
+    usage_db_path: str = "usage.db"
+    usage_flush_interval: float = Field(5.0, gt=0)
+    upload_spool_max_memory: int = Field(
+        1024 * 1024,
+        ge=0,
+        description="Bytes of an uploaded file kept in memory before spilling to disk.",
+    )
+    upload_max_bytes: int = Field(
+        200 * 1024 * 1024,
+        gt=0,
+        description="Maximum total size of files in one upload; larger ones get 413.",
     )
     cors_allowed_hosts: list[str] | None = ["http://localhost:5173"]
     version: str = Field(default_factory=get_version)
+    host: str = "0.0.0.0"
+    port: int = 8000
+    access_log: bool = True
+    workers: int = Field(
+        1, ge=0, description="Number of worker processes; 0 means one per CPU core."
+    )
+    trace_enabled: bool = False
+    trace_sample_ratio: float = Field(1.0, ge=0.0, le=1.0)
+    trace_file: str = "traces/trace.jsonl"
+    trace_max_bytes: int = 10 * 1024 * 1024
+    trace_backup_count: int = 5
+    trace_buffer_size: int = 10_000
+    trace_max_field_chars: int = 2_000
+    settings_watch_interval: float = Field(
+        5.0, ge=0, description="How often to check .env for changes; 0 disables."
+    )
 
     class Config:
-        env_file = ".env"
+        env_file = ENV_FILE
         extra = "allow"
+        frozen = True
+
+    @model_validator(mode="after")
+    def check_credentials(self) -> "AppSettings":
+        if not self.bearer_token and not self.api_keys:
+            raise ValueError("Either bearer_token or api_keys must be set")
+        return self
+
+
+# Текущий снимок настроек. Снимок неизменяем и заменяется целиком, поэтому
+# запрос, получивший его, видит согласованный набор значений
+_snapshot: AppSettings | None = None
+_reload_listeners: list[Callable[[AppSettings], None]] = []
 
 
 def get_app_settings() -> AppSettings:
-    return AppSettings()  # type: ignore
+    """Текущий снимок настроек; окружение и .env читаются только при загрузке."""
+    snapshot = _snapshot
+    if snapshot is None:
+        snapshot = reload_app_settings()
+    return snapshot
+
+
+def reload_app_settings() -> AppSettings:
+    """
+    Перечитывает окружение и .env и атомарно заменяет снимок.
+
+    При ошибке валидации исключение пробрасывается, а прежний снимок
+    остается в силе. Подписчики вызываются после замены.
+    """
+    global _snapshot
+    snapshot = AppSettings()  # type: ignore
+    _snapshot = snapshot
+    for listener in _reload_listeners:
+        listener(snapshot)
+    return snapshot
+
+
+def on_settings_reload(
+    listener: Callable[[AppSettings], None],
+) -> Callable[[AppSettings], None]:
+    """Регистрирует функцию, применяющую новый снимок настроек."""
+    _reload_listeners.append(listener)
+    return listener
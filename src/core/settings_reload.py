@@ -0,0 +1,75 @@
+import asyncio
+import os
+import signal
+
+from pydantic import ValidationError
+
+from .logging import local_logger
+from .settings import ENV_FILE, reload_app_settings
+
+
+class SettingsReloader:
+    """
+    Перезагрузка настроек без перезапуска: по SIGHUP и при изменении .env.
+
+    Файл проверяется по времени изменения раз в interval секунд, без
+    зависимостей от inotify. Некорректные настройки не применяются - в журнал
+    пишется ошибка, а прежний снимок остается в силе.
+    """
+
+    def __init__(self, path: str = ENV_FILE, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self._watcher: asyncio.Task | None = None
+        self._signal_installed = False
+
+    def reload(self) -> bool:
+        try:
+            reload_app_settings()
+        except ValidationError:
+            self.failures += 1
+            local_logger.exception("Настройки не перезагружены, оставлены прежние")
+            return False
+        self.reloads += 1
+        local_logger.info("Настройки перезагружены")
+        return True
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.reload)
+            self._signal_installed = True
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            # Нет SIGHUP (Windows) или цикл событий не в главном потоке
+            pass
+        if self.interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._signal_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal_installed = False
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    def _mtime(self) -> int | None:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    async def _watch(self) -> None:
+        last = self._mtime()
+        while True:
+            await asyncio.sleep(self.interval)
+            mtime = self._mtime()
+            if mtime != last:
+                last = mtime
+                self.reload()
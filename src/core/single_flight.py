@@ -0,0 +1,40 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+
+
+class SingleFlight[K: Hashable, T]:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом в один.
+
+    Первый вызов запускает работу в отдельной задаче, остальные ждут её
+    результата. Ошибка передается всем ожидающим и не запоминается: после
+    завершения ключ освобождается и следующий вызов выполнит работу заново.
+    Отмена одного из ожидающих не отменяет общую задачу.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[K, asyncio.Task[T]] = {}
+        self.started = 0
+        self.deduplicated = 0
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: K, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda t: self._release(key, t))
+        else:
+            self.deduplicated += 1
+        return await asyncio.shield(task)
+
+    def _release(self, key: K, task: asyncio.Task[T]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Помечаем исключение как полученное, даже если все ожидающие отменены
+        if not task.cancelled():
+            task.exception()
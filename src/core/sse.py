@@ -0,0 +1,58 @@
+import json
+import uuid
+from collections.abc import Iterable
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+
+def _json_str(value: str | None) -> str:
+    return "null" if value is None else json.dumps(value, ensure_ascii=False)
+
+
+class ChatCompletionChunkEncoder:
+    """
+    Кодирует чанки chat.completion.chunk сразу в байты Server-Sent Events.
+
+    Один экземпляр обслуживает один поток: id ответа общий для всех чанков
+    (как в OpenAI), неизменная часть конверта собирается один раз, а для
+    каждого чанка подставляются только created, model и delta. Данные
+    приходят от нашего же кода, поэтому повторная валидация Pydantic не нужна;
+    результат совпадает с ChatCompletionStreamResponse.model_dump_json().
+    """
+
+    def __init__(self, completion_id: str | None = None):
+        self.id = completion_id or str(uuid.uuid4())
+        self._prefix = (
+            f'data: {{"id":{_json_str(self.id)},'
+            f'"object":"chat.completion.chunk","created":'
+        )
+        self._model = ""
+        self._model_json = '""'
+        self._roles: dict[str | None, str] = {None: "null"}
+
+    def _role_json(self, role: str | None) -> str:
+        encoded = self._roles.get(role)
+        if encoded is None:
+            encoded = self._roles[role] = _json_str(role)
+        return encoded
+
+    def encode(
+        self,
+        created: int,
+        model: str,
+        choices: Iterable[tuple[int, str | None, str | None, str | None]],
+    ) -> bytes:
+        """Кодирует чанк; choices - кортежи (index, role, content, finish_reason)."""
+        if model != self._model:
+            self._model = model
+            self._model_json = _json_str(model)
+        encoded_choices = ",".join(
+            f'{{"index":{index},"delta":{{"content":{_json_str(content)},'
+            f'"role":{self._role_json(role)},"refusal":null}},'
+            f'"finish_reason":{_json_str(finish_reason)}}}'
+            for index, role, content, finish_reason in choices
+        )
+        return (
+            f'{self._prefix}{created},"model":{self._model_json},'
+            f'"choices":[{encoded_choices}]}}\n\n'
+        ).encode()
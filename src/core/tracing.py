@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Any
+
+from .logging import local_logger
+from .settings import AppSettings, get_app_settings, on_settings_reload
+
+# Идентификатор трассировки текущего запроса; None - запрос не попал в выборку
+_trace_id: ContextVar[str | None] = ContextVar("trace_id", default=None)
+
+
+def redact(value: Any, max_chars: int) -> Any:
+    """Обрезает длинные строки (в первую очередь base64 data URI) в трассировке."""
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        if value.startswith("data:"):
+            header = value[: value.find(",") + 1] or value[:32]
+            return f"{header}<{len(value)} chars redacted>"
+        return f"{value[:max_chars]}<{len(value) - max_chars} chars truncated>"
+    if isinstance(value, dict):
+        return {k: redact(v, max_chars) for k, v in value.items()}
+    if isinstance(value, list | tuple):
+        return [redact(v, max_chars) for v in value]
+    return value
+
+
+class Tracer:
+    """
+    Трассировка запросов и ответов в JSONL.
+
+    Пока трассировка выключена или запрос не попал в выборку, event() не
+    вызывает функцию построения данных, то есть сериализации нет вовсе.
+    События попадают в ограниченный кольцевой буфер, а запись в файл с
+    ротацией выполняет фоновая задача в отдельном потоке.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_ratio: float = 1.0,
+        path: str = "traces/trace.jsonl",
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        buffer_size: int = 10_000,
+        max_field_chars: int = 2_000,
+        per_process: bool = False,
+    ):
+        self.enabled = enabled
+        self.sample_ratio = sample_ratio
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_field_chars = max_field_chars
+        # Несколько воркеров не могут ротировать один файл, поэтому каждый
+        # пишет в свой: trace.<pid>.jsonl
+        self.per_process = per_process
+        self.dropped = 0
+        self._buffer: deque[dict[str, Any]] = deque(maxlen=buffer_size)
+        self._wakeup = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+        self._handler: RotatingFileHandler | None = None
+
+    @classmethod
+    def from_settings(cls, settings: AppSettings) -> "Tracer":
+        return cls(
+            enabled=settings.trace_enabled,
+            sample_ratio=settings.trace_sample_ratio,
+            path=settings.trace_file,
+            max_bytes=settings.trace_max_bytes,
+            backup_count=settings.trace_backup_count,
+            buffer_size=settings.trace_buffer_size,
+            max_field_chars=settings.trace_max_field_chars,
+            per_process=settings.workers != 1,
+        )
+
+    def start_request(self) -> None:
+        """Решает, попадает ли текущий запрос в выборку трассировки."""
+        if self.enabled and random.random() < self.sample_ratio:
+            _trace_id.set(uuid.uuid4().hex)
+        else:
+            _trace_id.set(None)
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and _trace_id.get() is not None
+
+    def event(self, name: str, payload: Callable[[], Any]) -> None:
+        """Записывает событие; payload вызывается только для трассируемых запросов."""
+        if not self.enabled:
+            return
+        trace_id = _trace_id.get()
+        if trace_id is None:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(
+            {"ts": time.time(), "trace_id": trace_id, "event": name, "data": payload()}
+        )
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self.enabled and self._writer is None:
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+        await asyncio.to_thread(self._flush, self._drain())
+        if self._handler is not None:
+            self._handler.close()
+            self._handler = None
+
+    def _drain(self) -> list[dict[str, Any]]:
+        batch = list(self._buffer)
+        self._buffer.clear()
+        return batch
+
+    async def _write_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch = self._drain()
+            if batch:
+                try:
+                    await asyncio.to_thread(self._flush, batch)
+                except OSError:
+                    local_logger.exception("Ошибка записи трассировки")
+
+    def _flush(self, batch: list[dict[str, Any]]) -> None:
+        """Сериализует и пишет пачку событий (выполняется в отдельном потоке)."""
+        if not batch:
+            return
+        if self._handler is None:
+            path = self.path
+            if self.per_process:
+                root, ext = os.path.splitext(path)
+                path = f"{root}.{os.getpid()}{ext}"
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._handler = RotatingFileHandler(
+                path,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding="utf-8",
+            )
+        for record in batch:
+            record["data"] = redact(record["data"], self.max_field_chars)
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            self._handler.emit(logging.makeLogRecord({"msg": line}))
+        self._handler.flush()
+
+
+tracer = Tracer.from_settings(get_app_settings())
+
+
+@on_settings_reload
+def _apply_trace_settings(settings: AppSettings) -> None:
+    # Включение трассировки и параметры файла применяются только при старте
+    tracer.sample_ratio = settings.trace_sample_ratio
+    tracer.max_field_chars = settings.trace_max_field_chars
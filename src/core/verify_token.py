@@ -1,21 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from .settings import AppSettings, get_app_settings
+from .api_keys import ApiKey, api_keys
 
 router = APIRouter()
 bearer_scheme = HTTPBearer()
 
 
-def verify_token(
+async def verify_token(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    settings: AppSettings = Depends(get_app_settings),
-):
-    if (
-        credentials.scheme.lower() != "bearer"
-        or credentials.credentials != settings.bearer_token
-    ):
+) -> ApiKey:
+    # Асинхронная зависимость выполняется в цикле событий, а не в пуле
+    # потоков, поэтому ведра лимитов меняются без блокировок
+    key = None
+    if credentials.scheme.lower() == "bearer":
+        # Бросает RateLimited, если ключ исчерпал лимиты
+        key = api_keys.admit(credentials.credentials)
+    if key is None:
         raise HTTPException(
             status_code=401,
             detail="Invalid or missing Bearer token",
         )
+    return key
@@ -1,27 +1,68 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import HTTPBearer
 
-from .core.logging import local_logger
+from .batch_service import BatchService
+from .core.api_keys import ApiKey
+from .core.metrics import registry
+from .core.multipart import MultipartError, MultipartTooLarge, parse_multipart
+from .core.request_context import get_request_context
 from .core.settings import AppSettings, get_app_settings
+from .core.tracing import tracer
 from .core.verify_token import verify_token
-from .gigachat_service import gigachat_service
+from .gigachat_service import GigaChatService
+from .models.batches import Batch, BatchCreateRequest, BatchList
 from .models.completion import ChatCompletionRequest, ChatCompletionResponse
-from .models.files import FilePurpose, FileUploadResponse
+from .models.embeddings import EmbeddingsRequest, EmbeddingsResponse
+from .models.files import UPLOAD_PURPOSES, FilePurpose, FileUploadResponse
 from .models.health import HealthResponse
 from .models.models import ListModelsResponse
+from .models.stats import ApiKeyUsage, ServiceStats
 
 router = APIRouter()
 bearer_scheme = HTTPBearer()
 
 
+def get_gigachat_service(request: Request) -> GigaChatService:
+    """Сервис текущего воркера, созданный в lifespan приложения."""
+    return request.app.state.gigachat_service
+
+
+def get_batch_service(request: Request) -> BatchService:
+    """Пакетная обработка текущего воркера, созданная в lifespan приложения."""
+    return request.app.state.batch_service
+
+
 @router.get(
     "/v1/models",
     response_model=ListModelsResponse,
     dependencies=[Depends(verify_token)],
 )
-async def get_models():
-    return await gigachat_service.get_models()
+async def get_models(
+    request: Request,
+    response: Response,
+    gigachat_service: GigaChatService = Depends(get_gigachat_service),
+):
+    snapshot = await gigachat_service.models.get()
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"private, max-age={int(gigachat_service.models.ttl)}",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if any(
+        tag.strip().removeprefix("W/") in (snapshot.etag, "*")
+        for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return snapshot.models
 
 
 @router.post(
@@ -29,15 +70,24 @@ async def get_models():
     response_model=ChatCompletionResponse,
     dependencies=[Depends(verify_token)],
 )
-async def create_chat_completion(request: ChatCompletionRequest):
-    local_logger.debug(
-        f"api request chat/completions: {request.model_dump_json(indent=2)}"
-    )
+async def create_chat_completion(
+    request: ChatCompletionRequest,
+    http_request: Request,
+    gigachat_service: GigaChatService = Depends(get_gigachat_service),
+):
+    tracer.start_request()
+    context = get_request_context()
+    if context is not None:
+        context.model = gigachat_service.model_label(request.model)
+    tracer.event("api.request", lambda: request.model_dump(mode="json"))
+    # Клиент может попросить не использовать кеш ответов
+    cache_control = http_request.headers.get("cache-control", "").lower()
+    use_cache = "no-cache" not in cache_control and "no-store" not in cache_control
     if request.stream:
         # Необходимо для корректных ответов если GigaChat
         # возвращает ошибку, иначе мы уже начали стримить ответ
 
-        stream = gigachat_service.stream_chat_sse(request)
+        stream = gigachat_service.stream_chat_sse(request, use_cache=use_cache)
         first_chunk = await anext(stream)
 
         async def streaming_generator():
@@ -49,22 +99,204 @@ async def create_chat_completion(request: ChatCompletionRequest):
             streaming_generator(),
             media_type="text/event-stream",
         )
-    return await gigachat_service.chat(request)
+    return await gigachat_service.chat(request, use_cache=use_cache)
+
+
+@router.post(
+    "/v1/embeddings",
+    response_model=EmbeddingsResponse,
+    dependencies=[Depends(verify_token)],
+)
+async def create_embeddings(
+    request: EmbeddingsRequest,
+    gigachat_service: GigaChatService = Depends(get_gigachat_service),
+):
+    tracer.start_request()
+    context = get_request_context()
+    if context is not None:
+        context.model = gigachat_service.model_label(request.model)
+    tracer.event("api.request", lambda: request.model_dump(mode="json"))
+    return await gigachat_service.embeddings(request)
+
+
+@router.get(
+    "/stats",
+    response_model=ServiceStats,
+    dependencies=[Depends(verify_token)],
+)
+async def get_stats(
+    gigachat_service: GigaChatService = Depends(get_gigachat_service),
+):
+    return gigachat_service.get_stats()
+
+
+@router.get("/usage", response_model=ApiKeyUsage)
+async def get_usage(key: ApiKey = Depends(verify_token)) -> ApiKeyUsage:
+    """Использование и лимиты ключа, которым авторизован запрос."""
+    tokens = key.tokens
+    return ApiKeyUsage(
+        name=key.name,
+        requests_total=key.requests_total,
+        rate_limited_total=key.rate_limited_total,
+        prompt_tokens_total=key.prompt_tokens_total,
+        completion_tokens_total=key.completion_tokens_total,
+        requests_per_second=key.requests.rate if key.requests else None,
+        tokens_per_minute=tokens.rate * 60 if tokens else None,
+        tokens_available=tokens.balance() if tokens else None,
+    )
+
 
+# Тело разбирается вручную, чтобы файл хешировался по мере получения
+UPLOAD_FILE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file", "purpose"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "purpose": {
+                            "type": "string",
+                            "enum": [p.value for p in UPLOAD_PURPOSES],
+                        },
+                    },
+                }
+            }
+        },
+    }
+}
 
-@router.post("/files")
+
+@router.post("/files", openapi_extra=UPLOAD_FILE_BODY)
+@router.post("/v1/files", openapi_extra=UPLOAD_FILE_BODY)
 async def upload_file(
-    file: UploadFile, purpose: FilePurpose = Form(...)
+    request: Request,
+    key: ApiKey = Depends(verify_token),
+    gigachat_service: GigaChatService = Depends(get_gigachat_service),
+    batch_service: BatchService = Depends(get_batch_service),
+    settings: AppSettings = Depends(get_app_settings),
 ) -> FileUploadResponse:
-    if file.filename is None or file.content_type is None:
-        raise HTTPException(status_code=400, detail="No file uploaded")
-    uploaded = await gigachat_service.upload_file(
-        filename=file.filename,
-        file=file.file,
-        content_type=file.content_type,
-        purpose=purpose.value if purpose != FilePurpose.FINE_TUNE else "general",
+    try:
+        form = await parse_multipart(
+            request.headers.get("content-type", ""),
+            request.stream(),
+            settings.upload_spool_max_memory,
+            settings.upload_max_bytes,
+        )
+    except MultipartTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except MultipartError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        upload = form.files.get("file")
+        if upload is None or not upload.filename:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        try:
+            purpose = FilePurpose(form.fields.get("purpose"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid file purpose")
+        if purpose not in UPLOAD_PURPOSES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Files with purpose {purpose.value} can't be uploaded",
+            )
+        # Входные файлы пакетов нужны адаптеру, а не GigaChat
+        if purpose == FilePurpose.BATCH:
+            return await batch_service.save_file(upload.filename, upload.file, key.name)
+        return await gigachat_service.upload_file(
+            filename=upload.filename,
+            file=upload.file,
+            content_type=upload.content_type,
+            purpose=purpose.value if purpose != FilePurpose.FINE_TUNE else "general",
+            sha256=upload.sha256,
+            size=upload.size,
+        )
+    finally:
+        form.close()
+
+
+@router.get("/v1/files/{file_id}", response_model=FileUploadResponse)
+async def get_file(
+    file_id: str,
+    key: ApiKey = Depends(verify_token),
+    batch_service: BatchService = Depends(get_batch_service),
+):
+    found = await batch_service.get_file(file_id, key.name)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"File {file_id} not found")
+    return found[0]
+
+
+@router.get("/v1/files/{file_id}/content")
+async def get_file_content(
+    file_id: str,
+    key: ApiKey = Depends(verify_token),
+    batch_service: BatchService = Depends(get_batch_service),
+) -> FileResponse:
+    found = await batch_service.get_file(file_id, key.name)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"File {file_id} not found")
+    record, path = found
+    return FileResponse(path, media_type="application/jsonl", filename=record.filename)
+
+
+@router.post("/v1/batches", response_model=Batch)
+async def create_batch(
+    request: BatchCreateRequest,
+    key: ApiKey = Depends(verify_token),
+    batch_service: BatchService = Depends(get_batch_service),
+):
+    return await batch_service.create(request, key.name)
+
+
+@router.get("/v1/batches", response_model=BatchList)
+async def list_batches(
+    after: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    key: ApiKey = Depends(verify_token),
+    batch_service: BatchService = Depends(get_batch_service),
+):
+    batches, has_more = await batch_service.list_batches(key.name, after, limit)
+    return BatchList(
+        object="list",
+        data=batches,
+        first_id=batches[0].id if batches else None,
+        last_id=batches[-1].id if batches else None,
+        has_more=has_more,
+    )
+
+
+@router.get("/v1/batches/{batch_id}", response_model=Batch)
+async def get_batch(
+    batch_id: str,
+    key: ApiKey = Depends(verify_token),
+    batch_service: BatchService = Depends(get_batch_service),
+):
+    batch = await batch_service.get(batch_id, key.name)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+    return batch
+
+
+@router.post("/v1/batches/{batch_id}/cancel", response_model=Batch)
+async def cancel_batch(
+    batch_id: str,
+    key: ApiKey = Depends(verify_token),
+    batch_service: BatchService = Depends(get_batch_service),
+):
+    batch = await batch_service.cancel(batch_id, key.name)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+    return batch
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
     )
-    return uploaded
 
 
 @router.get("/health/liveness", response_model=HealthResponse)
@@ -79,11 +311,17 @@ async def liveness(settings: AppSettings = Depends(get_app_settings)) -> HealthR
 @router.get("/health/readiness", response_model=HealthResponse)
 async def readiness(
     settings: AppSettings = Depends(get_app_settings),
+    gigachat_service: GigaChatService = Depends(get_gigachat_service),
 ) -> HealthResponse:
     """
     Readiness probe для kubernetes.
-    Проверяет что сервис готов обрабатывать запросы,
-    включая проверку подключения к GigaChat API.
+    Проверяет что сервис готов обрабатывать запросы, по последнему известному
+    состоянию GigaChat API. Само API опрашивается не чаще health_check_interval,
+    а при разомкнутых автоматах всех учетных записей сервис сразу не готов.
     """
-    await gigachat_service.get_models()
+    if (
+        not gigachat_service.upstream_available
+        or not await gigachat_service.models.check_health()
+    ):
+        raise HTTPException(status_code=503, detail="GigaChat API is unavailable")
     return HealthResponse(status="ok", version=settings.version)
@@ -1,18 +1,66 @@
+import asyncio
 import base64
 import hashlib
 import logging
 import mimetypes
+import sys
+import time
 import uuid
+from array import array
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 from io import BytesIO
-from typing import AsyncGenerator, AsyncIterator, BinaryIO
+from typing import IO
 
-from gigachat import GigaChat
+import httpx
+from gigachat.exceptions import ResponseError
 from gigachat.models.chat import Chat, Messages
 from gigachat.models.chat_completion import ChatCompletion
+from gigachat.models.chat_completion_chunk import ChatCompletionChunk
+from gigachat.models.embeddings import Embeddings
 from gigachat.models.messages_role import MessagesRole as GigaChatMessagesRole
+from gigachat.models.models import Models
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
+from .core.account_pool import (
+    AccountPool,
+    GigaChatAccount,
+    get_response_error_status,
+)
+from .core.admission import AdmissionController, ConcurrencyLimiter
+from .core.aio import gather_or_cancel
+from .core.api_keys import api_keys
+from .core.attachment_index import AttachmentIndex
+from .core.blob_cache import BlobCache
+from .core.circuit_breaker import CircuitBreaker
+from .core.data_uri import DecodedDataUri, adecode_data_uri
+from .core.gigachat_client import TOKEN_ERRORS, PooledGigaChat
+from .core.image_fetcher import ImageFetcher
+from .core.image_preprocess import ImagePreprocessor
 from .core.logging import local_logger
+from .core.metrics import (
+    ATTACHMENT_LOOKUPS,
+    INTER_CHUNK_LATENCY,
+    REQUESTS_IN_FLIGHT,
+    TIME_TO_FIRST_TOKEN,
+    TOKENS,
+)
+from .core.micro_batcher import MicroBatcher
+from .core.model_catalog import ModelCatalog
+from .core.request_context import (
+    get_request_context,
+    record_timing,
+    request_labels,
+    timed,
+)
+from .core.response_cache import ResponseCache, canonical_key
+from .core.retry import Retrier, RetryBudget, RetryPolicy
+from .core.single_flight import SingleFlight
+from .core.sse import SSE_DONE, ChatCompletionChunkEncoder
+from .core.tracing import tracer
 from .models.completion import (
     ChatCompletionRequest,
     ChatCompletionRequestMessageContentAudio,
@@ -22,16 +70,65 @@ from .models.completion import (
     ChatCompletionResponseChoice,
     ChatCompletionResponseMessage,
     ChatCompletionResponseUsage,
-    ChatCompletionStreamResponse,
-    ChatCompletionStreamResponseChoice,
-    ChatCompletionStreamResponseDelta,
     CompletionTokensDetails,
     MessagesRole,
     PromptTokensDetails,
 )
+from .models.embeddings import (
+    EmbeddingData,
+    EmbeddingsRequest,
+    EmbeddingsResponse,
+    EmbeddingsUsage,
+    EncodingFormat,
+)
 from .models.files import FilePurpose, FileUploadResponse
 from .models.models import ListModelsResponse, ModelData
-from .core.kv_store import KVStore
+from .models.stats import (
+    AccountStats,
+    AttachmentStats,
+    ConcurrencyStats,
+    EmbeddingStats,
+    HttpPoolStats,
+    ImageFetchStats,
+    ImagePreprocessStats,
+    ResponseCacheStats,
+    RetryStats,
+    ServiceStats,
+)
+
+# Статусы, которые GigaChat возвращает на некорректный текст, а не на пачку
+INPUT_ERROR_STATUSES = frozenset((400, 413, 422))
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов текста (3 символа на токен)."""
+    return len(text) // 3 + 1
+
+
+def is_input_error(error: Exception) -> bool:
+    """Ошибка GigaChat, которую мог вызвать один из текстов пачки."""
+    return (
+        isinstance(error, ResponseError)
+        and get_response_error_status(error) in INPUT_ERROR_STATUSES
+    )
+
+
+def encode_embedding(vector: array) -> str:
+    """Вектор в base64 из float32 little-endian, как у OpenAI."""
+    values = array("f", vector)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode()
+
+
+class GigaChatAccountSettings(BaseModel):
+    # Учетные данные одной записи; незаданные берутся из общих настроек
+    name: str | None = None
+    credentials: str | None = None
+    scope: str | None = None
+    access_token: str | None = None
+    user: str | None = None
+    password: str | None = None
 
 
 class GigaChatSettings(BaseSettings):
@@ -51,6 +148,59 @@ class GigaChatSettings(BaseSettings):
     cert_file: str | None = None
     key_file: str | None = None
     key_file_password: str | None = None
+    attachment_index_path: str = "attachments.db"
+    upload_concurrency: int = 4
+    decode_offload_threshold: int = 256 * 1024
+    decode_workers: int = 2
+    models_cache_ttl: float = 300
+    models_max_stale: float = 3600
+    health_check_interval: float = 30
+    response_cache_enabled: bool = False
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    response_cache_ttl: float = 3600
+    response_cache_max_temperature: float = 0.0
+    embeddings_batch_max_size: int = 64
+    embeddings_batch_max_tokens: int = 16384
+    embeddings_batch_max_wait: float = 0.005
+    embeddings_cache_enabled: bool = False
+    embeddings_cache_max_bytes: int = 64 * 1024 * 1024
+    embeddings_cache_ttl: float = 86400
+    image_fetch_max_bytes: int = 20 * 1024 * 1024
+    image_fetch_timeout: float = 10
+    image_fetch_max_connections: int = 20
+    image_fetch_allow_private: bool = False
+    image_cache_dir: str = "image_cache"
+    image_cache_max_bytes: int = 512 * 1024 * 1024
+    image_cache_ttl: float = 3600
+    image_preprocess_enabled: bool = False
+    image_max_dimension: int = 2048
+    image_jpeg_quality: int = 85
+    image_preprocess_min_bytes: int = 256 * 1024
+    image_preprocess_workers: int = 2
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30
+    http2_connections: int = 1
+    token_refresh_margin: float = 60
+    accounts: list[GigaChatAccountSettings] = []
+    account_cooldown: float = 30
+    max_concurrent_requests: int = 100
+    max_concurrent_requests_per_model: int | None = None
+    max_queued_requests: int = 200
+    queue_timeout: float = 30
+    retry_after: float = 1
+    retry_policies: dict[str, RetryPolicy] = {}
+    retry_budget_ratio: float = 0.1
+    retry_budget_min_per_second: float = 1
+    retry_budget_capacity: float = 10
+    circuit_breaker_enabled: bool = True
+    circuit_breaker_window: float = 30
+    circuit_breaker_min_requests: int = 20
+    circuit_breaker_failure_rate: float = 0.5
+    circuit_breaker_slow_call_duration: float = 10
+    circuit_breaker_slow_call_rate: float = 0.8
+    circuit_breaker_open_duration: float = 15
+    circuit_breaker_half_open_probes: int = 3
 
     class Config:
         env_file = ".env"
@@ -62,30 +212,215 @@ class GigaChatService:
     def __init__(self, **kwargs):
         self.logger = logging.getLogger(self.__class__.__name__)
         self._settings = GigaChatSettings(**kwargs)
-        self._client = GigaChat(
-            base_url=self._settings.base_url,
-            auth_url=self._settings.auth_url,
-            credentials=self._settings.credentials,
-            scope=self._settings.scope,
-            access_token=self._settings.access_token,
-            model=self._settings.model,
-            profanity_check=self._settings.profanity_check,
-            user=self._settings.user,
-            password=self._settings.password,
-            timeout=self._settings.timeout,
-            verify_ssl_certs=self._settings.verify_ssl_certs,
-            verbose=self._settings.verbose,
-            ca_bundle_file=self._settings.ca_bundle_file,
-            cert_file=self._settings.cert_file,
-            key_file=self._settings.key_file,
-            key_file_password=self._settings.key_file_password,
+        self._accounts = AccountPool(
+            self._create_accounts(), cooldown=self._settings.account_cooldown
+        )
+        self._attachments = AttachmentIndex(self._settings.attachment_index_path)
+        self._uploads: SingleFlight[str, str] = SingleFlight()
+        self._attachment_cache_hits = 0
+        self._preprocessor: ImagePreprocessor | None = None
+        if self._settings.image_preprocess_enabled:
+            if ImagePreprocessor.available():
+                self._preprocessor = ImagePreprocessor(
+                    max_dimension=self._settings.image_max_dimension,
+                    quality=self._settings.image_jpeg_quality,
+                    min_bytes=self._settings.image_preprocess_min_bytes,
+                    workers=self._settings.image_preprocess_workers,
+                )
+            else:
+                local_logger.warning(
+                    "Обработка изображений включена, но Pillow не установлен; "
+                    "установите gigachat-adapter[images]"
+                )
+        self._images = ImageFetcher(
+            BlobCache(
+                self._settings.image_cache_dir, self._settings.image_cache_max_bytes
+            ),
+            max_bytes=self._settings.image_fetch_max_bytes,
+            timeout=self._settings.image_fetch_timeout,
+            default_ttl=self._settings.image_cache_ttl,
+            max_connections=self._settings.image_fetch_max_connections,
+            allow_private=self._settings.image_fetch_allow_private,
+        )
+        self._decode_executor = ThreadPoolExecutor(
+            max_workers=self._settings.decode_workers, thread_name_prefix="decode"
+        )
+        self._response_cache: ResponseCache[ChatCompletion] | None = None
+        if self._settings.response_cache_enabled:
+            self._response_cache = ResponseCache(
+                max_bytes=self._settings.response_cache_max_bytes,
+                ttl=self._settings.response_cache_ttl,
+            )
+        self._response_cache_bypassed = 0
+        # Вектор хранится как array("d"): в несколько раз компактнее списка float
+        self._embeddings_cache: ResponseCache[tuple[array, int]] | None = None
+        if self._settings.embeddings_cache_enabled:
+            self._embeddings_cache = ResponseCache(
+                max_bytes=self._settings.embeddings_cache_max_bytes,
+                ttl=self._settings.embeddings_cache_ttl,
+            )
+        self._embeddings: MicroBatcher[str, str, tuple[array, int]] = MicroBatcher(
+            self._embed_batch,
+            max_size=self._settings.embeddings_batch_max_size,
+            max_cost=self._settings.embeddings_batch_max_tokens,
+            max_wait=self._settings.embeddings_batch_max_wait,
+            cost=estimate_tokens,
+            split_on=is_input_error,
+        )
+        self.admission = AdmissionController(
+            max_concurrency=self._settings.max_concurrent_requests,
+            max_concurrency_per_model=self._settings.max_concurrent_requests_per_model,
+            max_queue=self._settings.max_queued_requests,
+            queue_timeout=self._settings.queue_timeout,
+            retry_after=self._settings.retry_after,
+            is_known_model=self.is_known_model,
+        )
+        self._retrier = Retrier(
+            self._settings.retry_policies,
+            RetryBudget(
+                ratio=self._settings.retry_budget_ratio,
+                min_per_second=self._settings.retry_budget_min_per_second,
+                capacity=self._settings.retry_budget_capacity,
+            ),
+            throttle_wait=self._accounts.cooldown_remaining,
+        )
+        self.models = ModelCatalog(
+            self._fetch_models,
+            ttl=self._settings.models_cache_ttl,
+            max_stale=self._settings.models_max_stale,
+            health_check_interval=self._settings.health_check_interval,
         )
 
-    async def initialize(self):
-        await self._client.aget_token()
+    def _create_accounts(self) -> list[GigaChatAccount]:
+        settings = self._settings
+        if not settings.accounts:
+            # Одна учетная запись из общих настроек; ключи вложений без префикса
+            return [self._create_account("default", None, "")]
+        accounts = []
+        for account in settings.accounts:
+            # Имя входит в ключи индекса вложений, поэтому без явного имени оно
+            # выводится из учетных данных, а не из позиции в списке
+            name = (
+                account.name
+                or hashlib.sha256(
+                    str(
+                        account.credentials or account.user or account.access_token
+                    ).encode()
+                ).hexdigest()[:12]
+            )
+            accounts.append(self._create_account(name, account, f"{name}:"))
+        return accounts
+
+    def _create_account(
+        self, name: str, account: GigaChatAccountSettings | None, key_prefix: str
+    ) -> GigaChatAccount:
+        settings = self._settings
+        breaker = CircuitBreaker(
+            name,
+            window=settings.circuit_breaker_window,
+            min_requests=settings.circuit_breaker_min_requests,
+            failure_rate=settings.circuit_breaker_failure_rate,
+            slow_call_duration=settings.circuit_breaker_slow_call_duration,
+            slow_call_rate=settings.circuit_breaker_slow_call_rate,
+            open_duration=settings.circuit_breaker_open_duration,
+            half_open_probes=settings.circuit_breaker_half_open_probes,
+        )
+        client = self._create_client(
+            account, breaker if settings.circuit_breaker_enabled else None
+        )
+        return GigaChatAccount(name, client, key_prefix, breaker)
+
+    def _create_client(
+        self, account: GigaChatAccountSettings | None, breaker: CircuitBreaker | None
+    ) -> PooledGigaChat:
+        settings = self._settings
+        credentials = account or GigaChatAccountSettings()
+        return PooledGigaChat(
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            http2_connections=settings.http2_connections,
+            token_refresh_margin=settings.token_refresh_margin,
+            breaker=breaker,
+            base_url=settings.base_url,
+            auth_url=settings.auth_url,
+            credentials=credentials.credentials or settings.credentials,
+            scope=credentials.scope or settings.scope,
+            access_token=credentials.access_token or settings.access_token,
+            model=settings.model,
+            profanity_check=settings.profanity_check,
+            user=credentials.user or settings.user,
+            password=credentials.password or settings.password,
+            timeout=settings.timeout,
+            verify_ssl_certs=settings.verify_ssl_certs,
+            verbose=settings.verbose,
+            ca_bundle_file=settings.ca_bundle_file,
+            cert_file=settings.cert_file,
+            key_file=settings.key_file,
+            key_file_password=settings.key_file_password,
+        )
+
+    async def startup(self):
+        # Открываем пулы соединений и получаем токены заранее, а не на первом
+        # запросе; дальше каждый токен обновляется в фоне до истечения срока
+        await asyncio.gather(
+            *(self._start_account(account) for account in self._accounts.accounts)
+        )
+        # Без списка моделей известна только модель из настроек: лимиты по
+        # моделям и метки метрик для остальных заработали бы лишь после
+        # первого запроса к /v1/models. Сервис должен подняться и при
+        # недоступном GigaChat: список загрузится при следующем обращении
+        try:
+            await self.models.refresh()
+        except Exception as e:  # noqa: BLE001
+            local_logger.warning(
+                f"Не удалось загрузить список моделей при запуске: {e}"
+            )
+
+    async def _start_account(self, account: GigaChatAccount) -> None:
+        account.client.connect()
+        try:
+            await account.client.aget_token()
+        except TOKEN_ERRORS as e:
+            local_logger.warning(
+                f"Не удалось получить токен GigaChat ({account.name}) при запуске: {e}"
+            )
+        account.client.start_token_refresh()
+
+    async def aclose(self):
+        await self.models.aclose()
+        await self._embeddings.aclose()
+        await self._attachments.close()
+        await self._images.aclose()
+        if self._preprocessor is not None:
+            self._preprocessor.close()
+        for account in self._accounts.accounts:
+            await account.client.aclose()
+
+    @property
+    def upstream_available(self) -> bool:
+        """Есть ли учетная запись, автомат которой пропускает запросы."""
+        return self._accounts.reachable
+
+    def throttled_for(self) -> float:
+        """Через сколько секунд освободится учетная запись после 429."""
+        return self._accounts.cooldown_remaining()
+
+    def is_known_model(self, model: str) -> bool:
+        """Модель из настроек или из последнего списка моделей GigaChat."""
+        return model == self._settings.model or self.models.known(model)
+
+    def model_label(self, model: str) -> str:
+        """Метка модели для метрик: имя известной модели или "other"."""
+        return model if self.is_known_model(model) else "other"
 
     async def get_models(self) -> ListModelsResponse:
-        raw_models = await self._client.aget_models()
+        return (await self.models.get()).models
+
+    async def _fetch_models(self) -> ListModelsResponse:
+        raw_models = await self._retrier.call("models", self._get_upstream_models)
         data = [
             ModelData(
                 id=m.id_, object=m.object_, owned_by=m.owned_by, created=1735689600
@@ -94,37 +429,267 @@ class GigaChatService:
         ]
         return ListModelsResponse(data=data, object="list")
 
-    async def _upload_base64(self, base64_data: str) -> uuid.UUID:
+    async def _get_upstream_models(self) -> Models:
+        async with self._accounts.use() as account:
+            return await account.client.aget_models()
+
+    def get_stats(self) -> ServiceStats:
+        return ServiceStats(
+            attachments=AttachmentStats(
+                cache_hits=self._attachment_cache_hits,
+                uploads=self._uploads.started,
+                deduplicated_uploads=self._uploads.deduplicated,
+                inflight_uploads=self._uploads.inflight,
+            ),
+            response_cache=self._get_response_cache_stats(),
+            embeddings=self._get_embedding_stats(),
+            images=ImageFetchStats(
+                requests=self._images.requests,
+                fresh_hits=self._images.fresh_hits,
+                revalidated=self._images.revalidated,
+                deduplicated=self._images.deduplicated,
+                downloads=self._images.downloads,
+                downloaded_bytes=self._images.downloaded_bytes,
+                cache_evictions=self._images.cache.evictions,
+            ),
+            image_preprocessing=self._get_image_preprocess_stats(),
+            http_pool=self._get_http_pool_stats(),
+            accounts=[
+                AccountStats(
+                    name=account.name,
+                    active_requests=account.inflight,
+                    requests_total=account.requests_total,
+                    throttled_total=account.throttled_total,
+                    cooldown_remaining=max(
+                        account.cooldown_until - time.monotonic(), 0.0
+                    ),
+                    circuit_state=account.breaker.state.value,
+                    circuit_opened_total=account.breaker.opened_total,
+                    circuit_rejected_total=account.breaker.rejected_total,
+                )
+                for account in self._accounts.accounts
+            ],
+            admission=self._get_concurrency_stats(self.admission.limiter),
+            admission_per_model={
+                model: self._get_concurrency_stats(limiter)
+                for model, limiter in self.admission.model_limiters.items()
+            },
+            retries=RetryStats(
+                retries=dict(self._retrier.retries),
+                budget_exhausted=self._retrier.budget_exhausted,
+                budget_tokens=self._retrier.budget.tokens,
+            ),
+        )
+
+    def _get_concurrency_stats(self, limiter: ConcurrencyLimiter) -> ConcurrencyStats:
+        return ConcurrencyStats(
+            active_requests=limiter.active,
+            queued_requests=limiter.queued,
+            peak_queued_requests=limiter.peak_queued,
+            admitted_total=limiter.admitted,
+            rejected_total=limiter.rejected,
+            queued_total=limiter.queued_total,
+            queue_wait_seconds_total=limiter.wait_seconds_total,
+            max_queue_wait_seconds=limiter.max_wait_seconds,
+        )
+
+    def _get_http_pool_stats(self) -> HttpPoolStats:
+        # У каждой учетной записи свой пул; статистика суммируется по всем
+        transports = [
+            account.client.transport
+            for account in self._accounts.accounts
+            if account.client.transport is not None
+        ]
+        active = [count for transport in transports for count in transport.active]
+        accounts = len(self._accounts.accounts)
+        return HttpPoolStats(
+            connections=self._settings.http2_connections * accounts,
+            max_connections=self._settings.http_max_connections * accounts,
+            active_requests=sum(active),
+            active_requests_per_connection=active,
+            peak_active_requests=sum(t.peak_active for t in transports),
+            requests_total=sum(t.requests_total for t in transports),
+        )
+
+    def _get_response_cache_stats(self) -> ResponseCacheStats:
+        cache = self._response_cache
+        return ResponseCacheStats(
+            enabled=cache is not None,
+            hits=cache.hits if cache else 0,
+            misses=cache.misses if cache else 0,
+            bypassed=self._response_cache_bypassed,
+            evictions=cache.evictions if cache else 0,
+            entries=len(cache) if cache else 0,
+            bytes=cache.size if cache else 0,
+        )
+
+    def _get_image_preprocess_stats(self) -> ImagePreprocessStats:
+        preprocessor = self._preprocessor
+        if preprocessor is None:
+            return ImagePreprocessStats(
+                enabled=False,
+                processed=0,
+                skipped=0,
+                failed=0,
+                bytes_before=0,
+                bytes_after=0,
+                bytes_saved=0,
+                seconds_total=0.0,
+            )
+        return ImagePreprocessStats(
+            enabled=True,
+            processed=preprocessor.processed,
+            skipped=preprocessor.skipped,
+            failed=preprocessor.failed,
+            bytes_before=preprocessor.bytes_before,
+            bytes_after=preprocessor.bytes_after,
+            bytes_saved=preprocessor.bytes_before - preprocessor.bytes_after,
+            seconds_total=preprocessor.seconds_total,
+        )
+
+    def _get_embedding_stats(self) -> EmbeddingStats:
+        batcher = self._embeddings
+        cache = self._embeddings_cache
+        return EmbeddingStats(
+            inputs=batcher.submitted + (cache.hits if cache else 0),
+            cache_hits=cache.hits if cache else 0,
+            deduplicated=batcher.deduplicated,
+            batches=batcher.batches,
+            batched_inputs=batcher.batched_items,
+            split_batches=batcher.splits,
+            inflight_batches=batcher.inflight,
+            cache_entries=len(cache) if cache else 0,
+            cache_bytes=cache.size if cache else 0,
+        )
+
+    async def _upload_image(self, url: str, account: GigaChatAccount) -> uuid.UUID:
+        if url.startswith("data:"):
+            return await self._upload_base64(url, account)
+        return await self._upload_remote_image(url, account)
+
+    async def _upload_base64(
+        self, base64_data: str, account: GigaChatAccount
+    ) -> uuid.UUID:
+        # Декодируем изображение; ключ хранилища - хеш декодированных байт
+        # с префиксом учетной записи, в которую загружен файл
+        with timed("decode"):
+            image = await adecode_data_uri(
+                base64_data,
+                self._decode_executor,
+                self._settings.decode_offload_threshold,
+            )
+
+        async def load() -> DecodedDataUri:
+            return image
+
+        return await self._attach(image.sha256, account, load, base64_data)
+
+    async def _upload_remote_image(
+        self, url: str, account: GigaChatAccount
+    ) -> uuid.UUID:
+        # Пока URL свежий в кеше, он не скачивается, а по хешу его содержимого
+        # индекс вложений сразу дает id файла
+        with timed("fetch"):
+            blob = await self._images.fetch(url)
+
+        async def load() -> DecodedDataUri:
+            with timed("fetch"):
+                data = await self._images.read(blob)
+            return DecodedDataUri(
+                data=data, mime_type=blob.mime_type, sha256=blob.sha256
+            )
+
+        return await self._attach(blob.sha256, account, load)
+
+    async def _attach(
+        self,
+        sha256: str,
+        account: GigaChatAccount,
+        load: Callable[[], Awaitable[DecodedDataUri]],
+        data_uri: str | None = None,
+    ) -> uuid.UUID:
+        key = account.key_prefix + sha256
+
         # Проверяем наличие файла в хранилище
-        key = hashlib.sha256(base64_data.encode()).hexdigest()
-        kv_store = KVStore()
-        existing_id = await kv_store.get(key)
+        with timed("index"):
+            existing_id = await self._attachments.get(key)
+            # Старый kv_store.json хранил файлы учетной записи по умолчанию
+            # под хешем строки data URI; найденную запись переносим под новый ключ
+            if (
+                not existing_id
+                and data_uri is not None
+                and not account.key_prefix
+                and self._attachments.has_legacy
+            ):
+                legacy_key = hashlib.sha256(data_uri.encode()).hexdigest()
+                existing_id = await self._attachments.adopt_legacy(legacy_key, key)
+        endpoint, model = request_labels()
         if existing_id:
+            self._attachment_cache_hits += 1
+            ATTACHMENT_LOOKUPS.labels(endpoint, model, "hit").inc()
             return uuid.UUID(existing_id)
+        ATTACHMENT_LOOKUPS.labels(endpoint, model, "miss").inc()
+
+        # Одинаковые изображения, пришедшие одновременно, загружаем один раз
+        file_id = await self._uploads.do(
+            key, lambda: self._upload_attachment(key, load, account)
+        )
+        return uuid.UUID(file_id)
+
+    async def _upload_attachment(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[DecodedDataUri]],
+        account: GigaChatAccount,
+    ) -> str:
+        # Файл мог быть загружен, пока мы ждали своей очереди
+        with timed("index"):
+            existing_id = await self._attachments.get(key)
+        if existing_id:
+            return existing_id
+        image = await load()
+        if self._preprocessor is not None:
+            with timed("preprocess"):
+                image = await self._preprocessor.process(image)
 
         # Загружаем изображение в GigaChat
-        header, encoded = base64_data.split(",", 1)
-        data = base64.b64decode(encoded)
-        mime_type = header.split(":")[1].split(";")[0]
-        extension = mimetypes.guess_extension(mime_type)
+        extension = mimetypes.guess_extension(image.mime_type)
         filename = f"upload_{uuid.uuid4()}{extension}"
-        file = BytesIO(data)
 
-        local_logger.debug(f"Uploading file {filename} with mime type {mime_type}")
-
-        file_upload_response = await self._client.aupload_file(
-            (filename, file, mime_type), purpose="general"
+        local_logger.debug(
+            "Uploading file %s with mime type %s", filename, image.mime_type
         )
 
+        # Файл загружается в выбранную учетную запись, поэтому повторы идут
+        # в нее же
+        with timed("upload"):
+            file_upload_response = await self._retrier.call(
+                "upload",
+                lambda: account.client.aupload_file(
+                    (filename, BytesIO(image.data), image.mime_type), purpose="general"
+                ),
+            )
+
         # Сохраняем данные в хранилище
-        await kv_store.set(key, str(file_upload_response.id_))
+        with timed("index"):
+            await self._attachments.set(key, str(file_upload_response.id_))
 
         return file_upload_response.id_
 
-    async def _create_gigachat_request(self, request: ChatCompletionRequest) -> Chat:
-        messages: list[Messages] = []
-        for message in request.messages:
-            messages.extend(await self._process_message(message))
+    async def _create_gigachat_request(
+        self, request: ChatCompletionRequest, account: GigaChatAccount
+    ) -> Chat:
+        # Все сообщения и вложения обрабатываются конкурентно, но число
+        # одновременных загрузок в рамках запроса ограничено настройкой.
+        # Вложения загружаются в ту учетную запись, которая выполнит запрос
+        # Фаза convert включает вложенные decode, index и upload
+        upload_slots = asyncio.Semaphore(self._settings.upload_concurrency)
+        with timed("convert"):
+            converted = await gather_or_cancel(
+                self._process_message(message, account, upload_slots)
+                for message in request.messages
+            )
+        messages: list[Messages] = [m for batch in converted for m in batch]
 
         result: Chat = Chat(
             model=request.model,
@@ -132,18 +697,18 @@ class GigaChatService:
             temperature=request.temperature,
             stream=request.stream,
         )
-        local_logger.debug(
-            f"gigachat request: {result.json(by_alias=True, indent=2, ensure_ascii=False)}"
-        )
+        tracer.event("gigachat.request", lambda: result.dict(by_alias=True))
         return result
 
-    async def _process_message(self, message) -> list[Messages]:
+    async def _process_message(
+        self, message, account: GigaChatAccount, upload_slots: asyncio.Semaphore
+    ) -> list[Messages]:
         # Обрабатываем сообщение и возвращаем список сообщений
         if isinstance(message.content, str):
             return [self._create_text_message(message.role, message.content)]
         elif isinstance(message.content, list):
             return await self._process_message_content_list(
-                message.role, message.content
+                message.role, message.content, account, upload_slots
             )
         return []
 
@@ -151,24 +716,36 @@ class GigaChatService:
         # Создаем текстовое сообщение
         return Messages(role=GigaChatMessagesRole(role), content=content)
 
-    async def _process_message_content_list(self, role, content_list) -> list[Messages]:
-        # Обрабатываем список контента сообщения
-        messages = []
-        for content_item in content_list:
-            message = await self._process_content_item(role, content_item)
-            if message:
-                messages.append(message)
-        return messages
+    async def _process_message_content_list(
+        self,
+        role,
+        content_list,
+        account: GigaChatAccount,
+        upload_slots: asyncio.Semaphore,
+    ) -> list[Messages]:
+        # Обрабатываем список контента сообщения, сохраняя порядок элементов
+        messages = await gather_or_cancel(
+            self._process_content_item(role, content_item, account, upload_slots)
+            for content_item in content_list
+        )
+        return [message for message in messages if message]
 
-    async def _process_content_item(self, role, content_item) -> Messages | None:
+    async def _process_content_item(
+        self,
+        role,
+        content_item,
+        account: GigaChatAccount,
+        upload_slots: asyncio.Semaphore,
+    ) -> Messages | None:
         # Обрабатываем элемент контента сообщения
         match content_item:
             case ChatCompletionRequestMessageContentText():
                 return self._create_text_message(role, content_item.text)
             case ChatCompletionRequestMessageContentImage():
-                return await self._create_image_message(
-                    role, content_item.image_url.url
-                )
+                async with upload_slots:
+                    return await self._create_image_message(
+                        role, content_item.image_url.url, account
+                    )
             case ChatCompletionRequestMessageContentAudio():
                 local_logger.warning(
                     "Audio content is not supported by GigaChat Adapter"
@@ -177,9 +754,11 @@ class GigaChatService:
                 local_logger.warning("Unknown content type %s", type(content_item))
         return None
 
-    async def _create_image_message(self, role, image_url) -> Messages:
+    async def _create_image_message(
+        self, role, image_url, account: GigaChatAccount
+    ) -> Messages:
         # Создаем сообщение с изображением
-        attachment_id = await self._upload_base64(image_url)
+        attachment_id = await self._upload_image(image_url, account)
         return Messages(
             role=GigaChatMessagesRole(role),
             attachments=[str(attachment_id)],
@@ -195,93 +774,346 @@ class GigaChatService:
             return "stop"
         return finish_reason or "stop"
 
-    async def chat(self, request: ChatCompletionRequest) -> ChatCompletionResponse:
-        chat_completion: ChatCompletion = await self._client.achat(
-            await self._create_gigachat_request(request)
-        )
-        local_logger.debug(
-            f"gigachat response: {chat_completion.json(by_alias=True, indent=2, ensure_ascii=False)}"
-        )
-        return ChatCompletionResponse(
-            id=str(uuid.uuid4()),
-            object="chat.completion",
-            created=chat_completion.created,
-            model=chat_completion.model,
-            choices=[
-                ChatCompletionResponseChoice(
-                    index=c.index,
-                    message=ChatCompletionResponseMessage(
-                        role=MessagesRole(c.message.role),
-                        content=c.message.content,
-                        refusal=None,
-                    ),
-                    finish_reason=self._map_finish_reason(c.finish_reason),
-                )
-                for c in chat_completion.choices
-            ],
-            usage=ChatCompletionResponseUsage(
-                prompt_tokens=chat_completion.usage.prompt_tokens,
-                completion_tokens=chat_completion.usage.completion_tokens,
-                total_tokens=chat_completion.usage.total_tokens,
-                prompt_tokens_details=PromptTokensDetails(),
-                completion_tokens_details=CompletionTokensDetails(),
-            ),
-            service_tier=None,
-            system_fingerprint="None",
-        )
+    def _cached_response(
+        self, request: ChatCompletionRequest, use_cache: bool
+    ) -> tuple[str | None, ChatCompletion | None]:
+        # Кеш проверяется до допуска и выбора учетной записи, поэтому ключ
+        # строится по самому запросу, а не по сконвертированному Chat: в нем
+        # id вложений, загруженных в конкретную учетную запись.
+        # Кешируем только детерминированные запросы; флаг stream в ключ не
+        # входит, чтобы сохраненный ответ можно было отдать и потоком
+        if self._response_cache is None:
+            return None, None
+        if not use_cache:
+            self._response_cache_bypassed += 1
+            return None, None
+        if request.temperature > self._settings.response_cache_max_temperature:
+            return None, None
+        key = canonical_key(request.model_dump(mode="json", exclude={"stream"}))
+        return key, self._response_cache.get(key)
 
-    async def stream_chat(
-        self, request: ChatCompletionRequest
-    ) -> AsyncIterator[ChatCompletionStreamResponse]:
-        async for chunk in self._client.astream(
-            await self._create_gigachat_request(request)
-        ):
-            local_logger.debug(
-                f"gigachat response: {chunk.json(by_alias=True, indent=2, ensure_ascii=False)}"
-            )
-            yield ChatCompletionStreamResponse(
+    @asynccontextmanager
+    async def _in_flight(self, model: str) -> AsyncIterator[None]:
+        endpoint, _ = request_labels()
+        gauge = REQUESTS_IN_FLIGHT.labels(endpoint, self.model_label(model))
+        gauge.inc()
+        try:
+            yield
+        finally:
+            gauge.dec()
+
+    async def chat(
+        self, request: ChatCompletionRequest, use_cache: bool = True
+    ) -> ChatCompletionResponse:
+        # Ответ из кеша не занимает ни слот допуска, ни учетную запись
+        cache_key, chat_completion = self._cached_response(request, use_cache)
+        if chat_completion is None:
+            async with (
+                self._in_flight(request.model),
+                self.admission.admit(request.model),
+            ):
+                chat_completion = await self._retrier.call(
+                    "chat", lambda: self._chat_attempt(request, cache_key)
+                )
+        with timed("serialize"):
+            response = ChatCompletionResponse(
                 id=str(uuid.uuid4()),
-                object="chat.completion.chunk",
-                created=chunk.created,
-                model=chunk.model,
+                object="chat.completion",
+                created=chat_completion.created,
+                model=chat_completion.model,
                 choices=[
-                    ChatCompletionStreamResponseChoice(
+                    ChatCompletionResponseChoice(
                         index=c.index,
-                        delta=ChatCompletionStreamResponseDelta(
-                            role=MessagesRole(c.delta.role) if c.delta.role else None,
-                            content=c.delta.content,
+                        message=ChatCompletionResponseMessage(
+                            role=MessagesRole(c.message.role),
+                            content=c.message.content,
                             refusal=None,
                         ),
                         finish_reason=self._map_finish_reason(c.finish_reason),
                     )
-                    for c in chunk.choices
+                    for c in chat_completion.choices
+                ],
+                usage=ChatCompletionResponseUsage(
+                    prompt_tokens=chat_completion.usage.prompt_tokens,
+                    completion_tokens=chat_completion.usage.completion_tokens,
+                    total_tokens=chat_completion.usage.total_tokens,
+                    prompt_tokens_details=PromptTokensDetails(),
+                    completion_tokens_details=CompletionTokensDetails(),
+                ),
+                service_tier=None,
+                system_fingerprint="None",
+            )
+        return response
+
+    async def _chat_attempt(
+        self, request: ChatCompletionRequest, cache_key: str | None
+    ) -> ChatCompletion:
+        # Каждая попытка заново выбирает учетную запись, так что повтор после
+        # 429 уходит в другую запись вместе со своими вложениями
+        async with self._accounts.use() as account:
+            chat = await self._create_gigachat_request(request, account)
+            with timed("upstream"):
+                chat_completion = await account.client.achat(chat)
+        tracer.event("gigachat.response", lambda: chat_completion.dict(by_alias=True))
+        endpoint, _ = request_labels()
+        model = self.model_label(request.model)
+        usage = chat_completion.usage
+        TOKENS.labels(endpoint, model, "prompt").inc(usage.prompt_tokens)
+        TOKENS.labels(endpoint, model, "completion").inc(usage.completion_tokens)
+        api_keys.record_tokens(usage.prompt_tokens, usage.completion_tokens)
+        if cache_key is not None and self._response_cache is not None:
+            self._response_cache.set(
+                cache_key, chat_completion, len(chat_completion.json())
+            )
+        return chat_completion
+
+    async def _stream_upstream(
+        self, chat: Chat, account: GigaChatAccount
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        endpoint, _ = request_labels()
+        model = self.model_label(chat.model or "")
+        context = get_request_context()
+        # TTFT считаем от получения запроса, включая загрузку вложений и повторы
+        last = context.started if context is not None else time.perf_counter()
+        # Фаза upstream - ожидание первого чанка, stream - остаток потока
+        opened = time.perf_counter()
+        first = True
+        async for chunk in account.client.astream(chat):
+            now = time.perf_counter()
+            if first:
+                TIME_TO_FIRST_TOKEN.labels(endpoint, model).observe(now - last)
+                record_timing("upstream", now - opened)
+                opened = now
+                first = False
+            else:
+                INTER_CHUNK_LATENCY.labels(endpoint, model).observe(now - last)
+            last = now
+            tracer.event("gigachat.chunk", partial(chunk.dict, by_alias=True))
+            yield chunk
+        if not first:
+            record_timing("stream", time.perf_counter() - opened)
+
+    async def embeddings(self, request: EmbeddingsRequest) -> EmbeddingsResponse:
+        texts = [request.input] if isinstance(request.input, str) else request.input
+        if request.dimensions is not None:
+            local_logger.warning("dimensions is not supported by GigaChat, ignored")
+        # Каждый текст отправляется в общую пачку модели отдельно, поэтому
+        # тексты одного запроса могут уйти в GigaChat разными вызовами
+        async with self._in_flight(request.model):
+            with timed("upstream"):
+                results = await gather_or_cancel(
+                    self._embed(request.model, text) for text in texts
+                )
+        tokens = sum(tokens for _, tokens, _ in results)
+        # Как и в кеше ответов чата, тексты из кеша токены не расходуют
+        charged = sum(tokens for _, tokens, cached in results if not cached)
+        endpoint, _ = request_labels()
+        TOKENS.labels(endpoint, self.model_label(request.model), "prompt").inc(charged)
+        api_keys.record_tokens(charged, 0)
+        with timed("serialize"):
+            response = EmbeddingsResponse(
+                object="list",
+                data=[
+                    EmbeddingData(
+                        object="embedding",
+                        index=index,
+                        embedding=(
+                            encode_embedding(vector)
+                            if request.encoding_format == EncodingFormat.BASE64
+                            else vector.tolist()
+                        ),
+                    )
+                    for index, (vector, _, _) in enumerate(results)
                 ],
+                model=request.model,
+                usage=EmbeddingsUsage(prompt_tokens=tokens, total_tokens=tokens),
             )
+        return response
+
+    async def _embed(self, model: str, text: str) -> tuple[array, int, bool]:
+        # Возвращает вектор, число токенов и признак попадания в кеш
+        cache = self._embeddings_cache
+        if cache is None:
+            return (*await self._embeddings.submit(model, text), False)
+        key = hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+        cached = cache.get(key)
+        if cached is not None:
+            return (*cached, True)
+        vector, tokens = await self._embeddings.submit(model, text)
+        cache.set(key, (vector, tokens), vector.itemsize * len(vector) + len(key))
+        return vector, tokens, False
+
+    async def _embed_batch(
+        self, model: str, texts: list[str]
+    ) -> list[tuple[array, int]]:
+        # Пачка выполняется в отдельной задаче и занимает один слот допуска
+        async with self.admission.admit(model):
+            embeddings = await self._retrier.call(
+                "embeddings", lambda: self._embed_attempt(model, texts)
+            )
+        by_index = sorted(embeddings.data, key=lambda e: e.index)
+        return [(array("d", e.embedding), e.usage.prompt_tokens) for e in by_index]
+
+    async def _embed_attempt(self, model: str, texts: list[str]) -> Embeddings:
+        async with self._accounts.use() as account:
+            return await account.client.aembeddings(texts, model=model)
 
     async def upload_file(
-        self, filename: str, file: BinaryIO, content_type: str, purpose: str
+        self,
+        filename: str,
+        file: IO[bytes],
+        content_type: str,
+        purpose: str,
+        sha256: str,
+        size: int | None = None,
     ) -> FileUploadResponse:
-        fule_upload = await self._client.aupload_file(
-            (filename, file, content_type), purpose=purpose
-        )
-        result: FileUploadResponse = FileUploadResponse(
-            id=fule_upload.id_,
+        """
+        Загружает файл в GigaChat.
+
+        sha256 - хеш содержимого, посчитанный при приеме файла. Файл попадает
+        в учетную запись один раз: повторная загрузка того же содержимого (в
+        том числе изображения, уже пришедшего в data URI) возвращает id из
+        индекса вложений без передачи файла в GigaChat.
+        """
+        # Индекс ведется по учетным записям, поэтому запись выбирается до
+        # поиска в нем; use() учитывает загрузку в нагрузке записи и уводит
+        # запись на паузу после 429
+        async with self._accounts.use() as account:
+            key = account.key_prefix + sha256
+            if purpose != "general":
+                key += f":{purpose}"
+            with timed("index"):
+                existing_id = await self._attachments.get(key)
+            endpoint, model = request_labels()
+            if existing_id:
+                self._attachment_cache_hits += 1
+                ATTACHMENT_LOOKUPS.labels(endpoint, model, "hit").inc()
+                file_id = existing_id
+            else:
+                ATTACHMENT_LOOKUPS.labels(endpoint, model, "miss").inc()
+                file_id = await self._uploads.do(
+                    key,
+                    lambda: self._upload_indexed_file(
+                        key, account, filename, file, content_type, purpose
+                    ),
+                )
+        if size is None:
+            size = file.seek(0, 2)
+        return FileUploadResponse(
+            id=str(file_id),
             object="file",
-            bytes=fule_upload.bytes_,
-            created_at=fule_upload.created_at,
-            filename=fule_upload.filename,
+            bytes=size,
+            created_at=int(time.time()),
+            filename=filename,
             purpose=FilePurpose(purpose),
         )
-        return result
+
+    async def _upload_indexed_file(
+        self,
+        key: str,
+        account: GigaChatAccount,
+        filename: str,
+        file: IO[bytes],
+        content_type: str,
+        purpose: str,
+    ) -> str:
+        # Файл мог быть загружен, пока мы ждали своей очереди
+        with timed("index"):
+            existing_id = await self._attachments.get(key)
+        if existing_id:
+            return existing_id
+
+        # httpx читает файл кусками, поэтому в память он целиком не попадает
+        async def attempt():
+            file.seek(0)
+            return await account.client.aupload_file(
+                (filename, file, content_type), purpose=purpose
+            )
+
+        with timed("upload"):
+            uploaded = await self._retrier.call("files", attempt)
+        with timed("index"):
+            await self._attachments.set(key, str(uploaded.id_))
+        return str(uploaded.id_)
 
     async def stream_chat_sse(
+        self, request: ChatCompletionRequest, use_cache: bool = True
+    ) -> AsyncGenerator[bytes, None]:
+        # Стримим результаты чата в формате Server-Sent Events, минуя модели
+        # Pydantic: чанки GigaChat сразу кодируются в байты
+        encoder = ChatCompletionChunkEncoder()
+        _, cached = self._cached_response(request, use_cache)
+        if cached is not None:
+            # Сохраненный ответ отдаем одним чанком
+            yield encoder.encode(
+                cached.created,
+                cached.model,
+                (
+                    (
+                        c.index,
+                        MessagesRole(c.message.role).value,
+                        c.message.content,
+                        self._map_finish_reason(c.finish_reason),
+                    )
+                    for c in cached.choices
+                ),
+            )
+        else:
+            async with (
+                self._in_flight(request.model),
+                self.admission.admit(request.model),
+            ):
+                async for data in self._retrier.stream(
+                    "stream",
+                    lambda: self._stream_chat_sse_attempt(request, encoder),
+                ):
+                    yield data
+        # Заголовки потока уже отправлены, поэтому разбивку по фазам передаем
+        # комментарием SSE, который клиенты пропускают
+        context = get_request_context()
+        if context is not None and context.timings:
+            yield (
+                b": server-timing "
+                + context.server_timing(total=True).encode()
+                + b"\n\n"
+            )
+        yield SSE_DONE
+
+    async def _stream_chat_sse_attempt(
         self,
         request: ChatCompletionRequest,
-    ) -> AsyncGenerator[str, None]:
-        # Стримим результаты чата в формате Server-Sent Events
-        async for chunk in self.stream_chat(request):
-            yield f"data: {chunk.model_dump_json()}\n\n"
-        yield "data: [DONE]\n\n"
+        encoder: ChatCompletionChunkEncoder,
+    ) -> AsyncGenerator[bytes, None]:
+        async with self._accounts.use() as account:
+            chat = await self._create_gigachat_request(request, account)
 
-
-gigachat_service: GigaChatService = GigaChatService()
+            # В потоке GigaChat не возвращает usage, поэтому токены ключа
+            # списываются по оценке: промпт плюс полученный текст ответа.
+            # Списываем и при обрыве, если хоть один чанк успел прийти
+            completion: list[str] = []
+            received = False
+            try:
+                async for chunk in self._stream_upstream(chat, account):
+                    received = True
+                    completion.extend(c.delta.content or "" for c in chunk.choices)
+                    with timed("serialize"):
+                        data = encoder.encode(
+                            chunk.created,
+                            chunk.model,
+                            (
+                                (
+                                    c.index,
+                                    c.delta.role.value if c.delta.role else None,
+                                    c.delta.content,
+                                    self._map_finish_reason(c.finish_reason),
+                                )
+                                for c in chunk.choices
+                            ),
+                        )
+                    yield data
+            finally:
+                if received:
+                    api_keys.record_tokens(
+                        sum(estimate_tokens(m.content) for m in chat.messages),
+                        estimate_tokens("".join(completion)),
+                    )
@@ -1,3 +1,6 @@
+import math
+from contextlib import asynccontextmanager
+
 import gigachat.exceptions
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
@@ -7,14 +10,49 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 
 import src.core.gigachat_monkey_patch  # noqa: F401
 
+from .batch_service import BatchInputError, BatchService
+from .core.account_pool import get_response_error_status, get_retry_after
+from .core.admission import AdmissionRejected
+from .core.api_keys import RateLimited, api_keys
+from .core.circuit_breaker import CircuitOpen
+from .core.image_fetcher import ImageFetchError
+from .core.request_context import RequestContextMiddleware
 from .core.settings import get_app_settings
+from .core.settings_reload import SettingsReloader
+from .core.tracing import tracer
 from .endpoints import router
+from .gigachat_service import GigaChatService
 from .models.common import ErrorDetail, ErrorResponse
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Сервис создается в каждом воркере при старте приложения, а не при
+    # импорте: потоки, HTTP-клиенты и соединение с индексом вложений не должны
+    # наследоваться от родительского процесса через fork
+    service = GigaChatService()
+    app.state.gigachat_service = service
+    batches = BatchService(service)
+    app.state.batch_service = batches
+    reloader = SettingsReloader(interval=get_app_settings().settings_watch_interval)
+    await reloader.start()
+    await tracer.start()
+    await api_keys.start()
+    await service.startup()
+    # Незавершенные пакеты продолжаются, когда сервис уже готов
+    await batches.start()
+    yield
+    await batches.stop()
+    await service.aclose()
+    await api_keys.stop()
+    await tracer.stop()
+    await reloader.stop()
+
+
 def get_application() -> FastAPI:
     settings = get_app_settings()
     app = FastAPI(
+        lifespan=lifespan,
         title="GigaChat Adapter API",
         description="Connector to GigaChat API using OpenAI",
         debug=settings.debug,
@@ -31,6 +69,8 @@ def get_application() -> FastAPI:
             allow_headers=["*"],
         )
 
+    app.add_middleware(RequestContextMiddleware)
+
     app.include_router(router)
 
     @app.exception_handler(StarletteHTTPException)
@@ -59,6 +99,74 @@ def get_application() -> FastAPI:
             ).model_dump(),
         )
 
+    @app.exception_handler(AdmissionRejected)
+    async def admission_rejected_handler(request, exc):
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            content=ErrorResponse(
+                error=ErrorDetail(
+                    message=str(exc),
+                    type="rate_limit_error",
+                    code="rate_limit_exceeded",
+                )
+            ).model_dump(),
+        )
+
+    @app.exception_handler(RateLimited)
+    async def rate_limited_handler(request, exc):
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            content=ErrorResponse(
+                error=ErrorDetail(
+                    message=str(exc),
+                    type="rate_limit_error",
+                    code="rate_limit_exceeded",
+                )
+            ).model_dump(),
+        )
+
+    @app.exception_handler(BatchInputError)
+    async def batch_input_error_handler(request, exc):
+        return JSONResponse(
+            status_code=exc.status_code,
+            content=ErrorResponse(
+                error=ErrorDetail(
+                    message=str(exc),
+                    type="invalid_request_error",
+                    code="invalid_batch",
+                )
+            ).model_dump(),
+        )
+
+    @app.exception_handler(ImageFetchError)
+    async def image_fetch_error_handler(request, exc):
+        return JSONResponse(
+            status_code=exc.status_code,
+            content=ErrorResponse(
+                error=ErrorDetail(
+                    message=str(exc),
+                    type="invalid_request_error",
+                    code="invalid_image_url",
+                )
+            ).model_dump(),
+        )
+
+    @app.exception_handler(CircuitOpen)
+    async def circuit_open_handler(request, exc):
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            content=ErrorResponse(
+                error=ErrorDetail(
+                    message=str(exc),
+                    type="service_unavailable",
+                    code="upstream_unavailable",
+                )
+            ).model_dump(),
+        )
+
     @app.exception_handler(Exception)
     async def exception_handler(request, exc):
         return JSONResponse(
@@ -74,6 +182,24 @@ def get_application() -> FastAPI:
 
     @app.exception_handler(gigachat.exceptions.ResponseError)
     async def response_error_handler(request, exc):
+        if get_response_error_status(exc) == 429:
+            # Все учетные записи на паузе: клиент повторит запрос сам
+            retry_after = (
+                get_retry_after(exc)
+                or request.app.state.gigachat_service.throttled_for()
+                or 1
+            )
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+                content=ErrorResponse(
+                    error=ErrorDetail(
+                        message=str(exc),
+                        type="rate_limit_error",
+                        code="rate_limit_exceeded",
+                    )
+                ).model_dump(),
+            )
         return JSONResponse(
             status_code=500,
             content=ErrorResponse(
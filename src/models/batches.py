@@ -0,0 +1,94 @@
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class BatchStatus(str, Enum):
+    """Статус пакета"""
+
+    VALIDATING = "validating"
+    FAILED = "failed"
+    IN_PROGRESS = "in_progress"
+    FINALIZING = "finalizing"
+    COMPLETED = "completed"
+    EXPIRED = "expired"
+    CANCELLING = "cancelling"
+    CANCELLED = "cancelled"
+
+
+class BatchCreateRequest(BaseModel):
+    input_file_id: str = Field(
+        ..., description="The ID of an uploaded JSONL file with purpose batch."
+    )
+    endpoint: str = Field(
+        ..., description="The endpoint to use for all requests in the batch."
+    )
+    completion_window: str = Field(
+        "24h", description="The time frame within which the batch should be processed."
+    )
+    metadata: dict[str, str] | None = Field(
+        None, description="Key-value pairs attached to the batch."
+    )
+
+
+class BatchRequestCounts(BaseModel):
+    total: int = Field(..., description="Total number of requests in the batch.")
+    completed: int = Field(..., description="Requests completed successfully.")
+    failed: int = Field(..., description="Requests that have failed.")
+
+
+class BatchError(BaseModel):
+    code: str = Field(..., description="An error code identifying the error type.")
+    message: str = Field(..., description="A human-readable message.")
+    param: str | None = Field(None, description="The parameter that caused the error.")
+    line: int | None = Field(
+        None, description="The line number of the input file where the error occurred."
+    )
+
+
+class BatchErrors(BaseModel):
+    object: str = Field("list", description='The object type, which is always "list".')
+    data: list[BatchError]
+
+
+class Batch(BaseModel):
+    id: str = Field(..., description="The batch identifier.")
+    object: str = Field(
+        "batch", description='The object type, which is always "batch".'
+    )
+    endpoint: str = Field(..., description="The API endpoint used by the batch.")
+    errors: BatchErrors | None = Field(
+        None, description="Validation errors of the input file."
+    )
+    input_file_id: str = Field(..., description="The ID of the input file.")
+    completion_window: str = Field(
+        ..., description="The time frame within which the batch should be processed."
+    )
+    status: BatchStatus = Field(..., description="The current status of the batch.")
+    output_file_id: str | None = Field(
+        None, description="The ID of the file with successful results."
+    )
+    error_file_id: str | None = Field(
+        None, description="The ID of the file with failed requests."
+    )
+    created_at: int = Field(..., description="Unix timestamp of batch creation.")
+    in_progress_at: int | None = Field(None, description="When processing started.")
+    expires_at: int | None = Field(None, description="When the batch will expire.")
+    finalizing_at: int | None = Field(None, description="When finalizing started.")
+    completed_at: int | None = Field(None, description="When the batch completed.")
+    failed_at: int | None = Field(None, description="When the batch failed.")
+    expired_at: int | None = Field(None, description="When the batch expired.")
+    cancelling_at: int | None = Field(None, description="When cancelling started.")
+    cancelled_at: int | None = Field(None, description="When the batch was cancelled.")
+    request_counts: BatchRequestCounts
+    metadata: dict[str, str] | None = Field(
+        None, description="Key-value pairs attached to the batch."
+    )
+
+
+class BatchList(BaseModel):
+    object: str = Field("list", description='The object type, which is always "list".')
+    data: list[Batch]
+    first_id: str | None = Field(None, description="ID of the first batch on the page.")
+    last_id: str | None = Field(None, description="ID of the last batch on the page.")
+    has_more: bool = Field(..., description="Whether there are more batches.")
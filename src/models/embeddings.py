@@ -0,0 +1,55 @@
+from enum import Enum
+from typing import Annotated
+
+from pydantic import BaseModel, Field
+
+
+class EncodingFormat(str, Enum):
+    """Формат векторов в ответе"""
+
+    FLOAT = "float"
+    BASE64 = "base64"
+
+
+class EmbeddingsRequest(BaseModel):
+    # Пустой список отклоняется здесь, а не доходит до пачки эмбеддингов
+    input: str | Annotated[list[str], Field(min_length=1)] = Field(
+        ...,
+        description="Text to embed, or a non-empty list of texts to embed "
+        "in one request.",
+    )
+    model: str = Field("Embeddings", description="ID of the embedding model to use.")
+    encoding_format: EncodingFormat = Field(
+        EncodingFormat.FLOAT,
+        description="Return embeddings as a list of floats or as base64 "
+        "encoded little-endian float32 values.",
+    )
+    dimensions: int | None = Field(
+        None,
+        description="Not supported by GigaChat; the model's own size is returned.",
+    )
+    user: str | None = Field(
+        None, description="A unique identifier representing your end-user."
+    )
+
+
+class EmbeddingData(BaseModel):
+    object: str = Field(
+        "embedding", description='The object type, which is always "embedding".'
+    )
+    index: int = Field(..., description="The index of the input in the request.")
+    embedding: list[float] | str = Field(
+        ..., description="The embedding vector, as floats or a base64 string."
+    )
+
+
+class EmbeddingsUsage(BaseModel):
+    prompt_tokens: int = Field(..., description="Tokens in the inputs.")
+    total_tokens: int = Field(..., description="Total tokens used by the request.")
+
+
+class EmbeddingsResponse(BaseModel):
+    object: str = Field("list", description='The object type, which is always "list".')
+    data: list[EmbeddingData]
+    model: str = Field(..., description="The model used to embed the inputs.")
+    usage: EmbeddingsUsage
@@ -1,4 +1,5 @@
 from enum import Enum
+
 from pydantic import BaseModel, Field
 
 
@@ -7,13 +8,20 @@ class FilePurpose(str, Enum):
     ASSISTANTS = "assistants"
     VISION = "vision"
     BATCH = "batch"
+    BATCH_OUTPUT = "batch_output"
     GENERAL = "general"
 
 
+# Результаты пакетов создает сам адаптер, загрузить такой файл нельзя
+UPLOAD_PURPOSES = tuple(p for p in FilePurpose if p != FilePurpose.BATCH_OUTPUT)
+
+
 class FileUploadResponse(BaseModel):
     id: str = Field(..., description="The ID of the uploaded file.")
     object: str = Field("file", description="The object type (always 'file')")
     bytes: int = Field(..., description="The size of the file in bytes")
-    created_at: int = Field(..., description="Unix timestamp of when the file was created")
+    created_at: int = Field(
+        ..., description="Unix timestamp of when the file was created"
+    )
     filename: str = Field(..., description="The name of the file")
     purpose: FilePurpose = Field(..., description="The intended purpose of the file")
@@ -0,0 +1,169 @@
+from pydantic import BaseModel, Field
+
+
+class AttachmentStats(BaseModel):
+    cache_hits: int = Field(
+        ..., description="Attachments found in the attachment index."
+    )
+    uploads: int = Field(..., description="Attachments uploaded to GigaChat.")
+    deduplicated_uploads: int = Field(
+        ...,
+        description="Uploads that joined an identical upload already in flight.",
+    )
+    inflight_uploads: int = Field(..., description="Uploads currently in flight.")
+
+
+class ResponseCacheStats(BaseModel):
+    enabled: bool = Field(..., description="Whether the response cache is enabled.")
+    hits: int = Field(..., description="Requests answered from the cache.")
+    misses: int = Field(..., description="Cacheable requests sent to GigaChat.")
+    bypassed: int = Field(..., description="Requests that asked to bypass the cache.")
+    evictions: int = Field(..., description="Entries evicted to fit the byte budget.")
+    entries: int = Field(..., description="Entries currently cached.")
+    bytes: int = Field(..., description="Approximate size of cached entries.")
+
+
+class EmbeddingStats(BaseModel):
+    inputs: int = Field(..., description="Texts submitted for embedding.")
+    cache_hits: int = Field(..., description="Texts answered from the vector cache.")
+    deduplicated: int = Field(
+        ..., description="Texts that joined an identical text in a pending batch."
+    )
+    batches: int = Field(..., description="Embedding calls sent to GigaChat.")
+    batched_inputs: int = Field(..., description="Texts sent in those calls.")
+    split_batches: int = Field(
+        ...,
+        description="Failed calls split in halves to isolate the failing text.",
+    )
+    inflight_batches: int = Field(..., description="Embedding calls in flight.")
+    cache_entries: int = Field(..., description="Vectors currently cached.")
+    cache_bytes: int = Field(..., description="Approximate size of cached vectors.")
+
+
+class ImageFetchStats(BaseModel):
+    requests: int = Field(..., description="Remote image URLs referenced.")
+    fresh_hits: int = Field(
+        ..., description="URLs served from the blob cache without a request."
+    )
+    revalidated: int = Field(
+        ..., description="Conditional requests answered with 304 Not Modified."
+    )
+    deduplicated: int = Field(
+        ..., description="References that joined a fetch of the same URL in flight."
+    )
+    downloads: int = Field(..., description="Images downloaded in full.")
+    downloaded_bytes: int = Field(..., description="Bytes of downloaded images.")
+    cache_evictions: int = Field(
+        ..., description="Images evicted from the blob cache by this worker."
+    )
+
+
+class ImagePreprocessStats(BaseModel):
+    enabled: bool = Field(..., description="Whether image preprocessing is enabled.")
+    processed: int = Field(..., description="Images downscaled or recompressed.")
+    skipped: int = Field(
+        ..., description="Images uploaded as is: small, unsupported or not smaller."
+    )
+    failed: int = Field(..., description="Images that could not be processed.")
+    bytes_before: int = Field(..., description="Original size of processed images.")
+    bytes_after: int = Field(..., description="Size of processed images.")
+    bytes_saved: int = Field(..., description="Upload bytes saved by processing.")
+    seconds_total: float = Field(..., description="Time spent in the process pool.")
+
+
+class HttpPoolStats(BaseModel):
+    connections: int = Field(
+        ..., description="Number of HTTP/2 connection shards to GigaChat."
+    )
+    max_connections: int = Field(..., description="Connection limit of the pool.")
+    active_requests: int = Field(..., description="Upstream requests in flight.")
+    active_requests_per_connection: list[int] = Field(
+        ..., description="Upstream requests in flight on each shard."
+    )
+    peak_active_requests: int = Field(
+        ..., description="Highest number of concurrent upstream requests seen."
+    )
+    requests_total: int = Field(..., description="Upstream requests sent.")
+
+
+class AccountStats(BaseModel):
+    name: str = Field(..., description="Name of the GigaChat account.")
+    active_requests: int = Field(
+        ..., description="Requests currently routed to the account."
+    )
+    requests_total: int = Field(..., description="Requests routed to the account.")
+    throttled_total: int = Field(
+        ..., description="Times the account was rate limited by GigaChat."
+    )
+    cooldown_remaining: float = Field(
+        ..., description="Seconds until the account is routed to again."
+    )
+    circuit_state: str = Field(
+        ..., description="Circuit breaker state: closed, open or half_open."
+    )
+    circuit_opened_total: int = Field(..., description="Times the circuit opened.")
+    circuit_rejected_total: int = Field(
+        ..., description="Requests failed fast while the circuit was open."
+    )
+
+
+class ConcurrencyStats(BaseModel):
+    active_requests: int = Field(..., description="Requests holding a slot.")
+    queued_requests: int = Field(..., description="Requests waiting for a slot.")
+    peak_queued_requests: int = Field(
+        ..., description="Longest queue of waiting requests seen."
+    )
+    admitted_total: int = Field(..., description="Requests admitted.")
+    rejected_total: int = Field(
+        ..., description="Requests rejected with 429 because the queue was full."
+    )
+    queued_total: int = Field(..., description="Requests that had to wait.")
+    queue_wait_seconds_total: float = Field(
+        ..., description="Total time requests spent waiting in the queue."
+    )
+    max_queue_wait_seconds: float = Field(
+        ..., description="Longest time a request spent waiting in the queue."
+    )
+
+
+class RetryStats(BaseModel):
+    retries: dict[str, int] = Field(
+        ..., description="Retries of upstream calls by operation."
+    )
+    budget_exhausted: int = Field(
+        ..., description="Retries skipped because the retry budget was empty."
+    )
+    budget_tokens: float = Field(..., description="Retries currently affordable.")
+
+
+class ApiKeyUsage(BaseModel):
+    name: str = Field(..., description="Name of the API key.")
+    requests_total: int = Field(..., description="Requests admitted for the key.")
+    rate_limited_total: int = Field(
+        ..., description="Requests rejected by the key's limits."
+    )
+    prompt_tokens_total: int = Field(..., description="Prompt tokens used.")
+    completion_tokens_total: int = Field(..., description="Completion tokens used.")
+    requests_per_second: float | None = Field(
+        ..., description="Request rate limit, if any."
+    )
+    tokens_per_minute: float | None = Field(
+        ..., description="Token rate limit, if any."
+    )
+    tokens_available: float | None = Field(
+        ...,
+        description="Tokens left in the per-minute budget; negative when overdrawn.",
+    )
+
+
+class ServiceStats(BaseModel):
+    attachments: AttachmentStats
+    response_cache: ResponseCacheStats
+    embeddings: EmbeddingStats
+    images: ImageFetchStats
+    image_preprocessing: ImagePreprocessStats
+    http_pool: HttpPoolStats
+    accounts: list[AccountStats]
+    admission: ConcurrencyStats
+    admission_per_model: dict[str, ConcurrencyStats]
+    retries: RetryStats
@@ -1,6 +1,8 @@
 import os
+import tempfile
 import time
-from typing import Generator
+from collections.abc import Generator
+from typing import Any
 
 import pytest
 from fastapi.testclient import TestClient
@@ -10,13 +12,34 @@ TEST_BEARER_TOKEN = "test_token"
 os.environ["BEARER_TOKEN"] = TEST_BEARER_TOKEN
 os.environ["GIGACHAT_CREDENTIALS"] = "test_credentials"
 os.environ["DEBUG"] = "false"
+os.environ["GIGACHAT_ATTACHMENT_INDEX_PATH"] = os.path.join(
+    tempfile.mkdtemp(), "attachments.db"
+)
+# Изображения по URL отдает pytest_httpx, имена хостов не резолвятся
+os.environ["GIGACHAT_IMAGE_FETCH_ALLOW_PRIVATE"] = "true"
+os.environ["GIGACHAT_IMAGE_CACHE_DIR"] = os.path.join(tempfile.mkdtemp(), "images")
+os.environ["GIGACHAT_BATCH_DIR"] = os.path.join(tempfile.mkdtemp(), "batches")
+os.environ["USAGE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "usage.db")
 
 
-from src.main import get_application  # noqa: E402
+from src.main import get_application
+
+MODELS_URL = "https://gigachat.devices.sberbank.ru/api/v1/models"
+
+
+@pytest.fixture
+def models_response() -> dict[str, Any]:
+    """Ответ на запрос списка моделей при запуске (подменяется через parametrize)"""
+    return {"json": {"data": [], "object": "list"}}
 
 
 @pytest.fixture(scope="function")
-def client() -> Generator[TestClient, None, None]:
+def client(
+    httpx_mock: HTTPXMock, models_response: dict[str, Any]
+) -> Generator[TestClient, None, None]:
+    httpx_mock.add_response(
+        method="GET", url=MODELS_URL, is_optional=True, **models_response
+    )
     app = get_application()
     with TestClient(app) as client:
         yield client
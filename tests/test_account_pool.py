@@ -0,0 +1,114 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from gigachat.exceptions import ResponseError
+from pytest_httpx import HTTPXMock
+
+from src.core.account_pool import AccountPool, GigaChatAccount
+from src.gigachat_service import GigaChatService
+from src.models.completion import ChatCompletionRequest
+
+CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+
+
+def make_pool(*names: str) -> AccountPool:
+    return AccountPool(
+        [GigaChatAccount(name, None) for name in names],  # type: ignore[arg-type]
+        cooldown=30,
+    )
+
+
+def test_routes_to_least_loaded_account():
+    async def scenario():
+        pool = make_pool("a", "b")
+        async with pool.use() as first, pool.use() as second:
+            assert {first.name, second.name} == {"a", "b"}
+        async with pool.use() as third:
+            pass
+        return first, third
+
+    first, third = asyncio.run(scenario())
+    assert first.inflight == 0
+    # При равной нагрузке выбирается запись с меньшим числом запросов
+    assert third.name == "a"
+    assert third.requests_total == 2
+
+
+def test_throttled_account_cools_down_for_retry_after():
+    async def scenario():
+        pool = make_pool("a", "b")
+        with pytest.raises(ResponseError):
+            async with pool.use():
+                raise ResponseError(CHAT_URL, 429, b"", {"retry-after": "120"})
+        async with pool.use() as account:
+            return pool, account
+
+    pool, account = asyncio.run(scenario())
+    throttled = pool.accounts[0]
+    assert account.name == "b"
+    assert throttled.throttled_total == 1
+    assert not throttled.available
+    assert throttled.cooldown_until - account.cooldown_until > 100
+
+
+def test_all_accounts_throttled_picks_earliest_recovery():
+    pool = make_pool("a", "b")
+    pool.accounts[0].cool_down(60)
+    pool.accounts[1].cool_down(10)
+    assert pool.select().name == "b"
+
+
+def test_service_moves_off_rate_limited_account(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        match_headers={"Authorization": "Bearer token-a"},
+        status_code=429,
+        headers={"Retry-After": "60"},
+        json={"status": 429, "message": "Too Many Requests"},
+    )
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        match_headers={"Authorization": "Bearer token-b"},
+        json={
+            "choices": [
+                {
+                    "message": {"content": "Привет", "role": "assistant"},
+                    "index": 0,
+                    "finish_reason": "stop",
+                }
+            ],
+            "created": 1736023521,
+            "model": "GigaChat:1.0.26.20",
+            "object": "chat.completion",
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        },
+    )
+    request = ChatCompletionRequest.model_validate(
+        {"model": "GigaChat", "messages": [{"role": "user", "content": "Привет"}]}
+    )
+
+    async def scenario():
+        service = GigaChatService(
+            attachment_index_path=os.path.join(tempfile.mkdtemp(), "a.db"),
+            accounts=[
+                {"name": "a", "access_token": "token-a"},
+                {"name": "b", "access_token": "token-b"},
+            ],
+        )
+        try:
+            # 429 от первой записи повторяется во второй
+            response = await service.chat(request)
+            return response, service.get_stats()
+        finally:
+            await service.aclose()
+
+    response, stats = asyncio.run(scenario())
+    assert response.choices[0].message.content == "Привет"
+    accounts = {account.name: account for account in stats.accounts}
+    assert accounts["a"].throttled_total == 1
+    assert accounts["a"].cooldown_remaining > 0
+    assert accounts["b"].requests_total == 1
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.core.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    ConcurrencyLimiter,
+)
+from src.gigachat_service import GigaChatService
+
+from .conftest import MODELS_URL, TEST_BEARER_TOKEN
+
+
+def test_waiters_are_admitted_in_order():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=10)
+        order = []
+
+        async def worker(name: str):
+            assert await limiter.acquire(timeout=1)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            limiter.release()
+
+        await asyncio.gather(*(worker(str(i)) for i in range(4)))
+        return limiter, order
+
+    limiter, order = asyncio.run(scenario())
+    assert order == ["0", "1", "2", "3"]
+    assert limiter.active == 0
+    assert limiter.queued_total == 3
+    assert limiter.peak_queued == 3
+    assert limiter.max_wait_seconds > 0
+
+
+def test_full_queue_and_timeout_reject():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1)
+        assert await limiter.acquire(timeout=1)
+        queued = asyncio.ensure_future(limiter.acquire(timeout=0.05))
+        await asyncio.sleep(0)
+        # Очередь занята - отказ сразу
+        assert not await limiter.acquire(timeout=1)
+        # Ожидающий не дождался слота
+        assert not await queued
+        limiter.release()
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.rejected == 2
+    assert limiter.active == 0
+    assert limiter.queued == 0
+
+
+def test_per_model_limit_does_not_hold_global_slot():
+    async def scenario():
+        admission = AdmissionController(
+            max_concurrency=2,
+            max_concurrency_per_model=1,
+            max_queue=10,
+            queue_timeout=0.05,
+            retry_after=3,
+            is_known_model=lambda model: model.startswith("GigaChat"),
+        )
+        async with admission.admit("GigaChat"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit("GigaChat"):
+                    pass
+            async with admission.admit("GigaChat-Max"):
+                assert admission.limiter.active == 2
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(scenario())
+    assert rejected.retry_after == 3
+    assert admission.limiter.active == 0
+    assert admission.model_limiters["GigaChat"].rejected == 1
+
+
+def test_unknown_models_share_global_limit():
+    async def scenario():
+        admission = AdmissionController(
+            max_concurrency=2,
+            max_concurrency_per_model=1,
+            max_queue=10,
+            queue_timeout=0.05,
+            retry_after=3,
+            is_known_model=lambda model: model == "GigaChat",
+        )
+        async with admission.admit("made-up-1"), admission.admit("made-up-1"):
+            with pytest.raises(AdmissionRejected):
+                async with admission.admit("made-up-2"):
+                    pass
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert admission.model_limiters == {}
+    assert admission.limiter.rejected == 1
+
+
+def test_per_model_limit_applies_right_after_startup(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=MODELS_URL,
+        json={
+            "data": [{"id": "GigaChat-Max", "object": "model", "owned_by": "sber"}],
+            "object": "list",
+        },
+    )
+    service = GigaChatService(
+        max_concurrent_requests_per_model=1, max_queued_requests=0
+    )
+
+    async def scenario():
+        await service.startup()
+        # Модель не из настроек, но список моделей уже загружен при запуске
+        async with service.admission.admit("GigaChat-Max"):
+            with pytest.raises(AdmissionRejected):
+                async with service.admission.admit("GigaChat-Max"):
+                    pass
+        await service.aclose()
+
+    asyncio.run(scenario())
+    assert service.admission.model_limiters["GigaChat-Max"].rejected == 1
+
+
+def test_saturated_service_returns_429(client, monkeypatch):
+    monkeypatch.setattr(
+        client.app.state.gigachat_service,
+        "admission",
+        AdmissionController(
+            max_concurrency=0,
+            max_concurrency_per_model=None,
+            max_queue=0,
+            queue_timeout=0,
+            retry_after=2,
+            is_known_model=lambda model: True,
+        ),
+    )
+    payload = {
+        "model": "GigaChat",
+        "messages": [{"role": "user", "content": "Привет"}],
+    }
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    for stream in (False, True):
+        response = client.post(
+            "/v1/chat/completions",
+            json={**payload, "stream": stream},
+            headers=headers,
+        )
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "2"
+        assert response.json()["error"]["code"] == "rate_limit_exceeded"
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from src.core.aio import gather_or_cancel
+
+
+def test_gather_keeps_order():
+    async def delayed(value: int) -> int:
+        await asyncio.sleep(0.01 * (3 - value))
+        return value
+
+    assert asyncio.run(gather_or_cancel(delayed(i) for i in range(3))) == [0, 1, 2]
+
+
+def test_gather_cancels_siblings_on_error():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise ValueError("upload failed")
+
+    with pytest.raises(ValueError, match="upload failed"):
+        asyncio.run(gather_or_cancel([slow(), failing(), slow()]))
+    assert cancelled == [True, True]
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.core.api_keys import ApiKeyRegistry, TokenBucket, api_keys
+from src.core.request_context import RequestContext, _request_context
+from src.core.settings import AppSettings, reload_app_settings
+
+CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+
+
+@pytest.fixture
+def restore_settings(monkeypatch):
+    yield monkeypatch
+    monkeypatch.undo()
+    reload_app_settings()
+
+
+def test_token_bucket_can_be_overdrawn():
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+
+    tokens = TokenBucket(rate=10, capacity=10)
+    assert tokens.available() == 0
+    tokens.debit(25)
+    assert tokens.available() == pytest.approx(1.6, abs=0.01)
+
+
+def test_registry_looks_up_plain_and_hashed_keys(tmp_path):
+    settings = AppSettings(
+        bearer_token=None,
+        api_keys=[
+            {"name": "team-a", "key": "secret-a"},
+            {"name": "team-b", "key_sha256": hashlib.sha256(b"secret-b").hexdigest()},
+        ],
+    )
+    registry = ApiKeyRegistry(str(tmp_path / "usage.db"))
+    registry.configure(settings)
+
+    assert registry.authenticate("secret-a").name == "team-a"
+    assert registry.authenticate("secret-b").name == "team-b"
+    assert registry.authenticate("secret-c") is None
+
+    # Лимиты и счетчики переживают перезагрузку настроек
+    key = registry.authenticate("secret-a")
+    key.requests_total = 7
+    registry.configure(settings)
+    assert registry.authenticate("secret-a").requests_total == 7
+
+
+def test_usage_is_flushed_in_batches(tmp_path):
+    path = str(tmp_path / "usage.db")
+    registry = ApiKeyRegistry(path)
+    registry.configure(
+        AppSettings(bearer_token=None, api_keys=[{"name": "a", "key": "k"}])
+    )
+
+    async def scenario():
+        token = _request_context.set(RequestContext())
+        try:
+            for _ in range(3):
+                registry.admit("k")
+                registry.record_tokens(10, 5)
+        finally:
+            _request_context.reset(token)
+        await registry.flush()
+        await registry.stop()
+
+    asyncio.run(scenario())
+    assert registry.flushed_batches == 1
+    with sqlite3.connect(path) as conn:
+        row = conn.execute(
+            "SELECT SUM(requests), SUM(prompt_tokens), SUM(completion_tokens) "
+            "FROM usage WHERE key = 'a'"
+        ).fetchone()
+    assert row == (3, 30, 15)
+
+
+def test_key_limits_are_enforced(client, httpx_mock: HTTPXMock, restore_settings):
+    restore_settings.setenv(
+        "API_KEYS",
+        json.dumps(
+            [
+                {"name": "rps", "key": "rps-key", "requests_per_second": 0.1},
+                {"name": "tpm", "key": "tpm-key", "tokens_per_minute": 5},
+            ]
+        ),
+    )
+    reload_app_settings()
+
+    response = client.get("/stats", headers={"Authorization": "Bearer rps-key"})
+    assert response.status_code == 200
+    response = client.get("/stats", headers={"Authorization": "Bearer rps-key"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 9
+    assert response.json()["error"]["code"] == "rate_limit_exceeded"
+
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        json={
+            "choices": [
+                {
+                    "message": {"content": "Привет", "role": "assistant"},
+                    "index": 0,
+                    "finish_reason": "stop",
+                }
+            ],
+            "created": 1736023521,
+            "model": "GigaChat",
+            "object": "chat.completion",
+            "usage": {"prompt_tokens": 3, "completion_tokens": 4, "total_tokens": 7},
+        },
+    )
+    headers = {"Authorization": "Bearer tpm-key"}
+    payload = {"model": "GigaChat", "messages": [{"role": "user", "content": "Hi"}]}
+    assert (
+        client.post("/v1/chat/completions", json=payload, headers=headers).status_code
+        == 200
+    )
+    assert (
+        client.post("/v1/chat/completions", json=payload, headers=headers).status_code
+        == 429
+    )
+
+    key = api_keys.keys_by_name["tpm"]
+    assert key.requests_total == 1
+    assert key.rate_limited_total == 1
+    assert key.prompt_tokens_total == 3
+    assert key.completion_tokens_total == 4
+
+
+def test_streamed_tokens_are_charged(client, httpx_mock: HTTPXMock, restore_settings):
+    restore_settings.setenv(
+        "API_KEYS",
+        json.dumps([{"name": "stream", "key": "stream-key", "tokens_per_minute": 5}]),
+    )
+    reload_app_settings()
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        content=(
+            "".join(
+                "data: "
+                + json.dumps(
+                    {
+                        "choices": [{"delta": {"content": text}, "index": 0}],
+                        "created": 1736023521,
+                        "model": "GigaChat",
+                        "object": "chat.completion",
+                    }
+                )
+                + "\n\n"
+                for text in ("Привет, ", "как дела?")
+            )
+            + "data: [DONE]\n\n"
+        ).encode(),
+        headers={"Content-Type": "text/event-stream"},
+    )
+    headers = {"Authorization": "Bearer stream-key"}
+    payload = {
+        "model": "GigaChat",
+        "messages": [{"role": "user", "content": "Здравствуй"}],
+        "stream": True,
+    }
+    response = client.post("/v1/chat/completions", json=payload, headers=headers)
+    assert response.status_code == 200
+    assert response.text.endswith("data: [DONE]\n\n")
+
+    # Оценка: 3 символа на токен для промпта и для текста ответа
+    key = api_keys.keys_by_name["stream"]
+    assert key.prompt_tokens_total == 4
+    assert key.completion_tokens_total == 6
+    response = client.post("/v1/chat/completions", json=payload, headers=headers)
+    assert response.status_code == 429
+
+
+def test_usage_endpoint(client, restore_settings):
+    restore_settings.setenv(
+        "API_KEYS", json.dumps([{"name": "team", "key": "team-key"}])
+    )
+    reload_app_settings()
+
+    response = client.get("/usage", headers={"Authorization": "Bearer team-key"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["name"] == "team"
+    assert data["requests_total"] >= 1
+
+    response = client.get("/usage", headers={"Authorization": "Bearer unknown"})
+    assert response.status_code == 401
@@ -0,0 +1,87 @@
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from src.core.attachment_index import AttachmentIndex
+
+
+def test_set_and_get(tmp_path):
+    async def scenario():
+        index = AttachmentIndex(str(tmp_path / "index.db"), legacy_path=None)
+        assert await index.get("missing") is None
+        await index.set("key", "file-id")
+        assert await index.get("key") == "file-id"
+        await index.close()
+
+    asyncio.run(scenario())
+
+
+def test_persists_between_instances(tmp_path):
+    path = str(tmp_path / "index.db")
+
+    async def write():
+        index = AttachmentIndex(path, legacy_path=None)
+        await asyncio.gather(*(index.set(f"key{i}", f"id{i}") for i in range(50)))
+        await index.close()
+
+    async def read():
+        index = AttachmentIndex(path, legacy_path=None)
+        values = [await index.get(f"key{i}") for i in range(50)]
+        await index.close()
+        return values
+
+    asyncio.run(write())
+    assert asyncio.run(read()) == [f"id{i}" for i in range(50)]
+
+
+def test_migrates_legacy_kv_store(tmp_path):
+    legacy = tmp_path / "kv_store.json"
+    legacy.write_text(json.dumps({"old-key": "old-id"}), encoding="utf-8")
+
+    async def scenario():
+        index = AttachmentIndex(str(tmp_path / "index.db"), legacy_path=str(legacy))
+        # Старые ключи не попадают в основной индекс, пока их не перенесут
+        assert await index.get("old-key") is None
+        assert index.has_legacy
+        assert await index.adopt_legacy("missing", "new-key") is None
+        assert await index.adopt_legacy("old-key", "new-key") == "old-id"
+        assert await index.adopt_legacy("old-key", "other-key") is None
+        await index.close()
+
+        index = AttachmentIndex(str(tmp_path / "index.db"), legacy_path=str(legacy))
+        value = await index.get("new-key")
+        assert not index.has_legacy
+        await index.close()
+        return value
+
+    assert asyncio.run(scenario()) == "old-id"
+    assert not legacy.exists()
+    assert (tmp_path / "kv_store.json.migrated").exists()
+
+
+def write_from_worker(path: str, worker: int) -> None:
+    async def scenario():
+        index = AttachmentIndex(path, legacy_path=None)
+        await asyncio.gather(
+            *(index.set(f"w{worker}-{i}", f"id{i}") for i in range(50))
+        )
+        await index.close()
+
+    asyncio.run(scenario())
+
+
+def test_shared_between_worker_processes(tmp_path):
+    path = str(tmp_path / "index.db")
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(write_from_worker, path, worker) for worker in range(4)]
+        for future in futures:
+            future.result()
+
+    async def read():
+        index = AttachmentIndex(path, legacy_path=None)
+        values = [await index.get(f"w{w}-49") for w in range(4)]
+        await index.close()
+        return values
+
+    assert asyncio.run(read()) == ["id49"] * 4
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+from pytest_httpx import HTTPXMock
+
+from src.batch_service import BatchService
+from src.core.settings import reload_app_settings
+from src.gigachat_service import GigaChatService
+from tests.conftest import TEST_BEARER_TOKEN
+
+CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+HEADERS = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+
+
+def batch_line(custom_id: str, content: str) -> dict:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": "GigaChat",
+            "messages": [{"role": "user", "content": content}],
+        },
+    }
+
+
+def to_jsonl(lines: list[dict]) -> bytes:
+    return b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+
+
+def chat_callback(prompts: list):
+    # Отвечает эхом; запрос с текстом "bad" GigaChat отклоняет с 400
+    def callback(request: httpx.Request) -> httpx.Response:
+        content = json.loads(request.content)["messages"][-1]["content"]
+        prompts.append(content)
+        if content == "bad":
+            return httpx.Response(400, json={"status": 400, "message": "Bad request"})
+        return httpx.Response(
+            200,
+            json={
+                "choices": [
+                    {
+                        "message": {"content": f"echo {content}", "role": "assistant"},
+                        "index": 0,
+                        "finish_reason": "stop",
+                    }
+                ],
+                "created": 1736023521,
+                "model": "GigaChat",
+                "object": "chat.completion",
+                "usage": {
+                    "prompt_tokens": 1,
+                    "completion_tokens": 2,
+                    "total_tokens": 3,
+                },
+            },
+        )
+
+    return callback
+
+
+def wait_for_status(client, batch_id: str, statuses: set[str]) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        batch = client.get(f"/v1/batches/{batch_id}", headers=HEADERS).json()
+        if batch["status"] in statuses:
+            return batch
+        time.sleep(0.05)
+    raise AssertionError(f"Batch is still {batch['status']}")
+
+
+def test_batch_runs_to_completion(client, httpx_mock: HTTPXMock):
+    prompts: list = []
+    httpx_mock.add_callback(
+        chat_callback(prompts), url=CHAT_URL, method="POST", is_reusable=True
+    )
+    lines = [batch_line(f"req-{i}", f"hello {i}") for i in range(5)]
+    lines.append(batch_line("req-bad", "bad"))
+
+    upload = client.post(
+        "/v1/files",
+        files={"file": ("input.jsonl", to_jsonl(lines), "application/jsonl")},
+        data={"purpose": "batch"},
+        headers=HEADERS,
+    )
+    assert upload.status_code == 200
+    file_id = upload.json()["id"]
+
+    response = client.post(
+        "/v1/batches",
+        json={"input_file_id": file_id, "endpoint": "/v1/chat/completions"},
+        headers=HEADERS,
+    )
+    assert response.status_code == 200
+    batch = wait_for_status(client, response.json()["id"], {"completed", "failed"})
+
+    assert batch["status"] == "completed"
+    assert batch["request_counts"] == {"total": 6, "completed": 5, "failed": 1}
+    output = client.get(
+        f"/v1/files/{batch['output_file_id']}/content", headers=HEADERS
+    ).text.splitlines()
+    results = {r["custom_id"]: r["response"]["body"] for r in map(json.loads, output)}
+    assert results["req-3"]["choices"][0]["message"]["content"] == "echo hello 3"
+    assert len(results) == 5
+    errors = client.get(
+        f"/v1/files/{batch['error_file_id']}/content", headers=HEADERS
+    ).text.splitlines()
+    error = json.loads(errors[0])
+    assert error["custom_id"] == "req-bad"
+    assert error["response"]["status_code"] == 400
+
+    listed = client.get("/v1/batches", headers=HEADERS).json()
+    assert listed["data"][0]["id"] == batch["id"]
+
+
+def test_batches_and_files_are_visible_only_to_their_key(
+    client, httpx_mock: HTTPXMock, monkeypatch
+):
+    httpx_mock.add_callback(
+        chat_callback([]), url=CHAT_URL, method="POST", is_reusable=True
+    )
+    monkeypatch.setenv("API_KEYS", json.dumps([{"name": "other", "key": "other"}]))
+    reload_app_settings()
+    other = {"Authorization": "Bearer other"}
+    try:
+        upload = client.post(
+            "/v1/files",
+            files={"file": ("input.jsonl", to_jsonl([batch_line("a", "hi")]))},
+            data={"purpose": "batch"},
+            headers=HEADERS,
+        )
+        file_id = upload.json()["id"]
+        payload = {"input_file_id": file_id, "endpoint": "/v1/chat/completions"}
+        # Чужой входной файл нельзя использовать в своем пакете
+        assert (
+            client.post("/v1/batches", json=payload, headers=other).status_code == 400
+        )
+        batch_id = client.post("/v1/batches", json=payload, headers=HEADERS).json()[
+            "id"
+        ]
+
+        for method, path in (
+            ("GET", f"/v1/files/{file_id}"),
+            ("GET", f"/v1/files/{file_id}/content"),
+            ("GET", f"/v1/batches/{batch_id}"),
+            ("POST", f"/v1/batches/{batch_id}/cancel"),
+        ):
+            assert client.request(method, path, headers=other).status_code == 404
+        assert client.get("/v1/batches", headers=other).json()["data"] == []
+
+        batch = wait_for_status(client, batch_id, {"completed", "failed"})
+        assert batch["status"] == "completed"
+        output = f"/v1/files/{batch['output_file_id']}/content"
+        assert client.get(output, headers=other).status_code == 404
+        assert client.get(output, headers=HEADERS).status_code == 200
+    finally:
+        monkeypatch.undo()
+        reload_app_settings()
+
+
+def test_upload_requires_auth(client):
+    for headers, status_code in (({}, 403), ({"Authorization": "Bearer wrong"}, 401)):
+        response = client.post(
+            "/v1/files",
+            files={"file": ("input.jsonl", to_jsonl([batch_line("a", "hi")]))},
+            data={"purpose": "batch"},
+            headers=headers,
+        )
+        assert response.status_code == status_code
+
+
+def test_output_files_cannot_be_uploaded(client, httpx_mock: HTTPXMock):
+    response = client.post(
+        "/v1/files",
+        files={"file": ("output.jsonl", to_jsonl([batch_line("a", "hi")]))},
+        data={"purpose": "batch_output"},
+        headers=HEADERS,
+    )
+    assert response.status_code == 400
+    assert not httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/files"
+    )
+
+
+def test_invalid_input_fails_validation(client):
+    lines = [batch_line("same", "a"), batch_line("same", "b")]
+    upload = client.post(
+        "/v1/files",
+        files={"file": ("input.jsonl", to_jsonl(lines) + b"{oops\n", "text/plain")},
+        data={"purpose": "batch"},
+        headers=HEADERS,
+    )
+    response = client.post(
+        "/v1/batches",
+        json={"input_file_id": upload.json()["id"], "endpoint": "/v1/chat/completions"},
+        headers=HEADERS,
+    )
+    batch = wait_for_status(client, response.json()["id"], {"failed", "completed"})
+    assert batch["status"] == "failed"
+    assert [(e["line"], e["code"]) for e in batch["errors"]["data"]] == [
+        (2, "duplicate_custom_id"),
+        (3, "invalid_json_line"),
+    ]
+
+    response = client.post(
+        "/v1/batches",
+        json={"input_file_id": "file-missing", "endpoint": "/v1/chat/completions"},
+        headers=HEADERS,
+    )
+    assert response.status_code == 400
+
+
+def test_batch_resumes_from_checkpoint(httpx_mock: HTTPXMock):
+    prompts: list = []
+    httpx_mock.add_callback(
+        chat_callback(prompts), url=CHAT_URL, method="POST", is_reusable=True
+    )
+    directory = tempfile.mkdtemp()
+    lines = [batch_line(f"req-{i}", f"hello {i}") for i in range(4)]
+    with open(os.path.join(directory, "input.jsonl"), "wb") as f:
+        f.write(to_jsonl(lines))
+    # Прерванный воркер успел сохранить строки 1-2, а после контрольной
+    # точки дописал еще строку, которая должна быть отброшена
+    done = b'{"custom_id": "req-0"}\n{"custom_id": "req-1"}\n'
+    with open(os.path.join(directory, "batch_1.output.jsonl"), "wb") as f:
+        f.write(done + b'{"custom_id": "req-2"}\n')
+
+    async def scenario():
+        service = GigaChatService(
+            attachment_index_path=os.path.join(directory, "a.db"),
+            access_token="token",
+        )
+        batches = BatchService(service, dir=directory, checkpoint_interval=0.01)
+        await batches.store.add_file(
+            id="file-input",
+            filename="input.jsonl",
+            purpose="batch",
+            bytes=0,
+            created_at=0,
+            path=os.path.join(directory, "input.jsonl"),
+        )
+        await batches.store.add_batch(
+            id="batch_1",
+            status="in_progress",
+            endpoint="/v1/chat/completions",
+            input_file_id="file-input",
+            completion_window="24h",
+            created_at=int(time.time()),
+            expires_at=int(time.time()) + 3600,
+            total=4,
+            completed=2,
+            owner="dead-worker",
+            lease_until=0,
+            output_bytes=len(done),
+        )
+        await batches.store.checkpoint("batch_1", "dead-worker", [1, 2], {})
+        await batches.start()
+        try:
+            for _ in range(200):
+                batch = await batches.get("batch_1", None)
+                if batch is not None and batch.status == "completed":
+                    break
+                await asyncio.sleep(0.05)
+            found = await batches.get_file(batch.output_file_id, None)
+            return batch, found[1]
+        finally:
+            await batches.stop()
+            await service.aclose()
+
+    batch, output_path = asyncio.run(scenario())
+    with open(output_path, "rb") as result:
+        output = result.read().splitlines()
+    assert batch.status == "completed"
+    assert batch.request_counts.completed == 4
+    assert sorted(prompts) == ["hello 2", "hello 3"]
+    # Отброшенная строка req-2 выполнена заново и записана один раз
+    assert [json.loads(line)["custom_id"] for line in output][:2] == ["req-0", "req-1"]
+    assert sorted(json.loads(line)["custom_id"] for line in output) == [
+        "req-0",
+        "req-1",
+        "req-2",
+        "req-3",
+    ]
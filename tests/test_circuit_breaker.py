@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.core.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerTransport,
+    CircuitOpen,
+    CircuitState,
+)
+
+from .conftest import TEST_BEARER_TOKEN
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    options = {"min_requests": 4, "open_duration": 60, "half_open_probes": 2}
+    return CircuitBreaker("test", **{**options, **kwargs})
+
+
+def test_opens_on_error_rate_and_fails_fast():
+    breaker = make_breaker()
+    for failed in (False, True, True, True):
+        breaker.record(breaker.before_call(), failed, 0.01)
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpen) as error:
+        breaker.before_call()
+    assert error.value.retry_after > 50
+    assert breaker.rejected_total == 1
+
+
+def test_opens_on_slow_calls():
+    breaker = make_breaker(slow_call_duration=1, slow_call_rate=0.5)
+    for duration in (0.1, 0.1, 2, 2):
+        breaker.record(breaker.before_call(), False, duration)
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_half_open_probes_close_or_reopen():
+    breaker = make_breaker(open_duration=0)
+    for _ in range(4):
+        breaker.record(breaker.before_call(), True, 0.01)
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    # Пробных вызовов не больше half_open_probes
+    probes = [breaker.before_call(), breaker.before_call()]
+    assert probes == [True, True]
+    assert not breaker.can_attempt()
+    for probe in probes:
+        breaker.record(probe, False, 0.01)
+    assert breaker.state == CircuitState.CLOSED
+
+    breaker = make_breaker(open_duration=0.05)
+    for _ in range(4):
+        breaker.record(breaker.before_call(), True, 0.01)
+    time.sleep(0.06)
+    breaker.record(breaker.before_call(), True, 0.01)
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.opened_total == 2
+
+
+def test_transport_records_upstream_status():
+    breaker = make_breaker()
+    transport = CircuitBreakerTransport(
+        httpx.MockTransport(lambda request: httpx.Response(503)), breaker
+    )
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(4):
+                await client.get("https://gigachat.test/models")
+            with pytest.raises(CircuitOpen):
+                await client.get("https://gigachat.test/models")
+
+    asyncio.run(scenario())
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_open_circuit_fails_fast_and_fails_readiness(client, monkeypatch):
+    account = client.app.state.gigachat_service._accounts.accounts[0]
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(breaker.before_call(), True, 0.01)
+    monkeypatch.setattr(account, "breaker", breaker)
+
+    response = client.post(
+        "/v1/chat/completions",
+        json={"model": "GigaChat", "messages": [{"role": "user", "content": "Привет"}]},
+        headers={"Authorization": f"Bearer {TEST_BEARER_TOKEN}"},
+    )
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) > 0
+    assert response.json()["error"]["code"] == "upstream_unavailable"
+    assert client.get("/health/readiness").status_code == 503
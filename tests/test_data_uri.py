@@ -0,0 +1,36 @@
+import asyncio
+import base64
+
+import pytest
+
+from src.core.data_uri import adecode_data_uri, decode_data_uri
+
+PAYLOAD = bytes(range(256)) * 4
+ENCODED = base64.b64encode(PAYLOAD).decode()
+
+
+def test_decode_data_uri():
+    decoded = decode_data_uri(f"data:image/png;base64,{ENCODED}")
+    assert decoded.data == PAYLOAD
+    assert decoded.mime_type == "image/png"
+
+
+def test_same_image_with_different_formatting_has_same_hash():
+    wrapped = "\n".join(ENCODED[i : i + 76] for i in range(0, len(ENCODED), 76))
+    plain = decode_data_uri(f"data:image/png;base64,{ENCODED}")
+    other = decode_data_uri(f"data:image/png;name=cat.png;base64,{wrapped}")
+    assert plain.sha256 == other.sha256
+
+
+@pytest.mark.parametrize(
+    "uri", ["https://example.com/cat.png", "data:image/png,raw-bytes"]
+)
+def test_rejects_unsupported_uris(uri):
+    with pytest.raises(ValueError):
+        decode_data_uri(uri)
+
+
+def test_large_uri_is_decoded_in_executor():
+    uri = f"data:image/png;base64,{ENCODED}"
+    decoded = asyncio.run(adecode_data_uri(uri, None, offload_threshold=1))
+    assert decoded == decode_data_uri(uri)
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+import tempfile
+
+import httpx
+from fastapi import status
+from pytest_httpx import HTTPXMock
+
+from src.core.tracing import tracer
+from src.gigachat_service import GigaChatService
+from src.models.embeddings import EmbeddingsRequest
+from tests.conftest import TEST_BEARER_TOKEN
+
+EMBEDDINGS_URL = "https://gigachat.devices.sberbank.ru/api/v1/embeddings"
+
+
+def embeddings_callback(batches: list):
+    def callback(request: httpx.Request) -> httpx.Response:
+        texts = json.loads(request.content)["input"]
+        batches.append(texts)
+        return httpx.Response(
+            200,
+            json={
+                "object": "list",
+                "model": "Embeddings",
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": index,
+                        "embedding": [float(len(text)), 0.5],
+                        "usage": {"prompt_tokens": len(text)},
+                    }
+                    for index, text in enumerate(texts)
+                ],
+            },
+        )
+
+    return callback
+
+
+def test_embeddings_endpoint(client, httpx_mock: HTTPXMock):
+    batches: list = []
+    httpx_mock.add_callback(
+        embeddings_callback(batches), url=EMBEDDINGS_URL, method="POST"
+    )
+
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post(
+        "/v1/embeddings",
+        json={"model": "Embeddings", "input": ["abc", "de", "abc"]},
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [item["embedding"] for item in data["data"]] == [
+        [3.0, 0.5],
+        [2.0, 0.5],
+        [3.0, 0.5],
+    ]
+    assert data["usage"] == {"prompt_tokens": 8, "total_tokens": 8}
+    # Повторяющийся текст отправлен один раз
+    assert batches == [["abc", "de"]]
+
+
+def test_empty_input_is_rejected(client, httpx_mock: HTTPXMock):
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post(
+        "/v1/embeddings",
+        json={"model": "Embeddings", "input": []},
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["error"]["type"] == "invalid_request_error"
+    assert not httpx_mock.get_requests(url=EMBEDDINGS_URL)
+
+
+def test_embeddings_request_is_traced(client, httpx_mock: HTTPXMock, monkeypatch):
+    httpx_mock.add_callback(embeddings_callback([]), url=EMBEDDINGS_URL, method="POST")
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setattr(tracer, "sample_ratio", 1.0)
+    tracer._buffer.clear()
+
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post(
+        "/v1/embeddings",
+        json={"model": "Embeddings", "input": ["abc"]},
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    events = list(tracer._buffer)
+    tracer._buffer.clear()
+    assert [event["event"] for event in events] == ["api.request", "api.timing"]
+    assert events[0]["trace_id"] == events[1]["trace_id"]
+    assert events[0]["data"]["input"] == ["abc"]
+
+
+def test_concurrent_requests_share_batch_and_cache(httpx_mock: HTTPXMock):
+    batches: list = []
+    httpx_mock.add_callback(
+        embeddings_callback(batches),
+        url=EMBEDDINGS_URL,
+        method="POST",
+        is_reusable=True,
+    )
+
+    async def scenario():
+        service = GigaChatService(
+            attachment_index_path=os.path.join(tempfile.mkdtemp(), "a.db"),
+            access_token="token",
+            embeddings_cache_enabled=True,
+        )
+        try:
+            responses = await asyncio.gather(
+                *(
+                    service.embeddings(EmbeddingsRequest(input=text))  # type: ignore[call-arg]
+                    for text in ("one", "two", "three")
+                )
+            )
+            cached = await service.embeddings(
+                EmbeddingsRequest(input="two", encoding_format="base64")  # type: ignore[call-arg, arg-type]
+            )
+            return responses, cached, service.get_stats()
+        finally:
+            await service.aclose()
+
+    responses, cached, stats = asyncio.run(scenario())
+    assert batches == [["one", "two", "three"]]
+    assert [r.data[0].embedding for r in responses] == [
+        [3.0, 0.5],
+        [3.0, 0.5],
+        [5.0, 0.5],
+    ]
+    assert struct.unpack("<2f", base64.b64decode(cached.data[0].embedding)) == (
+        3.0,
+        0.5,
+    )
+    assert cached.usage.prompt_tokens == 3
+    assert stats.embeddings.cache_hits == 1
+    assert stats.embeddings.batches == 1
+    assert stats.embeddings.inputs == 4
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import httpx
+from pytest_httpx import HTTPXMock
+
+from src.core.gigachat_client import PooledGigaChat
+
+OAUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+
+
+def make_client(**kwargs) -> PooledGigaChat:
+    return PooledGigaChat(
+        limits=httpx.Limits(max_connections=10),
+        credentials="test_credentials",
+        **kwargs,
+    )
+
+
+def test_concurrent_token_updates_collapse_into_one(httpx_mock: HTTPXMock):
+    async def scenario():
+        client = make_client()
+        await asyncio.gather(*(client._aupdate_token() for _ in range(5)))
+        await client.aclose()
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.token == "mock_access_token"
+    assert len(httpx_mock.get_requests(url=OAUTH_URL)) == 1
+
+
+def test_token_is_refreshed_before_expiry(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        method="POST",
+        url=OAUTH_URL,
+        json={
+            "access_token": "refreshed_token",
+            "expires_at": int(time.time() * 1000) + 3_600_000,
+        },
+    )
+
+    async def scenario():
+        client = make_client(token_refresh_margin=3600)
+        await client.aget_token()
+        client.start_token_refresh()
+        await asyncio.sleep(0.05)
+        await client.aclose()
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.token == "refreshed_token"
+    assert client._check_validity_token()
+
+
+def test_expired_token_is_not_valid():
+    client = make_client()
+    assert not client._check_validity_token()
+    assert client.token_expires_in() == 0.0
@@ -1,6 +1,9 @@
+import pytest
 from fastapi import status
 from pytest_httpx import HTTPXMock
 
+from .conftest import MODELS_URL
+
 
 def test_liveness(client):
     """Test liveness endpoint returns 200 and correct version"""
@@ -11,24 +14,22 @@ def test_liveness(client):
     assert isinstance(data["version"], str)
 
 
+MODELS_RESPONSE = {
+    "data": [
+        {
+            "id": "GigaChat",
+            "object": "model",
+            "owned_by": "salutedevices",
+            "created": 1735689600,
+        }
+    ],
+    "object": "list",
+}
+
+
+@pytest.mark.parametrize("models_response", [{"json": MODELS_RESPONSE}])
 def test_readiness(client, httpx_mock: HTTPXMock):
     """Test readiness endpoint returns 200 when GigaChat API is available"""
-    # Mock GigaChat models API call
-    httpx_mock.add_response(
-        json={
-            "data": [
-                {
-                    "id": "GigaChat",
-                    "object": "model",
-                    "owned_by": "salutedevices",
-                    "created": 1735689600,
-                }
-            ],
-            "object": "list",
-        },
-        url="https://gigachat.devices.sberbank.ru/api/v1/models",
-    )
-
     response = client.get("/health/readiness")
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
@@ -36,16 +37,23 @@ def test_readiness(client, httpx_mock: HTTPXMock):
     assert isinstance(data["version"], str)
 
 
+@pytest.mark.parametrize("models_response", [{"status_code": 500, "is_reusable": True}])
 def test_readiness_failure(client, httpx_mock: HTTPXMock):
-    """Test readiness endpoint returns 500 when GigaChat API is unavailable"""
-    # Mock GigaChat models API call failure
-    httpx_mock.add_response(
-        status_code=500,
-        url="https://gigachat.devices.sberbank.ru/api/v1/models",
-    )
-
+    """Test readiness endpoint returns 503 when GigaChat API is unavailable"""
+    # Список моделей не загрузился ни при запуске, ни при повторах
     response = client.get("/health/readiness")
-    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
     data = response.json()
     assert data["error"]["type"] == "http"
     assert data["error"]["code"] == "HTTP_EXCEPTION"
+
+
+@pytest.mark.parametrize("models_response", [{"json": MODELS_RESPONSE}])
+def test_readiness_uses_last_known_state(client, httpx_mock: HTTPXMock):
+    """Repeated readiness probes do not call GigaChat API every time"""
+    for _ in range(3):
+        response = client.get("/health/readiness")
+        assert response.status_code == status.HTTP_200_OK
+    # Состояние известно после загрузки списка моделей при запуске
+    upstream_calls = httpx_mock.get_requests(url=MODELS_URL)
+    assert len(upstream_calls) == 1
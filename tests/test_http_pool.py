@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+from pytest_httpx import HTTPXMock
+
+from src.core.http_pool import ShardedTransport
+
+
+def test_requests_are_spread_across_shards(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(url="https://example.com/", is_reusable=True)
+    transport = ShardedTransport(shards=2)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with (
+                client.stream("GET", "https://example.com/"),
+                client.stream("GET", "https://example.com/"),
+            ):
+                assert transport.active == [1, 1]
+            assert transport.active == [0, 0]
+
+    asyncio.run(scenario())
+    assert transport.requests_total == 2
+    assert transport.peak_active == 2
+
+
+def test_failed_request_releases_shard(httpx_mock: HTTPXMock):
+    httpx_mock.add_exception(httpx.ConnectError("boom"), url="https://example.com/")
+    transport = ShardedTransport(shards=2)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            try:
+                await client.get("https://example.com/")
+            except httpx.ConnectError:
+                pass
+
+    asyncio.run(scenario())
+    assert transport.active == [0, 0]
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.core.blob_cache import BlobCache, CachedBlob
+from src.core.image_fetcher import ImageFetcher, ImageFetchError
+
+IMAGE_URL = "https://images.example.com/cat.png"
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+def create_fetcher(tmp_path, allow_private: bool = True) -> ImageFetcher:
+    return ImageFetcher(
+        BlobCache(str(tmp_path / "images"), 1024 * 1024),
+        max_bytes=1024,
+        timeout=5,
+        default_ttl=60,
+        max_connections=4,
+        allow_private=allow_private,
+    )
+
+
+def test_fetch_is_cached_and_revalidated(tmp_path, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=IMAGE_URL,
+        content=PNG,
+        headers={
+            "Content-Type": "image/png",
+            "ETag": '"v1"',
+            "Cache-Control": "max-age=0",
+        },
+    )
+    httpx_mock.add_response(url=IMAGE_URL, status_code=304, headers={"ETag": '"v1"'})
+
+    async def scenario():
+        fetcher = create_fetcher(tmp_path)
+        first = await fetcher.fetch(IMAGE_URL)
+        # max-age=0: второе обращение перепроверяет URL условным запросом
+        second = await fetcher.fetch(IMAGE_URL)
+        data = await fetcher.read(second)
+        stats = (fetcher.downloads, fetcher.revalidated)
+        await fetcher.aclose()
+        return first, second, data, stats
+
+    first, second, data, stats = asyncio.run(scenario())
+    assert first.sha256 == second.sha256
+    assert first.mime_type == "image/png"
+    assert data == PNG
+    assert stats == (1, 1)
+    conditional = httpx_mock.get_requests()[1]
+    assert conditional.headers["If-None-Match"] == '"v1"'
+
+
+def test_fresh_url_is_not_requested_again(tmp_path, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=IMAGE_URL, content=PNG, headers={"Content-Type": "image/png"}
+    )
+
+    async def scenario():
+        fetcher = create_fetcher(tmp_path)
+        blobs = await asyncio.gather(*(fetcher.fetch(IMAGE_URL) for _ in range(5)))
+        await fetcher.fetch(IMAGE_URL)
+        stats = (fetcher.downloads, fetcher.fresh_hits, fetcher.deduplicated)
+        await fetcher.aclose()
+        return blobs, stats
+
+    blobs, stats = asyncio.run(scenario())
+    assert len({blob.sha256 for blob in blobs}) == 1
+    assert stats == (1, 1, 4)
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.parametrize(
+    "url, headers, content, status_code",
+    [
+        (IMAGE_URL, {"Content-Type": "image/png"}, b"x" * 2048, 413),
+        (IMAGE_URL, {"Content-Type": "text/html"}, b"<html>", 400),
+    ],
+)
+def test_fetch_rejects_unsuitable_responses(
+    tmp_path, httpx_mock: HTTPXMock, url, headers, content, status_code
+):
+    httpx_mock.add_response(url=url, content=content, headers=headers)
+
+    async def scenario():
+        fetcher = create_fetcher(tmp_path)
+        try:
+            await fetcher.fetch(url)
+        finally:
+            await fetcher.aclose()
+
+    with pytest.raises(ImageFetchError) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == status_code
+
+
+def test_fetch_rejects_private_addresses(tmp_path):
+    async def scenario():
+        fetcher = create_fetcher(tmp_path, allow_private=False)
+        try:
+            await fetcher.fetch("http://127.0.0.1:8000/health/liveness")
+        finally:
+            await fetcher.aclose()
+
+    with pytest.raises(ImageFetchError, match="private address"):
+        asyncio.run(scenario())
+
+
+def test_blob_cache_evicts_least_recently_used(tmp_path):
+    def blob(url: str, sha256: str) -> CachedBlob:
+        return CachedBlob(url, sha256, "image/png", None, None, 0.0)
+
+    async def scenario():
+        cache = BlobCache(str(tmp_path / "images"), max_bytes=250)
+        await cache.store(blob("https://a", "a" * 64), b"a" * 100)
+        await cache.store(blob("https://b", "b" * 64), b"b" * 100)
+        # Обращение к a делает вытесняемым b
+        await asyncio.sleep(0.01)
+        assert await cache.lookup("https://a") is not None
+        await cache.store(blob("https://c", "c" * 64), b"c" * 100)
+        result = [await cache.lookup(f"https://{name}") for name in "abc"]
+        await cache.close()
+        return result, cache.evictions
+
+    (a, b, c), evictions = asyncio.run(scenario())
+    assert a is not None and c is not None
+    assert b is None
+    assert evictions == 1
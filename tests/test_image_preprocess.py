@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import random
+from io import BytesIO
+
+import pytest
+
+from src.core.data_uri import DecodedDataUri
+from src.core.image_preprocess import ImagePreprocessor, preprocess_image
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def screenshot_png(width: int, height: int) -> bytes:
+    # Крупные однотонные области с шумом, как у скриншота с текстом
+    image = Image.new("RGBA", (width, height), "white")
+    pixels = image.load()
+    rng = random.Random(0)
+    for _ in range(width * height // 50):
+        pixels[rng.randrange(width), rng.randrange(height)] = (
+            rng.randrange(256),
+            rng.randrange(256),
+            rng.randrange(256),
+            255,
+        )
+    output = BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+
+def test_preprocess_image_downscales_and_recompresses():
+    data = screenshot_png(1600, 1200)
+
+    result = preprocess_image(data, max_dimension=800, quality=85)
+
+    assert result is not None
+    processed, mime_type = result
+    assert mime_type == "image/jpeg"
+    assert len(processed) < len(data)
+    with Image.open(BytesIO(processed)) as image:
+        assert image.size == (800, 600)
+        assert image.mode == "RGB"
+
+
+def test_preprocess_image_keeps_smaller_original():
+    output = BytesIO()
+    Image.new("RGB", (64, 64), "white").save(output, "PNG")
+
+    assert preprocess_image(output.getvalue(), max_dimension=800, quality=85) is None
+
+
+def test_preprocessor_runs_in_process_pool_and_keeps_original_hash():
+    data = screenshot_png(1600, 1200)
+    original = DecodedDataUri(
+        data=data, mime_type="image/png", sha256=hashlib.sha256(data).hexdigest()
+    )
+    small = DecodedDataUri(data=b"tiny", mime_type="image/png", sha256="0" * 64)
+    preprocessor = ImagePreprocessor(
+        max_dimension=800, quality=85, min_bytes=1024, workers=1
+    )
+
+    async def scenario():
+        try:
+            return await asyncio.gather(
+                preprocessor.process(original), preprocessor.process(small)
+            )
+        finally:
+            preprocessor.close()
+
+    processed, skipped = asyncio.run(scenario())
+    assert processed.sha256 == original.sha256
+    assert processed.mime_type == "image/jpeg"
+    assert skipped is small
+    assert (preprocessor.processed, preprocessor.skipped) == (1, 1)
+    assert preprocessor.bytes_before == len(data)
+    assert preprocessor.bytes_after == len(processed.data)
@@ -1,42 +1,31 @@
+import hashlib
+import json
+
+import pytest
 from fastapi import status
 from pytest_httpx import HTTPXMock
 
-from .conftest import TEST_BEARER_TOKEN
+from src.core.attachment_index import AttachmentIndex
+from src.core.settings import reload_app_settings
+
+from .conftest import MODELS_URL, TEST_BEARER_TOKEN
+
+MODELS_RESPONSE = {
+    "data": [
+        {
+            "id": model,
+            "object": "model",
+            "owned_by": "salutedevices",
+            "created": 1735689600,
+        }
+        for model in ("GigaChat", "GigaChat-Max", "GigaChat-Plus", "GigaChat-Pro")
+    ],
+    "object": "list",
+}
 
 
+@pytest.mark.parametrize("models_response", [{"json": MODELS_RESPONSE}])
 def test_get_models(client, httpx_mock: HTTPXMock):
-    httpx_mock.add_response(
-        json={
-            "data": [
-                {
-                    "id": "GigaChat",
-                    "object": "model",
-                    "owned_by": "salutedevices",
-                    "created": 1735689600,
-                },
-                {
-                    "id": "GigaChat-Max",
-                    "object": "model",
-                    "owned_by": "salutedevices",
-                    "created": 1735689600,
-                },
-                {
-                    "id": "GigaChat-Plus",
-                    "object": "model",
-                    "owned_by": "salutedevices",
-                    "created": 1735689600,
-                },
-                {
-                    "id": "GigaChat-Pro",
-                    "object": "model",
-                    "owned_by": "salutedevices",
-                    "created": 1735689600,
-                },
-            ],
-            "object": "list",
-        },
-        url="https://gigachat.devices.sberbank.ru/api/v1/models",
-    )
     headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
     response = client.get("/v1/models", headers=headers)
     assert response.status_code == status.HTTP_200_OK
@@ -45,6 +34,24 @@ def test_get_models(client, httpx_mock: HTTPXMock):
     assert len(data["data"]) == 4
 
 
+@pytest.mark.parametrize("models_response", [{"json": MODELS_RESPONSE}])
+def test_get_models_is_cached_with_etag(client, httpx_mock: HTTPXMock):
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.get("/v1/models", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers["etag"]
+
+    cached = client.get("/v1/models", headers=headers)
+    assert cached.json() == response.json()
+    assert cached.headers["etag"] == etag
+
+    not_modified = client.get("/v1/models", headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    # Список загружен при запуске и дальше отдается из кеша
+    upstream_calls = httpx_mock.get_requests(url=MODELS_URL)
+    assert len(upstream_calls) == 1
+
+
 def test_chat_completions(client, httpx_mock: HTTPXMock):
     httpx_mock.add_response(
         json={
@@ -112,3 +119,302 @@ def test_invalid_json(client):
     assert data["error"]["type"] == "invalid_request_error"
     assert data["error"]["code"] == "BAD_REQUEST"
     assert "'JSON decode error'" in data["error"]["message"]
+
+
+CHAT_COMPLETION_RESPONSE = {
+    "choices": [
+        {
+            "message": {"content": "На картинке кот", "role": "assistant"},
+            "index": 0,
+            "finish_reason": "stop",
+        }
+    ],
+    "created": 1736023521,
+    "model": "GigaChat:1.0.26.20",
+    "object": "chat.completion",
+    "usage": {"prompt_tokens": 32, "completion_tokens": 5, "total_tokens": 37},
+}
+
+UPLOADED_FILE_RESPONSE = {
+    "id": "6f0b1291-c7f3-43c6-bb2e-9f3efb2dc98e",
+    "object": "file",
+    "bytes": 4,
+    "created_at": 1736023521,
+    "filename": "upload.png",
+    "purpose": "general",
+}
+
+
+def test_chat_completions_with_image_uploads_once(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        json=UPLOADED_FILE_RESPONSE,
+        url="https://gigachat.devices.sberbank.ru/api/v1/files",
+        method="POST",
+    )
+    httpx_mock.add_response(
+        json=CHAT_COMPLETION_RESPONSE,
+        url="https://gigachat.devices.sberbank.ru/api/v1/chat/completions",
+        method="POST",
+        is_reusable=True,
+    )
+
+    payload = {
+        "model": "GigaChat",
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "Что на картинке?"},
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": "data:image/png;base64,aW1hZ2U="},
+                    },
+                ],
+            },
+        ],
+    }
+
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    for _ in range(2):
+        response = client.post("/v1/chat/completions", json=payload, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+    uploads = httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/files"
+    )
+    assert len(uploads) == 1
+    chat_request = httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+    )[0]
+    messages = json.loads(chat_request.content)["messages"]
+    assert messages[1]["attachments"] == [UPLOADED_FILE_RESPONSE["id"]]
+
+
+LEGACY_FILE_ID = "0b4f4c1e-7a3b-4d2a-9f0e-1c2d3e4f5a6b"
+
+
+def test_chat_completions_reuses_legacy_attachment(
+    client, httpx_mock: HTTPXMock, tmp_path
+):
+    data_uri = "data:image/png;base64,aW1hZ2U="
+    legacy = tmp_path / "kv_store.json"
+    legacy.write_text(
+        json.dumps({hashlib.sha256(data_uri.encode()).hexdigest(): LEGACY_FILE_ID}),
+        encoding="utf-8",
+    )
+    service = client.app.state.gigachat_service
+    service._attachments = AttachmentIndex(
+        str(tmp_path / "index.db"), legacy_path=str(legacy)
+    )
+    httpx_mock.add_response(
+        json=CHAT_COMPLETION_RESPONSE,
+        url="https://gigachat.devices.sberbank.ru/api/v1/chat/completions",
+        method="POST",
+    )
+
+    payload = {
+        "model": "GigaChat",
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "image_url", "image_url": {"url": data_uri}}],
+            },
+        ],
+    }
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post("/v1/chat/completions", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    assert not httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/files"
+    )
+    chat_request = httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+    )[0]
+    messages = json.loads(chat_request.content)["messages"]
+    assert messages[0]["attachments"] == [LEGACY_FILE_ID]
+
+
+def test_chat_completions_with_image_url(client, httpx_mock: HTTPXMock):
+    image_url = "https://images.example.com/chart.png"
+    httpx_mock.add_response(
+        url=image_url,
+        content=b"\x89PNG remote chart",
+        headers={"Content-Type": "image/png", "Cache-Control": "max-age=600"},
+    )
+    httpx_mock.add_response(
+        json=UPLOADED_FILE_RESPONSE,
+        url="https://gigachat.devices.sberbank.ru/api/v1/files",
+        method="POST",
+    )
+    httpx_mock.add_response(
+        json=CHAT_COMPLETION_RESPONSE,
+        url="https://gigachat.devices.sberbank.ru/api/v1/chat/completions",
+        method="POST",
+        is_reusable=True,
+    )
+    payload = {
+        "model": "GigaChat",
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "image_url", "image_url": {"url": image_url}}],
+            },
+        ],
+    }
+
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    for _ in range(2):
+        response = client.post("/v1/chat/completions", json=payload, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+    # Второй запрос не скачивает изображение и не загружает его в GigaChat
+    assert len(httpx_mock.get_requests(url=image_url)) == 1
+    uploads = httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/files"
+    )
+    assert len(uploads) == 1
+    assert b"\x89PNG remote chart" in uploads[0].content
+
+
+def test_chat_completions_with_unreachable_image_url(client, httpx_mock: HTTPXMock):
+    image_url = "https://images.example.com/missing.png"
+    httpx_mock.add_response(url=image_url, status_code=404)
+    payload = {
+        "model": "GigaChat",
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "image_url", "image_url": {"url": image_url}}],
+            },
+        ],
+    }
+
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post("/v1/chat/completions", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["error"]["code"] == "invalid_image_url"
+
+
+def test_upload_file_is_deduplicated_by_content(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        json=UPLOADED_FILE_RESPONSE,
+        url="https://gigachat.devices.sberbank.ru/api/v1/files",
+        method="POST",
+    )
+    content = b"%PDF-1.7 " + b"x" * 100_000
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    (account,) = client.app.state.gigachat_service._accounts.accounts
+    requests_before = account.requests_total
+
+    for filename in ("report.pdf", "copy.pdf"):
+        response = client.post(
+            "/v1/files",
+            files={"file": (filename, content, "application/pdf")},
+            data={"purpose": "general"},
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["id"] == UPLOADED_FILE_RESPONSE["id"]
+        assert data["filename"] == filename
+        assert data["bytes"] == len(content)
+
+    uploads = httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/files"
+    )
+    assert len(uploads) == 1
+    assert content in uploads[0].content
+    # Обе загрузки прошли через учет нагрузки учетной записи
+    assert account.requests_total - requests_before == 2
+    assert account.inflight == 0
+
+
+def test_upload_file_requires_auth(client, httpx_mock: HTTPXMock):
+    response = client.post(
+        "/v1/files",
+        files={"file": ("report.pdf", b"%PDF-1.7", "application/pdf")},
+        data={"purpose": "general"},
+        headers={"Authorization": "Bearer wrong"},
+    )
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert not httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/files"
+    )
+
+
+def test_upload_file_rejects_too_large_file(client, httpx_mock: HTTPXMock, monkeypatch):
+    monkeypatch.setenv("UPLOAD_MAX_BYTES", "1000")
+    reload_app_settings()
+    try:
+        response = client.post(
+            "/v1/files",
+            files={"file": ("report.pdf", b"x" * 2000, "application/pdf")},
+            data={"purpose": "general"},
+            headers={"Authorization": f"Bearer {TEST_BEARER_TOKEN}"},
+        )
+    finally:
+        monkeypatch.undo()
+        reload_app_settings()
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert not httpx_mock.get_requests(
+        url="https://gigachat.devices.sberbank.ru/api/v1/files"
+    )
+
+
+def test_upload_file_rejects_missing_file(client):
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post(
+        "/v1/files", data={"purpose": "general"}, files={}, headers=headers
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_stats(client):
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.get("/stats", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["attachments"]["deduplicated_uploads"] >= 0
+    assert data["attachments"]["inflight_uploads"] == 0
+
+
+def test_chat_completions_stream(client, httpx_mock: HTTPXMock):
+    chunks = [
+        {
+            "choices": [{"delta": {"content": text, "role": "assistant"}, "index": 0}],
+            "created": 1736023521,
+            "model": "GigaChat:1.0.26.20",
+            "object": "chat.completion",
+        }
+        for text in ("Привет", ", мир")
+    ]
+    httpx_mock.add_response(
+        content=(
+            "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks)
+            + "data: [DONE]\n\n"
+        ).encode(),
+        headers={"Content-Type": "text/event-stream"},
+        url="https://gigachat.devices.sberbank.ru/api/v1/chat/completions",
+        method="POST",
+    )
+
+    payload = {
+        "model": "GigaChat",
+        "stream": True,
+        "messages": [{"role": "user", "content": "Поздоровайся"}],
+    }
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post("/v1/chat/completions", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [
+        line.removeprefix("data: ")
+        for line in response.text.split("\n\n")
+        if line.startswith("data: ")
+    ]
+    assert events[-1] == "[DONE]"
+    data = [json.loads(event) for event in events[:-1]]
+    assert "".join(d["choices"][0]["delta"]["content"] for d in data) == "Привет, мир"
+    assert len({d["id"] for d in data}) == 1
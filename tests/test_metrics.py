@@ -0,0 +1,194 @@
+import json
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.core.metrics import Counter, Histogram, MetricsRegistry
+
+from .conftest import TEST_BEARER_TOKEN
+
+CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.register(
+        Histogram("latency_seconds", "Latency.", ("model",), buckets=(0.1, 1.0))
+    )
+    counter = registry.register(Counter("errors_total", "Errors.", ("status",)))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.labels("GigaChat").observe(value)
+    counter.labels('bad "quote"').inc(2)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{model="GigaChat",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{model="GigaChat",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{model="GigaChat",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{model="GigaChat"} 3.65' in lines
+    assert 'latency_seconds_count{model="GigaChat"} 4' in lines
+    assert 'errors_total{status="bad \\"quote\\""} 2' in lines
+
+
+def get_metric(text: str, name: str, **labels: str) -> float:
+    """Значение метрики с заданными метками (остальные метки не важны)."""
+    total = 0.0
+    for line in text.splitlines():
+        if line.startswith("#") or not line.startswith(name + "{"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        if all(f'{k}="{v}"' in series for k, v in labels.items()):
+            total += float(value)
+    return total
+
+
+@pytest.mark.parametrize(
+    "models_response",
+    [
+        {
+            "json": {
+                "data": [{"id": "GigaChat-Max", "object": "model", "owned_by": "sber"}],
+                "object": "list",
+            }
+        }
+    ],
+)
+def test_metrics_endpoint_reports_requests(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        json={
+            "choices": [
+                {
+                    "message": {"content": "Привет", "role": "assistant"},
+                    "index": 0,
+                    "finish_reason": "stop",
+                }
+            ],
+            "created": 1736023521,
+            "model": "GigaChat-Max",
+            "object": "chat.completion",
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        },
+    )
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        content=(
+            "".join(
+                "data: "
+                + json.dumps(
+                    {
+                        "choices": [{"delta": {"content": text}, "index": 0}],
+                        "created": 1736023521,
+                        "model": "GigaChat-Max",
+                        "object": "chat.completion",
+                    }
+                )
+                + "\n\n"
+                for text in ("При", "вет")
+            )
+            + "data: [DONE]\n\n"
+        ).encode(),
+        headers={"Content-Type": "text/event-stream"},
+    )
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    # Метку модели получают только модели из списка, загруженного при запуске
+    messages = [{"role": "user", "content": "Привет"}]
+    for stream in (False, True):
+        response = client.post(
+            "/v1/chat/completions",
+            json={"model": "GigaChat-Max", "messages": messages, "stream": stream},
+            headers=headers,
+        )
+        assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    labels = {"endpoint": "/v1/chat/completions", "model": "GigaChat-Max"}
+    assert (
+        get_metric(text, "gigachat_adapter_tokens_total", type="prompt", **labels) == 3
+    )
+    assert (
+        get_metric(text, "gigachat_adapter_request_duration_seconds_count", **labels)
+        == 2
+    )
+    assert (
+        get_metric(text, "gigachat_adapter_responses_total", status="200", **labels)
+        == 2
+    )
+    assert (
+        get_metric(text, "gigachat_adapter_time_to_first_token_seconds_count", **labels)
+        == 1
+    )
+    assert (
+        get_metric(text, "gigachat_adapter_inter_chunk_latency_seconds_count", **labels)
+        == 1
+    )
+    assert (
+        get_metric(
+            text,
+            "gigachat_adapter_upstream_duration_seconds_count",
+            endpoint="/api/v1/chat/completions",
+            model="GigaChat-Max",
+        )
+        == 2
+    )
+    assert get_metric(text, "gigachat_adapter_requests_in_flight", **labels) == 0
+
+
+def test_metrics_labels_are_bounded(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        json={
+            "choices": [
+                {
+                    "message": {"content": "Привет", "role": "assistant"},
+                    "index": 0,
+                    "finish_reason": "stop",
+                }
+            ],
+            "created": 1736023521,
+            "model": "GigaChat",
+            "object": "chat.completion",
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        },
+    )
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    response = client.post(
+        "/v1/chat/completions",
+        json={
+            "model": "made-up-model-1b2c",
+            "messages": [{"role": "user", "content": "Привет"}],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    response = client.get("/v1/batches/batch_4f2a9c", headers=headers)
+    assert response.status_code == 404
+
+    text = client.get("/metrics").text
+    assert "made-up-model-1b2c" not in text
+    assert "batch_4f2a9c" not in text
+    assert (
+        get_metric(
+            text,
+            "gigachat_adapter_responses_total",
+            endpoint="/v1/batches/{batch_id}",
+            status="404",
+        )
+        >= 1
+    )
+    assert (
+        get_metric(
+            text,
+            "gigachat_adapter_tokens_total",
+            endpoint="/v1/chat/completions",
+            model="other",
+            type="prompt",
+        )
+        >= 3
+    )
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from src.core.micro_batcher import MicroBatcher
+
+
+def make_batcher(calls: list, **kwargs) -> MicroBatcher[str, str, str]:
+    async def run(group: str, items: list[str]) -> list[str]:
+        calls.append((group, items))
+        await asyncio.sleep(0.01)
+        if "fail" in items:
+            raise RuntimeError("upstream error")
+        return [item.upper() for item in items]
+
+    options = {"max_size": 100, "max_cost": 1000, "max_wait": 0.05, **kwargs}
+    return MicroBatcher(run, **options)
+
+
+def test_concurrent_calls_are_merged_and_deduplicated():
+    calls: list = []
+
+    async def scenario():
+        batcher = make_batcher(calls)
+        results = await asyncio.gather(
+            batcher.submit("m", "a"),
+            batcher.submit("m", "b"),
+            batcher.submit("m", "a"),
+            batcher.submit("other", "a"),
+        )
+        return batcher, results
+
+    batcher, results = asyncio.run(scenario())
+    assert results == ["A", "B", "A", "A"]
+    assert calls == [("m", ["a", "b"]), ("other", ["a"])]
+    assert batcher.deduplicated == 1
+    assert batcher.batches == 2
+    assert batcher.inflight == 0
+
+
+def test_batches_grow_while_group_is_busy():
+    calls: list = []
+
+    async def scenario():
+        batcher = make_batcher(calls)
+        first = asyncio.ensure_future(batcher.submit("m", "a"))
+        await asyncio.sleep(0)
+        # Пока первая пачка в работе, следующие вызовы копятся в одну
+        rest = [batcher.submit("m", item) for item in "bcd"]
+        return await asyncio.gather(first, *rest)
+
+    assert asyncio.run(scenario()) == ["A", "B", "C", "D"]
+    assert calls == [("m", ["a"]), ("m", ["b", "c", "d"])]
+
+
+def test_batch_is_split_by_size_and_cost():
+    calls: list = []
+
+    async def scenario():
+        batcher = make_batcher(calls, max_size=2, max_cost=10, cost=len)
+        await asyncio.gather(
+            *(batcher.submit("m", item) for item in ("a", "b", "c", "x" * 10, "d"))
+        )
+
+    asyncio.run(scenario())
+    assert [items for _, items in calls] == [["a", "b"], ["c"], ["x" * 10], ["d"]]
+
+
+def test_failure_reaches_only_its_caller_and_cancel_keeps_batch():
+    calls: list = []
+
+    async def scenario():
+        batcher = make_batcher(calls)
+        results = await asyncio.gather(
+            batcher.submit("m", "ok"),
+            batcher.submit("m", "fail"),
+            batcher.submit("m", "b"),
+            return_exceptions=True,
+        )
+        cancelled = asyncio.ensure_future(batcher.submit("m", "a"))
+        other = asyncio.ensure_future(batcher.submit("m", "a"))
+        await asyncio.sleep(0.001)
+        cancelled.cancel()
+        return batcher, results, await other
+
+    batcher, (ok, failed, b), result = asyncio.run(scenario())
+    assert (ok, b) == ("OK", "B")
+    assert isinstance(failed, RuntimeError)
+    # Пачка делится пополам, пока ошибка не останется у одного элемента
+    assert [items for _, items in calls[:3]] == [
+        ["ok", "fail", "b"],
+        ["ok"],
+        ["fail", "b"],
+    ]
+    assert batcher.splits == 2
+    assert result == "A"
+
+
+def test_batch_error_reaches_every_caller_without_split():
+    calls: list = []
+
+    async def scenario():
+        batcher = make_batcher(calls, split_on=lambda error: False)
+        return await asyncio.gather(
+            batcher.submit("m", "fail"),
+            batcher.submit("m", "ok"),
+            return_exceptions=True,
+        )
+
+    failed = asyncio.run(scenario())
+    assert all(isinstance(error, RuntimeError) for error in failed)
+    assert len(calls) == 1
+
+
+def test_aclose_cancels_pending_batches():
+    async def scenario():
+        batcher = make_batcher([])
+        task = asyncio.ensure_future(batcher.submit("m", "a"))
+        await asyncio.sleep(0.001)
+        await batcher.aclose()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from src.core.multipart import MultipartError, MultipartTooLarge, parse_multipart
+
+BOUNDARY = "----test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+MAX_SIZE = 16 * 1024 * 1024
+
+
+def build_body(content: bytes) -> bytes:
+    return (
+        (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="purpose"\r\n\r\n'
+            "general\r\n"
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="data.bin"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        + content
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def test_parse_multipart_hashes_file_while_reading():
+    content = bytes(range(256)) * 4096
+
+    async def main():
+        return await parse_multipart(
+            CONTENT_TYPE,
+            chunked(build_body(content), 7919),
+            max_memory=64 * 1024,
+            max_size=MAX_SIZE,
+        )
+
+    form = asyncio.run(main())
+    try:
+        upload = form.files["file"]
+        assert form.fields == {"purpose": "general"}
+        assert upload.filename == "data.bin"
+        assert upload.content_type == "application/octet-stream"
+        assert upload.size == len(content)
+        assert upload.sha256 == hashlib.sha256(content).hexdigest()
+        # Файл больше max_memory ушел на диск, но читается с начала целиком
+        assert upload.file._rolled  # type: ignore[attr-defined]
+        assert upload.file.read() == content
+    finally:
+        form.close()
+
+
+def test_parse_multipart_keeps_small_file_in_memory():
+    async def main():
+        return await parse_multipart(
+            CONTENT_TYPE,
+            chunked(build_body(b"small"), 3),
+            max_memory=1024,
+            max_size=MAX_SIZE,
+        )
+
+    form = asyncio.run(main())
+    upload = form.files["file"]
+    assert not upload.file._rolled  # type: ignore[attr-defined]
+    assert upload.file.read() == b"small"
+    form.close()
+
+
+@pytest.mark.parametrize(
+    "content_type, body",
+    [
+        ("application/json", b"{}"),
+        (CONTENT_TYPE, b"--" + BOUNDARY.encode() + b"\r\nbroken"),
+    ],
+)
+def test_parse_multipart_rejects_invalid_body(content_type, body):
+    async def main():
+        await parse_multipart(
+            content_type, chunked(body, 1024), max_memory=1024, max_size=MAX_SIZE
+        )
+
+    with pytest.raises(MultipartError):
+        asyncio.run(main())
+
+
+def test_parse_multipart_stops_at_max_size():
+    received = []
+
+    async def body():
+        async for chunk in chunked(build_body(b"x" * 100_000), 1024):
+            received.append(chunk)
+            yield chunk
+
+    async def main():
+        await parse_multipart(CONTENT_TYPE, body(), max_memory=1024, max_size=10_000)
+
+    with pytest.raises(MultipartTooLarge):
+        asyncio.run(main())
+    # Тело не дочитывается после превышения предела
+    assert sum(map(len, received)) < 20_000
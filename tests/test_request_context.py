@@ -0,0 +1,85 @@
+import json
+
+from pytest_httpx import HTTPXMock
+
+from src.core.request_context import RequestContext
+
+from .conftest import TEST_BEARER_TOKEN
+
+CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+
+
+def test_server_timing_sums_repeated_phases():
+    context = RequestContext()
+    context.add_timing("upload", 0.01)
+    context.add_timing("upload", 0.0025)
+    context.add_timing("upstream", 0.2)
+
+    assert context.server_timing() == "upload;dur=12.5, upstream;dur=200.0"
+    assert context.server_timing(total=True).split(", ")[-1].startswith("total;dur=")
+
+
+def test_chat_response_has_server_timing(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        json={
+            "choices": [
+                {
+                    "message": {"content": "Привет", "role": "assistant"},
+                    "index": 0,
+                    "finish_reason": "stop",
+                }
+            ],
+            "created": 1736023521,
+            "model": "GigaChat",
+            "object": "chat.completion",
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        },
+    )
+    response = client.post(
+        "/v1/chat/completions",
+        json={"model": "GigaChat", "messages": [{"role": "user", "content": "Hi"}]},
+        headers={"Authorization": f"Bearer {TEST_BEARER_TOKEN}"},
+    )
+
+    assert response.status_code == 200
+    phases = [m.split(";")[0] for m in response.headers["server-timing"].split(", ")]
+    for phase in ("queue", "convert", "upstream", "serialize", "total"):
+        assert phase in phases
+
+
+def test_stream_ends_with_server_timing_comment(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        content=(
+            "data: "
+            + json.dumps(
+                {
+                    "choices": [{"delta": {"content": "Привет"}, "index": 0}],
+                    "created": 1736023521,
+                    "model": "GigaChat",
+                    "object": "chat.completion",
+                }
+            )
+            + "\n\ndata: [DONE]\n\n"
+        ).encode(),
+        headers={"Content-Type": "text/event-stream"},
+    )
+    response = client.post(
+        "/v1/chat/completions",
+        json={
+            "model": "GigaChat",
+            "messages": [{"role": "user", "content": "Hi"}],
+            "stream": True,
+        },
+        headers={"Authorization": f"Bearer {TEST_BEARER_TOKEN}"},
+    )
+
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+    events = response.text.strip().split("\n\n")
+    assert events[-1] == "data: [DONE]"
+    assert events[-2].startswith(": server-timing ")
+    assert "upstream;dur=" in events[-2] and "stream;dur=" in events[-2]
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+
+from pytest_httpx import HTTPXMock
+
+from src.core.response_cache import ResponseCache, canonical_key
+from src.gigachat_service import GigaChatService
+from src.models.completion import ChatCompletionRequest
+
+from .test_main import CHAT_COMPLETION_RESPONSE
+
+CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+
+
+def test_canonical_key_ignores_key_order():
+    assert canonical_key({"a": 1, "b": [1, 2]}) == canonical_key({"b": [1, 2], "a": 1})
+
+
+def test_lru_eviction_by_byte_budget():
+    cache: ResponseCache[str] = ResponseCache(max_bytes=10, ttl=60)
+    cache.set("a", "A", size=4)
+    cache.set("b", "B", size=4)
+    assert cache.get("a") == "A"
+    cache.set("c", "C", size=4)
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.evictions == 1
+    assert cache.size == 8
+
+
+def test_expired_entries_are_misses():
+    cache: ResponseCache[str] = ResponseCache(max_bytes=10, ttl=0.01)
+    cache.set("a", "A", size=1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_service_caches_deterministic_completions(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        json=CHAT_COMPLETION_RESPONSE, url=CHAT_URL, method="POST", is_reusable=True
+    )
+    service = GigaChatService(response_cache_enabled=True)
+    request = ChatCompletionRequest.model_validate(
+        {
+            "messages": [{"role": "user", "content": "Придумай заголовок"}],
+            "temperature": 0,
+        }
+    )
+
+    async def scenario():
+        first = await service.chat(request)
+        second = await service.chat(request)
+        stream_request = request.model_copy(update={"stream": True})
+        events = [chunk async for chunk in service.stream_chat_sse(stream_request)]
+        await service.chat(request, use_cache=False)
+        await service.aclose()
+        return first, second, events
+
+    first, second, events = asyncio.run(scenario())
+    assert second.choices == first.choices
+    assert events[-1] == b"data: [DONE]\n\n"
+    replayed = json.loads(events[0].removeprefix(b"data: "))
+    assert replayed["choices"][0]["delta"]["content"] == "На картинке кот"
+    assert len(httpx_mock.get_requests(url=CHAT_URL)) == 2
+
+    stats = service.get_stats().response_cache
+    assert (stats.hits, stats.misses, stats.bypassed) == (2, 1, 1)
+
+
+def test_service_does_not_cache_sampled_completions(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        json=CHAT_COMPLETION_RESPONSE, url=CHAT_URL, method="POST", is_reusable=True
+    )
+    service = GigaChatService(response_cache_enabled=True)
+    request = ChatCompletionRequest.model_validate(
+        {
+            "messages": [{"role": "user", "content": "Придумай шутку"}],
+            "temperature": 0.7,
+        }
+    )
+
+    async def scenario():
+        await service.chat(request)
+        await service.chat(request)
+        await service.aclose()
+
+    asyncio.run(scenario())
+    assert len(httpx_mock.get_requests(url=CHAT_URL)) == 2
+
+
+def test_cache_hit_bypasses_unavailable_accounts(httpx_mock: HTTPXMock):
+    httpx_mock.add_response(json=CHAT_COMPLETION_RESPONSE, url=CHAT_URL, method="POST")
+    service = GigaChatService(response_cache_enabled=True)
+    request = ChatCompletionRequest.model_validate(
+        {
+            "messages": [{"role": "user", "content": "Придумай заголовок"}],
+            "temperature": 0,
+        }
+    )
+
+    async def scenario():
+        first = await service.chat(request)
+        # Все выключатели разомкнуты: без кеша запрос получил бы CircuitOpen
+        for account in service._accounts.accounts:
+            breaker = account.breaker
+            while breaker.can_attempt():
+                breaker.record(breaker.before_call(), True, 0.01)
+        second = await service.chat(request)
+        stream_request = request.model_copy(update={"stream": True})
+        events = [chunk async for chunk in service.stream_chat_sse(stream_request)]
+        await service.aclose()
+        return first, second, events
+
+    first, second, events = asyncio.run(scenario())
+    assert second.choices == first.choices
+    assert events[-1] == b"data: [DONE]\n\n"
+    assert len(httpx_mock.get_requests(url=CHAT_URL)) == 1
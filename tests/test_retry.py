@@ -0,0 +1,166 @@
+import asyncio
+
+import httpx
+import pytest
+from gigachat.exceptions import ResponseError
+from pytest_httpx import HTTPXMock
+
+from src.core.retry import Retrier, RetryBudget, RetryPolicy
+
+from .conftest import TEST_BEARER_TOKEN
+
+CHAT_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+FAST = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+def make_retrier(capacity: float = 10) -> Retrier:
+    return Retrier(
+        {"chat": FAST, "stream": FAST},
+        RetryBudget(ratio=0.1, min_per_second=0, capacity=capacity),
+    )
+
+
+def test_policy_retries_transient_errors_only():
+    policy = RetryPolicy()
+    assert policy.is_retryable(httpx.ConnectError("reset"))
+    assert policy.is_retryable(httpx.ReadTimeout("timeout"))
+    assert policy.is_retryable(ResponseError(CHAT_URL, 503, b"", None))
+    assert not policy.is_retryable(ResponseError(CHAT_URL, 400, b"", None))
+    assert not policy.is_retryable(ValueError("bad request"))
+    assert 0 <= policy.backoff(10) <= policy.max_delay
+
+
+def test_call_retries_until_success():
+    calls = 0
+
+    async def flaky() -> str:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise httpx.ConnectError("reset")
+        return "ok"
+
+    retrier = make_retrier()
+    assert asyncio.run(retrier.call("chat", flaky)) == "ok"
+    assert calls == 3
+    assert retrier.retries["chat"] == 2
+
+
+def test_empty_budget_stops_retries():
+    calls = 0
+
+    async def failing() -> str:
+        nonlocal calls
+        calls += 1
+        raise httpx.ConnectError("reset")
+
+    retrier = make_retrier(capacity=1)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(retrier.call("chat", failing))
+    assert calls == 2
+    assert retrier.budget_exhausted == 1
+
+
+def test_stream_is_retried_only_before_first_item():
+    attempts = 0
+
+    async def open_stream():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise httpx.RemoteProtocolError("stream reset")
+        yield "first"
+        raise httpx.RemoteProtocolError("stream reset")
+
+    async def scenario():
+        received = []
+        with pytest.raises(httpx.RemoteProtocolError):
+            async for item in make_retrier().stream("stream", open_stream):
+                received.append(item)
+        return received
+
+    assert asyncio.run(scenario()) == ["first"]
+    assert attempts == 2
+
+
+def test_attempts_are_reported_in_header(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(url=CHAT_URL, method="POST", status_code=502)
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        json={
+            "choices": [
+                {
+                    "message": {"content": "Привет", "role": "assistant"},
+                    "index": 0,
+                    "finish_reason": "stop",
+                }
+            ],
+            "created": 1736023521,
+            "model": "GigaChat:1.0.26.20",
+            "object": "chat.completion",
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        },
+    )
+    response = client.post(
+        "/v1/chat/completions",
+        json={"model": "GigaChat", "messages": [{"role": "user", "content": "Привет"}]},
+        headers={"Authorization": f"Bearer {TEST_BEARER_TOKEN}"},
+    )
+    assert response.status_code == 200
+    assert response.headers["x-upstream-attempts"] == "2"
+    stats = client.get(
+        "/stats", headers={"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    ).json()
+    assert stats["retries"]["retries"]["chat"] >= 1
+
+
+def test_throttled_retry_waits_for_cooldown_or_fails_fast():
+    calls = 0
+
+    async def throttled() -> str:
+        nonlocal calls
+        calls += 1
+        raise ResponseError(CHAT_URL, 429, b"", None)
+
+    async def scenario(wait: float):
+        retrier = Retrier(
+            {
+                "chat": RetryPolicy(
+                    max_attempts=3, base_delay=0, max_delay=0.05, retry_statuses=[429]
+                )
+            },
+            RetryBudget(ratio=0.1, min_per_second=0, capacity=10),
+            throttle_wait=lambda: wait,
+        )
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(ResponseError):
+            await retrier.call("chat", throttled)
+        return asyncio.get_running_loop().time() - started
+
+    # Пауза длиннее max_delay: повтор ушел бы в ту же учетную запись
+    asyncio.run(scenario(30))
+    assert calls == 1
+    # Короткая пауза выдерживается целиком перед каждым повтором
+    calls = 0
+    assert asyncio.run(scenario(0.02)) >= 0.04
+    assert calls == 3
+
+
+def test_single_throttled_account_returns_429(client, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        url=CHAT_URL,
+        method="POST",
+        status_code=429,
+        headers={"Retry-After": "30"},
+        json={"status": 429, "message": "Too Many Requests"},
+    )
+    response = client.post(
+        "/v1/chat/completions",
+        json={"model": "GigaChat", "messages": [{"role": "user", "content": "Привет"}]},
+        headers={"Authorization": f"Bearer {TEST_BEARER_TOKEN}"},
+    )
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "30"
+    assert response.json()["error"]["code"] == "rate_limit_exceeded"
+    assert len(httpx_mock.get_requests(url=CHAT_URL)) == 1
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from src.core.settings import get_app_settings, reload_app_settings
+from src.core.settings_reload import SettingsReloader
+
+from .conftest import TEST_BEARER_TOKEN
+
+
+@pytest.fixture
+def restore_settings(monkeypatch):
+    yield monkeypatch
+    monkeypatch.undo()
+    reload_app_settings()
+
+
+def test_settings_are_parsed_once_and_frozen():
+    settings = get_app_settings()
+    assert get_app_settings() is settings
+    with pytest.raises(ValidationError):
+        settings.bearer_token = "changed"
+
+
+def test_reload_swaps_snapshot(client, restore_settings):
+    headers = {"Authorization": f"Bearer {TEST_BEARER_TOKEN}"}
+    assert client.get("/stats", headers=headers).status_code == 200
+
+    old = get_app_settings()
+    restore_settings.setenv("BEARER_TOKEN", "rotated")
+    reloader = SettingsReloader(interval=0)
+    assert reloader.reload()
+
+    assert old.bearer_token == TEST_BEARER_TOKEN
+    assert get_app_settings().bearer_token == "rotated"
+    assert client.get("/stats", headers=headers).status_code == 401
+    headers = {"Authorization": "Bearer rotated"}
+    assert client.get("/stats", headers=headers).status_code == 200
+
+
+def test_invalid_reload_keeps_previous_snapshot(restore_settings):
+    old = get_app_settings()
+    restore_settings.setenv("WORKERS", "-1")
+    reloader = SettingsReloader(interval=0)
+
+    assert not reloader.reload()
+    assert reloader.failures == 1
+    assert get_app_settings() is old
+
+
+def test_env_file_change_triggers_reload(tmp_path, restore_settings):
+    env_file = tmp_path / ".env"
+    env_file.write_text("DEBUG=false\n")
+
+    async def scenario():
+        reloader = SettingsReloader(str(env_file), interval=0.01)
+        await reloader.start()
+        restore_settings.setenv("ENVIRONMENT", "staging")
+        await asyncio.sleep(0.05)
+        assert reloader.reloads == 0
+        env_file.write_text("DEBUG=false\nENVIRONMENT=staging\n")
+        for _ in range(100):
+            if reloader.reloads:
+                break
+            await asyncio.sleep(0.01)
+        await reloader.stop()
+        return reloader.reloads
+
+    assert asyncio.run(scenario()) == 1
+    assert get_app_settings().environment == "staging"
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from src.core.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = 0
+
+    async def upload() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "file-id"
+
+    async def scenario():
+        flight: SingleFlight[str, str] = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", upload) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert results == ["file-id"] * 5
+    assert calls == 1
+    assert flight.started == 1
+    assert flight.deduplicated == 4
+    assert flight.inflight == 0
+
+
+def test_failure_is_propagated_and_not_cached():
+    calls = 0
+
+    async def upload() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if calls == 1:
+            raise RuntimeError("upstream error")
+        return "file-id"
+
+    async def scenario():
+        flight: SingleFlight[str, str] = SingleFlight()
+        first = await asyncio.gather(
+            flight.do("key", upload), flight.do("key", upload), return_exceptions=True
+        )
+        second = await flight.do("key", upload)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in first)
+    assert second == "file-id"
+    assert calls == 2
+
+
+def test_waiter_cancellation_does_not_cancel_shared_work():
+    async def upload() -> str:
+        await asyncio.sleep(0.02)
+        return "file-id"
+
+    async def scenario():
+        flight: SingleFlight[str, str] = SingleFlight()
+        leader = asyncio.ensure_future(flight.do("key", upload))
+        follower = asyncio.ensure_future(flight.do("key", upload))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == "file-id"
+
+
+def test_single_caller_error_is_raised():
+    async def upload() -> str:
+        raise ValueError("bad data")
+
+    with pytest.raises(ValueError):
+        asyncio.run(SingleFlight().do("key", upload))
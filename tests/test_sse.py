@@ -0,0 +1,45 @@
+from src.core.sse import ChatCompletionChunkEncoder
+from src.models.completion import (
+    ChatCompletionStreamResponse,
+    ChatCompletionStreamResponseChoice,
+    ChatCompletionStreamResponseDelta,
+    MessagesRole,
+)
+
+
+def test_encoder_matches_pydantic_serialization():
+    encoder = ChatCompletionChunkEncoder()
+    content = 'Привет, "мир"\n\t\\ </script> \U0001f600'
+    expected = ChatCompletionStreamResponse(
+        id=encoder.id,
+        created=1736023521,
+        model="GigaChat:1.0.26.20",
+        choices=[
+            ChatCompletionStreamResponseChoice(
+                index=0,
+                delta=ChatCompletionStreamResponseDelta(
+                    role=MessagesRole.ASSISTANT, content=content
+                ),
+                finish_reason="stop",
+            ),
+            ChatCompletionStreamResponseChoice(
+                index=1, delta=ChatCompletionStreamResponseDelta(), finish_reason=None
+            ),
+        ],
+    )
+
+    encoded = encoder.encode(
+        1736023521,
+        "GigaChat:1.0.26.20",
+        [(0, "assistant", content, "stop"), (1, None, None, None)],
+    )
+
+    assert encoded == f"data: {expected.model_dump_json()}\n\n".encode()
+
+
+def test_encoder_keeps_one_id_per_stream():
+    encoder = ChatCompletionChunkEncoder()
+    first = encoder.encode(1, "GigaChat", [(0, "assistant", "a", "stop")])
+    second = encoder.encode(2, "GigaChat", [(0, None, "b", "stop")])
+    assert encoder.id.encode() in first
+    assert encoder.id.encode() in second
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from src.core.tracing import Tracer, redact
+
+
+def test_disabled_tracer_does_not_build_payload():
+    tracer = Tracer(enabled=False)
+
+    def payload():
+        raise AssertionError("payload must not be built")
+
+    tracer.start_request()
+    tracer.event("gigachat.request", payload)
+
+
+def test_request_outside_sample_is_not_traced():
+    tracer = Tracer(enabled=True, sample_ratio=0.0)
+
+    def payload():
+        raise AssertionError("payload must not be built")
+
+    tracer.start_request()
+    assert not tracer.active
+    tracer.event("gigachat.request", payload)
+
+
+def test_events_are_written_to_jsonl(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    image = "data:image/png;base64," + "A" * 10_000
+
+    async def scenario():
+        tracer = Tracer(enabled=True, path=str(path), max_field_chars=100)
+        await tracer.start()
+        tracer.start_request()
+        tracer.event("api.request", lambda: {"messages": [{"url": image}]})
+        await asyncio.sleep(0.05)
+        await tracer.stop()
+
+    asyncio.run(scenario())
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["event"] for r in records] == ["api.request"]
+    url = records[0]["data"]["messages"][0]["url"]
+    assert url.startswith("data:image/png;base64,<")
+    assert len(url) < 100
+
+
+def test_redact_truncates_long_text():
+    assert redact({"text": "x" * 20}, max_chars=5) == {
+        "text": "xxxxx<15 chars truncated>"
+    }